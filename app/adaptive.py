@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+from io import BytesIO
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.frame_stats import downsample, luma
+
+
+# Width of the grayscale copy frames are compared on
+SIGNATURE_WIDTH = 64
+
+# 'coarse': on the coarse grid; 'change': between two samples that differ by more than the threshold
+SAMPLING_REASONS = ["coarse", "change"]
+
+
+def change_signature(frame: bytes, width: int = SIGNATURE_WIDTH) -> np.ndarray:
+    """
+    A (height, width) float32 luma copy of an encoded frame, `width` pixels wide. JPEG frames are decoded straight at
+    a reduced scale, so a signature costs a fraction of a full decode.
+    """
+    image = Image.open(BytesIO(frame))
+    image.draft("RGB", (width, max(1, image.height * width // image.width)))
+    return luma(downsample(image, width))
+
+
+def change_score(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean absolute difference of two signatures, 0-1. Signatures of different shapes are as different as can be."""
+    if a.shape != b.shape:
+        return 1.0
+    return float(np.mean(np.abs(a - b))) / 255
+
+
+class AdaptiveSampler:
+    """
+    Capture times between `start_date` and `end_date`, sampled where the scene changes: every `coarse_interval`
+    first, then, between two consecutive samples whose `change_score` is above `threshold`, at the capture time
+    half way, recursively, down to `interval`.
+
+    Iterate over it and `observe` every capture time yielded with its frame, before taking the next one: samples are
+    only compared once both were observed. Capture times that were yielded and not observed (skipped at night, in
+    the frame index, or missing) are never refined around. Refined capture times come after the later end of their
+    segment, so the samples are in time order within each coarse segment only.
+
+    `sampled` records why every capture time was sampled: {'reason', 'score', 'segment', 'observed'}, with the score
+    and the (start, end) Unix timestamps of the segment that was split for 'change' samples.
+    """
+
+    def __init__(self, start_date: datetime, end_date: datetime, coarse_interval: timedelta, interval: timedelta, threshold: float) -> None:
+        if coarse_interval < interval or coarse_interval % interval:
+            raise ValueError(f"The coarse interval must be a multiple of the interval. Found: {coarse_interval} and {interval}")
+        if not 0 < threshold <= 1:
+            raise ValueError(f"The change threshold must be between 0 and 1. Found: {threshold}")
+        self._start_date = start_date
+        self._end_date = end_date
+        self._coarse_interval = coarse_interval
+        self._interval = interval
+        self._threshold = threshold
+        self._signatures: Dict[datetime, np.ndarray] = {}
+        self.sampled: Dict[int, Dict[str, Any]] = {}
+
+    def observe(self, date: datetime, frame: bytes | None) -> None:
+        """Record the frame fetched for `date`, None if it is missing."""
+        if frame is None:
+            return
+        self._signatures[date] = change_signature(frame)
+        self.sampled[int(date.timestamp())]["observed"] = True
+
+    def _sample(self, date: datetime, reason: str, score: float | None = None, segment: Tuple[datetime, datetime] | None = None) -> datetime:
+        self.sampled[int(date.timestamp())] = {
+            "reason": reason,
+            "score": score,
+            "segment": [int(segment[0].timestamp()), int(segment[1].timestamp())] if segment else None,
+            "observed": False,
+        }
+        return date
+
+    def _refine(self, start: datetime, end: datetime) -> Iterator[datetime]:
+        segments: List[Tuple[datetime, datetime]] = [(start, end)]
+        while segments:
+            start, end = segments.pop()
+            steps = (end - start) // self._interval
+            if steps < 2 or start not in self._signatures or end not in self._signatures:
+                continue
+            score = change_score(self._signatures[start], self._signatures[end])
+            if score <= self._threshold:
+                continue
+            middle = start + (steps // 2) * self._interval
+            yield self._sample(middle, "change", score, (start, end))
+            # The earlier half first
+            segments.extend([(middle, end), (start, middle)])
+
+    def __iter__(self) -> Iterator[datetime]:
+        # The last capture time of the range is sampled even if it is not on the coarse grid
+        last = self._start_date + ((self._end_date - self._start_date) // self._interval) * self._interval
+        previous = None
+        date = self._start_date
+        while previous is None or previous < last:
+            yield self._sample(date, "coarse")
+            if previous is not None:
+                yield from self._refine(previous, date)
+                # Only the end of the segment is compared again
+                for known in [known for known in self._signatures if known < date]:
+                    del self._signatures[known]
+            previous = date
+            date = min(date + self._coarse_interval, last)
+
+    def summary(self) -> Dict[str, int]:
+        """The number of samples per reason."""
+        counts = dict.fromkeys(SAMPLING_REASONS, 0)
+        for entry in self.sampled.values():
+            counts[entry["reason"]] += 1
+        return counts
@@ -0,0 +1,138 @@
+from io import BytesIO
+import json
+import logging
+import os
+import tarfile
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Set, Tuple
+
+if TYPE_CHECKING:
+    from app.staging import StagingArea
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_MEMBER_NAME = "index.json"
+
+
+class ShardedArchive:
+    """
+    Packs frames into size-bounded, uncompressed tar shards instead of uploading one object per frame.
+
+    Every shard ends with an 'index.json' member mapping each member name to its (offset, length) in the shard.
+    Frame data is stored uncompressed and contiguous, so a reader can fetch a single frame with a ranged GET of
+    `length` bytes at `offset`.
+
+    Completed shards are handed to `register_shard(local_path, shard_number)`, which uploads them and returns the
+    relative path they were registered under. `index` only ever references shards that were registered; the
+    timestamps of the frames of shards that could not be registered are handed out by `take_failed`.
+
+    With a `staging` area, the bytes of the open shard are reserved from its quota as frames are added. When the
+    quota is used up, the open shard is closed and registered early, so that a shard never waits on itself.
+    """
+
+    def __init__(
+            self,
+            shard_dir: str,
+            max_shard_bytes: int,
+            register_shard: Callable[[str, int], str],
+            staging: "StagingArea | None" = None,
+    ) -> None:
+        self._shard_dir = shard_dir
+        self._max_shard_bytes = max_shard_bytes
+        self._register_shard = register_shard
+        self._shard_number = 0
+        self._tar: tarfile.TarFile | None = None
+        self._shard_path: str | None = None
+        self._members: Dict[str, Tuple[int, int]] = {}
+        self._pending: List[Tuple[int, str]] = []
+        self._index: Dict[int, List[dict]] = {}
+        self._failed: List[int] = []
+        self._lost: Set[int] = set()
+        self._staging = staging
+        self._reserved_bytes = 0
+        os.makedirs(shard_dir, exist_ok=True)
+
+    @property
+    def index(self) -> Dict[int, List[dict]]:
+        """Unix timestamp -> list of {'shard', 'offset', 'length'}, one per member stored for that timestamp."""
+        return self._index
+
+    def add(self, timestamp: int, member_name: str, data: bytes) -> None:
+        header_and_data = tarfile.BLOCKSIZE + len(data) + tarfile.BLOCKSIZE
+        if self._tar is not None and self._tar.offset + header_and_data > self._max_shard_bytes:
+            self._close_shard()
+
+        if self._staging is not None:
+            # The end-of-archive record of a new shard, and the entry of the member in the index
+            reserved_bytes = header_and_data + len(member_name) + 32 + (tarfile.RECORDSIZE if self._tar is None else 0)
+            if not self._staging.try_reserve(reserved_bytes):
+                if self._tar is not None:
+                    logger.info(f"Staging quota reached, closing shard {self._shard_number} early")
+                    self._close_shard()
+                    reserved_bytes += tarfile.RECORDSIZE
+                self._staging.reserve(reserved_bytes)
+            self._reserved_bytes += reserved_bytes
+
+        if self._tar is None:
+            self._open_shard()
+
+        info = tarfile.TarInfo(name=member_name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        header = info.tobuf(self._tar.format, self._tar.encoding, self._tar.errors)
+
+        offset = self._tar.offset + len(header)
+        self._tar.addfile(info, BytesIO(data))
+
+        self._members[member_name] = (offset, len(data))
+        self._pending.append((timestamp, member_name))
+
+    def take_failed(self) -> List[int]:
+        """
+        The timestamps of the frames lost with a shard that could not be registered since the last call, e.g. for the
+        caller to fail their tasks. They are left out of `index`.
+        """
+        failed, self._failed = self._failed, []
+        return failed
+
+    def close(self) -> Dict[int, List[dict]]:
+        if self._tar is not None:
+            self._close_shard()
+        return self._index
+
+    def _open_shard(self) -> None:
+        self._shard_path = os.path.join(self._shard_dir, f"shard-{self._shard_number:05d}.tar")
+        self._tar = tarfile.open(self._shard_path, mode="w", format=tarfile.PAX_FORMAT)
+        self._members = {}
+        self._pending = []
+
+    def _close_shard(self) -> None:
+        index = json.dumps({name: list(location) for name, location in self._members.items()}).encode()
+        info = tarfile.TarInfo(name=INDEX_MEMBER_NAME)
+        info.size = len(index)
+        info.mtime = int(time.time())
+        self._tar.addfile(info, BytesIO(index))
+        self._tar.close()
+        self._tar = None
+
+        shard_number, self._shard_number = self._shard_number, self._shard_number + 1
+        try:
+            shard_relative_path = self._register_shard(self._shard_path, shard_number)
+            for timestamp, member_name in self._pending:
+                if timestamp in self._lost:
+                    continue
+                offset, length = self._members[member_name]
+                self._index.setdefault(timestamp, []).append({"shard": shard_relative_path, "offset": offset, "length": length})
+        except Exception as error:
+            logger.warning(f"Could not register shard {shard_number} with {len(self._pending)} frames: {error}")
+            for timestamp in sorted({timestamp for timestamp, _ in self._pending} - self._lost):
+                # With regions of interest, the other crops of the frame may be in another shard: dropped as well
+                self._index.pop(timestamp, None)
+                self._lost.add(timestamp)
+                self._failed.append(timestamp)
+        finally:
+            os.remove(self._shard_path)
+            if self._staging is not None:
+                self._staging.release(self._reserved_bytes)
+            self._reserved_bytes = 0
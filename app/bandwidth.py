@@ -0,0 +1,157 @@
+import fcntl
+import math
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, Tuple
+
+# tokens, updated_at (time.monotonic(), shared by every process of the host), total bytes, recent bytes
+_STATE = struct.Struct("=4d")
+
+# Time constant of the host-wide throughput reported by `TokenBucket.usage`
+RATE_WINDOW_S = 5.0
+
+# Bytes read or sent between two acquisitions
+CHUNK_BYTES = 64 * 1024
+
+DIRECTIONS = ["download", "upload"]
+
+
+def default_state_dir() -> str:
+    """Directory of the bucket state files: in /dev/shm when available, so that updates never touch a disk."""
+    root = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(root, "webcam-scraper-bandwidth")
+
+
+class TokenBucket:
+    """
+    A byte-rate budget of `bytes_per_s`, shared by every thread and process of the host opening the same state
+    file, e.g. all the scraper jobs of a node. Bursts of up to `burst_s` worth of bytes go through without waiting.
+
+    The state (tokens, last update, bytes sent) is a few bytes in `path`, updated under an exclusive `flock`. Callers
+    take what they send up front and wait off the debt, so that a large transfer does not starve smaller ones.
+    Every process sharing a bucket should use the same rate.
+    """
+
+    def __init__(self, path: str, bytes_per_s: float, burst_s: float = 0.5) -> None:
+        if bytes_per_s <= 0:
+            raise ValueError(f"The rate of a token bucket must be greater than 0. Found: {bytes_per_s}")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._path = path
+        self._rate = bytes_per_s
+        self._capacity = max(bytes_per_s * burst_s, CHUNK_BYTES)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        # flock only excludes other processes: threads sharing the descriptor take this lock first
+        self._lock = threading.Lock()
+        self._process_bytes = 0
+        self._process_wait_s = 0.0
+
+    @property
+    def bytes_per_s(self) -> float:
+        return self._rate
+
+    def _take(self, amount: int) -> Tuple[float, float, float]:
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                now = time.monotonic()
+                raw = os.pread(self._fd, _STATE.size, 0)
+                if len(raw) == _STATE.size:
+                    tokens, updated_at, total, recent = _STATE.unpack(raw)
+                else:
+                    tokens, updated_at, total, recent = self._capacity, now, 0.0, 0.0
+
+                elapsed = max(0.0, now - updated_at)
+                tokens = min(self._capacity, tokens + elapsed * self._rate) - amount
+                recent = recent * math.exp(-elapsed / RATE_WINDOW_S) + amount
+                total += amount
+                os.pwrite(self._fd, _STATE.pack(tokens, now, total, recent), 0)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+            wait = max(0.0, -tokens / self._rate)
+            self._process_bytes += amount
+            self._process_wait_s += wait
+        return wait, total, recent
+
+    def reserve(self, amount: int) -> float:
+        """Take `amount` bytes from the budget. Returns how long to wait, in seconds, before sending them."""
+        return self._take(amount)[0]
+
+    def acquire(self, amount: int) -> None:
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+
+    def usage(self) -> Dict[str, float]:
+        """The limit, the current throughput and the bytes sent by the whole host, and the share of this process."""
+        _, total, recent = self._take(0)
+        with self._lock:
+            return {
+                "limit_bytes_per_s": self._rate,
+                "host_bytes_per_s": recent / RATE_WINDOW_S,
+                "host_bytes": total,
+                "process_bytes": self._process_bytes,
+                "process_wait_s": self._process_wait_s,
+            }
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def host_bucket(direction: str, bytes_per_s: float, state_dir: str | None = None) -> TokenBucket:
+    """
+    The token bucket of the host for `direction` ('download' or 'upload'), one instance per process, so that the
+    concurrent jobs of a process account their bytes together.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"'{direction}' is not a valid direction. Valid directions are: {DIRECTIONS}")
+    path = os.path.join(state_dir or default_state_dir(), f"{direction}.bucket")
+    with _buckets_lock:
+        bucket = _buckets.get(path)
+        if bucket is None or bucket.bytes_per_s != bytes_per_s:
+            bucket = _buckets[path] = TokenBucket(path, bytes_per_s)
+        return bucket
+
+
+def buckets_usage() -> Dict[str, Dict[str, float]]:
+    """The usage of every bucket this process opened, by state file."""
+    with _buckets_lock:
+        buckets = dict(_buckets)
+    return {path: bucket.usage() for path, bucket in buckets.items()}
+
+
+def mbps_to_bytes_per_s(mbps: float) -> float:
+    """Megabits per second, as link capacities are given, to bytes per second."""
+    return mbps * 1_000_000 / 8
+
+
+def throttled_chunks(chunks: Iterator[bytes], bucket: TokenBucket) -> Iterator[bytes]:
+    """Pass chunks through as the budget of `bucket` allows, e.g. those of a streamed response."""
+    for chunk in chunks:
+        bucket.acquire(len(chunk))
+        yield chunk
+
+
+class ThrottledFile:
+    """
+    A binary file to upload within the budget of `bucket`. It has a length, so that HTTP clients send it with a
+    Content-Length instead of chunked encoding, which signed URLs do not accept.
+    """
+
+    def __init__(self, file, size: int, bucket: TokenBucket) -> None:
+        self._file = file
+        self._size = size
+        self._bucket = bucket
+
+    def __len__(self) -> int:
+        return self._size
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._file.read(size)
+        for offset in range(0, len(data), CHUNK_BYTES):
+            self._bucket.acquire(min(CHUNK_BYTES, len(data) - offset))
+        return data
@@ -0,0 +1,222 @@
+"""
+Runs the scraper jobs of a manifest in one process, e.g. a daily batch of many webcams, date ranges and case studies,
+instead of one `webcam_scraper.py` process per job.
+
+    python -m app.bulk jobs.csv --defaults kp.json --max-jobs 8 --workers 2 --output-dir ./bulk-output
+
+A manifest is a CSV file with a header of `ScraperJobSpec` fields and one job per row, a JSON list of job specs,
+or a JSON object {"defaults": {...}, "jobs": [...]}. Fields a job leaves out, or leaves empty in a CSV file, are
+taken from the defaults (those of `--defaults`, then those of the manifest), e.g. the Kernel Planckster host and
+token, and then from `ScraperJobSpec`.
+
+Every job is validated before any is run. The jobs then run on a `WorkerService`: at most `--max-jobs` at a time,
+sharing the Kernel Planckster gateways, the connection pools and the frame processing pool. The `JobOutput` of
+each job is written to '<output-dir>/jobs/', and a summary of the batch to '<output-dir>/summary.json'.
+"""
+
+import csv
+from datetime import datetime
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+from pydantic import ValidationError
+
+from app.jobs import ScraperJobSpec
+from app.sdk.models import BaseJobState, JobOutput
+from app.url_image_scraper import ScrapeJob
+from app.worker_service import WorkerService
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FORMATS = [".csv", ".json"]
+
+
+def load_manifest(path: str, defaults: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
+    """
+    The jobs of a manifest, as dicts of `ScraperJobSpec` fields with the defaults filled in. Raises a ValueError if
+    the manifest cannot be read.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in MANIFEST_FORMATS:
+        raise ValueError(f"'{path}' is not a valid manifest. Valid manifest formats are: {MANIFEST_FORMATS}")
+
+    if extension == ".csv":
+        with open(path, newline="") as f:
+            # Empty cells are left to the defaults
+            rows = [{key: value for key, value in row.items() if value not in ("", None)} for row in csv.DictReader(f)]
+        manifest_defaults = {}
+    else:
+        with open(path) as f:
+            manifest = json.load(f)
+        if isinstance(manifest, dict):
+            manifest_defaults, rows = manifest.get("defaults", {}), manifest.get("jobs")
+        else:
+            manifest_defaults, rows = {}, manifest
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows) or not isinstance(manifest_defaults, dict):
+            raise ValueError(f"A JSON manifest must be a list of job specs, or an object with a 'jobs' list. Found: '{path}'")
+
+    return [{**manifest_defaults, **(defaults or {}), **row} for row in rows]
+
+
+def validate_manifest(rows: List[Dict[str, Any]], service: WorkerService) -> Tuple[List[Tuple[ScraperJobSpec, ScrapeJob]], List[str]]:
+    """
+    Validate every job of a manifest, as the worker service would. Returns the specs with the `ScrapeJob` of the
+    valid jobs, and a message for each problem found, by job number, starting at 1.
+    """
+    jobs, errors = [], []
+    prefixes: Dict[Tuple[str, str, str], int] = {}
+    for number, row in enumerate(rows, start=1):
+        unknown = sorted(set(row) - set(ScraperJobSpec.model_fields))
+        if unknown:
+            errors.append(f"Job {number}: unknown fields {unknown}")
+            continue
+        try:
+            spec = ScraperJobSpec.model_validate(row)
+            job = service.prepare(spec)
+        except ValidationError as error:
+            problems = "; ".join(f"{'.'.join(str(part) for part in problem['loc'])}: {problem['msg']}" for problem in error.errors())
+            errors.append(f"Job {number}: {problems}")
+            continue
+        except ValueError as error:
+            errors.append(f"Job {number}: {error}")
+            continue
+
+        # Jobs registering under the same prefix would overwrite each other's outputs
+        prefix = (spec.case_study_name, spec.tracer_id, str(spec.job_id))
+        if prefix in prefixes:
+            errors.append(f"Job {number}: case_study_name, tracer_id and job_id {list(prefix)} are those of job {prefixes[prefix]}")
+            continue
+        prefixes[prefix] = number
+        jobs.append((spec, job))
+    return jobs, errors
+
+
+def job_output_file(output_dir: str, number: int, spec: ScraperJobSpec) -> str:
+    return os.path.join(output_dir, "jobs", f"{number:04d}-{spec.case_study_name}-{spec.tracer_id}-{spec.job_id}.json".replace("/", "_"))
+
+
+def run_manifest(jobs: List[Tuple[ScraperJobSpec, ScrapeJob]], service: WorkerService, output_dir: str) -> Dict[str, Any]:
+    """
+    Run validated jobs on `service` and write their `JobOutput`s under `output_dir` as they finish. Returns the
+    summary of the batch. On Ctrl+C, the running jobs are finished and the queued ones are cancelled.
+    """
+    os.makedirs(os.path.join(output_dir, "jobs"), exist_ok=True)
+    start = time.perf_counter()
+    started_at = datetime.now().isoformat()
+
+    service_job_ids = [service.enqueue(spec, job) for spec, job in jobs]
+    states = {BaseJobState.FINISHED.value: 0, BaseJobState.FAILED.value: 0, "cancelled": 0}
+    results: Dict[int, Dict[str, Any]] = {}
+
+    def collect(number: int, spec: ScraperJobSpec, service_job_id: str) -> None:
+        record = service.job(service_job_id)
+        output, path = None, None
+        if record["status"] == "queued":
+            state = "cancelled"
+        else:
+            # A job that raised, e.g. because Kernel Planckster could not be set up, failed like one that returned
+            output = record["output"] or JobOutput(job_state=BaseJobState.FAILED, tracer_id=spec.tracer_id, source_data_list=[]).model_dump(mode="json")
+            state = output["job_state"]
+            path = job_output_file(output_dir, number, spec)
+            with open(path, "w") as f:
+                json.dump(output, f, indent=4)
+        states[state] += 1
+
+        metrics = record["metrics"] or {}
+        results[number] = {
+            "job": number,
+            "case_study_name": spec.case_study_name,
+            "tracer_id": spec.tracer_id,
+            "job_id": spec.job_id,
+            "roundshot_webcam_id": spec.roundshot_webcam_id,
+            "job_state": state,
+            "error": record["error"],
+            "output": path,
+            "source_data": len(output["source_data_list"] or []) if output else 0,
+            "elapsed_s": metrics.get("elapsed_s"),
+            "counters": metrics.get("counters", {}),
+        }
+
+    interrupted = False
+    try:
+        for number, ((spec, _), service_job_id) in enumerate(zip(jobs, service_job_ids), start=1):
+            service.wait(service_job_id)
+            collect(number, spec, service_job_id)
+    except KeyboardInterrupt:
+        interrupted = True
+        logger.warning("Interrupted: finishing the running jobs, the queued ones are cancelled")
+    finally:
+        service.close(cancel_queued=True)
+
+    for number, ((spec, _), service_job_id) in enumerate(zip(jobs, service_job_ids), start=1):
+        if number not in results:
+            collect(number, spec, service_job_id)
+
+    summary = {
+        "started_at": started_at,
+        "elapsed_s": time.perf_counter() - start,
+        "interrupted": interrupted,
+        "jobs": len(jobs),
+        "job_states": states,
+        "results": [results[number] for number in sorted(results)],
+    }
+    with open(os.path.join(output_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=4)
+    return summary
+
+
+if __name__ == "__main__":
+
+    import argparse
+    import signal
+    import sys
+
+    parser = argparse.ArgumentParser(description="Run the scraper jobs of a CSV or JSON manifest in one process.")
+    parser.add_argument("manifest", type=str, help="CSV file with a header of job spec fields, or JSON list of job specs")
+    parser.add_argument("--defaults", type=str, default=None, help="JSON file of job spec fields for every job that does not set them, e.g. the Kernel Planckster host and token")
+    parser.add_argument("--output-dir", type=str, default="./bulk-output", help="Directory of the JobOutput of every job and of the summary of the batch")
+    parser.add_argument("--max-jobs", type=int, default=4, help="Number of jobs run concurrently, for the whole batch")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes for frame processing, shared by all jobs. 0 processes frames in the job's thread.")
+    parser.add_argument("--validate-only", action="store_true", help="Validate the manifest and exit without running any job")
+    parser.add_argument("--log-level", type=str, default="WARNING", help="The log level of the runner and of the jobs")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format='%(asctime)s - %(levelname)s - %(message)s', force=True)
+
+    if args.max_jobs <= 0 or args.workers < 0:
+        parser.error("--max-jobs must be greater than 0 and --workers greater than or equal to 0")
+
+    try:
+        defaults = None
+        if args.defaults:
+            with open(args.defaults) as f:
+                defaults = json.load(f)
+        rows = load_manifest(args.manifest, defaults)
+    except (OSError, ValueError) as error:
+        logger.error(f"Could not read the manifest: {error}")
+        sys.exit(2)
+
+    # Validation only builds the arguments of the jobs; the pools are started once the whole manifest is valid
+    validation_service = WorkerService(max_jobs=1)
+    try:
+        jobs, errors = validate_manifest(rows, validation_service)
+    finally:
+        validation_service.close()
+    if errors:
+        for error in errors:
+            logger.error(error)
+        logger.error(f"{len(errors)} of {len(rows)} jobs of '{args.manifest}' are not valid, none was run")
+        sys.exit(2)
+    logger.warning(f"{len(jobs)} jobs of '{args.manifest}' are valid")
+    if args.validate_only:
+        sys.exit(0)
+
+    # 'docker stop' sends SIGTERM: finish the running jobs and write the summary, as for Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    summary = run_manifest(jobs, WorkerService(max_jobs=args.max_jobs, workers=args.workers), args.output_dir)
+    logger.warning(f"Ran {summary['jobs']} jobs in {summary['elapsed_s']:.1f} s: {summary['job_states']}")
+    sys.exit(0 if summary["job_states"][BaseJobState.FINISHED.value] == summary["jobs"] else 1)
@@ -1,11 +1,16 @@
 
 # Webcam Matrix
+# NOTE: an entry can restrict the uploaded pixels with an optional 'roi' key, holding a (left, top, right, bottom)
+# pixel box of the '_half' panorama or a list of such boxes, e.g. "roi": [[1200, 150, 2200, 650]]. Each box is
+# cropped, encoded and registered as its own source data, with the box encoded in the relative path.
+# 'timezone' is the IANA time zone of the camera: capture times are the camera's local wall-clock times.
 ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
     {
         "country": "Argentina",
         "location": "Finca La Anita - Mendoza",
         "latitude": "-33.17268331",
         "longitude": "-68.91994679",
+        "timezone": "America/Argentina/Mendoza",
         "bounding_box": {
             "long_left": "-68.90994679",
             "lat_down": "-33.16268331",
@@ -23,6 +28,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Fremantle Ports - Fremantle Ports 1",
         "latitude": "-32.05426988",
         "longitude": "115.7413251",
+        "timezone": "Australia/Perth",
         "bounding_box": {
             "long_left": "115.7313251",
             "lat_down": "-32.06426988",
@@ -40,6 +46,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Fremantle Ports - Fremantle Ports 2",
         "latitude": "-32.0507109",
         "longitude": "115.7391675",
+        "timezone": "Australia/Perth",
         "bounding_box": {
             "long_left": "115.7291675",
             "lat_down": "-32.0607109",
@@ -58,6 +65,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Symsol - Hotham",
         "latitude": "-36.97510538",
         "longitude": "147.133164",
+        "timezone": "Australia/Melbourne",
         "bounding_box": {
             "long_left": "147.123164",
             "lat_down": "-36.98510538",
@@ -76,6 +84,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "VIP Jahorina - Termag Hotel",
         "latitude": "43.73553869",
         "longitude": "18.56803271",
+        "timezone": "Europe/Sarajevo",
         "bounding_box": {
             "long_left": "18.55803271",
             "lat_down": "43.72553869",
@@ -94,6 +103,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Headland Hotel - Headland Hotel & Spa",
         "latitude": "50.42065495",
         "longitude": "-5.09671541",
+        "timezone": "Europe/London",
         "bounding_box": {
             "long_left": "-5.08671541",
             "lat_down": "50.41065495",
@@ -112,6 +122,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Flycam - Hiedanranta",
         "latitude": "61.51905433",
         "longitude": "23.68954721",
+        "timezone": "Europe/Helsinki",
         "bounding_box": {
             "long_left": "23.67954721",
             "lat_down": "61.50905433",
@@ -129,6 +140,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Flycam - Lappeenranta – Vesitorni",
         "latitude": "61.05961865",
         "longitude": "28.19871851",
+        "timezone": "Europe/Helsinki",
         "bounding_box": {
             "long_left": "28.18871851",
             "lat_down": "61.04961865",
@@ -145,6 +157,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Flycam - Rovaniemi Koivusaari",
         "latitude": "66.51593763",
         "longitude": "25.74434697",
+        "timezone": "Europe/Helsinki",
         "bounding_box": {
             "long_left": "25.73434697",
             "lat_down": "66.50593763",
@@ -161,6 +174,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Flycam - Rovaniemi Ounasvaara",
         "latitude": "66.50035775",
         "longitude": "25.79965647",
+        "timezone": "Europe/Helsinki",
         "bounding_box": {
             "long_left": "25.78965647",
             "lat_down": "66.49035775",
@@ -177,6 +191,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Avoriaz - Groupe Arnéodo - Avoriaz Dreamland",
         "latitude": "46.19321254",
         "longitude": "6.773431583",
+        "timezone": "Europe/Paris",
         "bounding_box": {
             "long_left": "6.763431583",
             "lat_down": "46.18321254",
@@ -193,6 +208,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Bandol - Office de Tourisme - Office de Tourisme",
         "latitude": "43.13485422",
         "longitude": "5.753210513",
+        "timezone": "Europe/Paris",
         "bounding_box": {
             "long_left": "5.743210513",
             "lat_down": "43.12485422",
@@ -209,6 +225,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Grau du Roi - Impérial - Centre Ville - Maison du Phare",
         "latitude": "43.53663447",
         "longitude": "4.13445104",
+        "timezone": "Europe/Paris",
         "bounding_box": {
             "long_left": "4.12445104",
             "lat_down": "43.52663447",
@@ -225,6 +242,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Serre Chevalier - Ratier",
         "latitude": "44.9258423",
         "longitude": "6.570274546",
+        "timezone": "Europe/Paris",
         "bounding_box": {
             "long_left": "6.560274546",
             "lat_down": "44.9158423",
@@ -241,6 +259,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Val d'Isère - Village",
         "latitude": "45.44863924",
         "longitude": "6.979229144",
+        "timezone": "Europe/Paris",
         "bounding_box": {
             "long_left": "6.969229144",
             "lat_down": "45.43863924",
@@ -257,6 +276,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Berggasthof Königstuhl",
         "latitude": "49.4038944",
         "longitude": "8.727662214",
+        "timezone": "Europe/Berlin",
         "bounding_box": {
             "long_left": "8.717662214",
             "lat_down": "49.3938944",
@@ -273,6 +293,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Hörnerdörfer Tourismus - Balderschwang",
         "latitude": "47.46582079",
         "longitude": "10.10427733",
+        "timezone": "Europe/Berlin",
         "bounding_box": {
             "long_left": "10.09427733",
             "lat_down": "47.45582079",
@@ -289,6 +310,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Mittagbahn",
         "latitude": "47.55483335",
         "longitude": "10.2184159",
+        "timezone": "Europe/Berlin",
         "bounding_box": {
             "long_left": "10.2084159",
             "lat_down": "47.54483335",
@@ -305,6 +327,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Schlosshotel Herrenchiemsee - Chiemsee",
         "latitude": "47.86907784",
         "longitude": "12.39705714",
+        "timezone": "Europe/Berlin",
         "bounding_box": {
             "long_left": "12.38705714",
             "lat_down": "47.85907784",
@@ -321,6 +344,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Eggensberger Hotel",
         "latitude": "47.6093376",
         "longitude": "10.6801139",
+        "timezone": "Europe/Berlin",
         "bounding_box": {
             "long_left": "10.6701139",
             "lat_down": "47.5993376",
@@ -337,6 +361,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "BERNEXPO - Festhalle - A - Public",
         "latitude": "46.9600046",
         "longitude": "7.4652565",
+        "timezone": "Europe/Zurich",
         "bounding_box": {
             "long_left": "7.4552565",
             "lat_down": "46.9500046",
@@ -353,6 +378,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Bredella AG - Buss Immobillien",
         "latitude": "46.7980586",
         "longitude": "10.2989871",
+        "timezone": "Europe/Zurich",
         "bounding_box": {
             "long_left": "10.2889871",
             "lat_down": "46.7880586",
@@ -369,6 +395,7 @@ ROUNDSHOT_WEBCAM_MATRIX: dict[str, str | int] = [
         "location": "Belvedère Scuol Hotel - Belvedère - Scuol",
         "latitude": "46.7970656",
         "longitude": "10.2985356",
+        "timezone": "Europe/Zurich",
         "bounding_box": {
             "long_left": "10.2885356",
             "lat_down": "46.7870656",
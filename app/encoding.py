@@ -0,0 +1,93 @@
+from dataclasses import dataclass
+from io import BytesIO
+from typing import TYPE_CHECKING, Tuple
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+# codec -> (Pillow format, file extension)
+CODECS = {
+    "jpeg": ("JPEG", "jpeg"),
+    "webp": ("WEBP", "webp"),
+    "avif": ("AVIF", "avif"),
+    "png": ("PNG", "png"),
+}
+
+SOURCE_CODEC = "source"
+
+
+@dataclass(frozen=True)
+class OutputEncoding:
+    """
+    How processed frames are encoded before upload.
+
+    @attr codec: one of 'source' (re-encode in the format the frame was served in with Pillow's defaults, PNG if
+        unknown), 'jpeg', 'webp', 'avif' or 'png'
+    @attr quality: 1-100, used by the lossy codecs
+    @attr effort: how hard the encoder tries to shrink the output, 0 (fastest) to 9 (smallest); mapped onto the
+        codec's own scale (WebP 'method' 0-6, AVIF 'speed' 10-0, PNG 'compress_level' 0-9, JPEG 'optimize' above 0)
+    """
+    codec: str = SOURCE_CODEC
+    quality: int = 85
+    effort: int = 4
+
+
+def avif_available() -> bool:
+    try:
+        # Pillow < 11.3 only supports AVIF through this plugin
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        pass
+    from PIL import Image
+
+    Image.init()
+    return ".avif" in Image.registered_extensions()
+
+
+def validate_encoding(encoding: OutputEncoding) -> OutputEncoding:
+    if encoding.codec != SOURCE_CODEC and encoding.codec not in CODECS:
+        raise ValueError(f"'{encoding.codec}' is not a supported codec. Supported codecs are: {[SOURCE_CODEC, *CODECS]}")
+
+    if not 1 <= encoding.quality <= 100:
+        raise ValueError(f"The output quality must be between 1 and 100. Found: {encoding.quality}")
+
+    if not 0 <= encoding.effort <= 9:
+        raise ValueError(f"The output effort must be between 0 and 9. Found: {encoding.effort}")
+
+    if encoding.codec == "avif" and not avif_available():
+        raise ValueError("The 'avif' codec needs Pillow >= 11.3 or the 'pillow-avif-plugin' package.")
+
+    return encoding
+
+
+def _save_params(codec: str, encoding: OutputEncoding) -> dict:
+    match codec:
+        case "jpeg":
+            return {"quality": encoding.quality, "optimize": encoding.effort > 0, "progressive": encoding.effort > 0}
+        case "webp":
+            return {"quality": encoding.quality, "method": min(6, round(encoding.effort * 6 / 9))}
+        case "avif":
+            return {"quality": encoding.quality, "speed": 10 - round(encoding.effort * 10 / 9)}
+        case "png":
+            return {"compress_level": encoding.effort, "optimize": encoding.effort == 9}
+    return {}
+
+
+def encode_image(image: "Image.Image", encoding: OutputEncoding, source_format: str | None = None) -> Tuple[bytes, str]:
+    """
+    Encode an image according to `encoding`, returning the encoded bytes and the matching file extension.
+    """
+    if encoding.codec == SOURCE_CODEC:
+        image_format = source_format or "PNG"
+        buffer = BytesIO()
+        image.save(buffer, format=image_format)
+        return buffer.getvalue(), image_format.lower()
+
+    image_format, file_extension = CODECS[encoding.codec]
+    if image_format == "JPEG" and image.mode not in ("RGB", "L", "CMYK"):
+        image = image.convert("RGB")
+
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, **_save_params(encoding.codec, encoding))
+    return buffer.getvalue(), file_extension
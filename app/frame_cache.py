@@ -0,0 +1,77 @@
+from hashlib import sha256
+import json
+import os
+import tempfile
+from typing import Any, Dict
+
+
+class FrameCache:
+    """
+    On-disk cache of fetched Roundshot frames, with the HTTP validators ('ETag', 'Last-Modified') they were served
+    with, kept between runs.
+
+    Every URL has two files named after its hash: the frame bytes, and a JSON entry with the validators and the
+    outputs registered for the frame so far, per processing profile (see `output_profile`). Files are replaced
+    atomically, so that concurrent jobs can share a cache directory.
+    """
+
+    def __init__(self, cache_dir: str) -> None:
+        self._cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url: str, suffix: str) -> str:
+        key = sha256(url.encode()).hexdigest()[:32]
+        return os.path.join(self._cache_dir, key[:2], f"{key}{suffix}")
+
+    def _write(self, path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def entry(self, url: str) -> Dict[str, Any] | None:
+        """The cache entry of a URL: {'url', 'etag', 'last_modified', 'outputs'}, or None if it is not cached."""
+        try:
+            with open(self._path(url, ".json")) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if entry.get("url") != url or not os.path.exists(self._path(url, ".frame")):
+            return None
+        return entry
+
+    def conditional_headers(self, entry: Dict[str, Any] | None) -> Dict[str, str]:
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def frame(self, url: str) -> bytes:
+        with open(self._path(url, ".frame"), "rb") as f:
+            return f.read()
+
+    def store(self, url: str, data: bytes, etag: str | None, last_modified: str | None) -> None:
+        """Cache a frame served with a 200. The outputs recorded for an older version of the frame are dropped."""
+        if not etag and not last_modified:
+            # Without validators the frame could never be revalidated
+            return
+        self._write(self._path(url, ".frame"), data)
+        self._write_entry({"url": url, "etag": etag, "last_modified": last_modified, "outputs": {}})
+
+    def record_outputs(self, url: str, profile: str, outputs: Any) -> None:
+        """Remember what a frame was registered as, with the processing `profile`, e.g. its relative path."""
+        entry = self.entry(url)
+        if entry is None:
+            return
+        entry["outputs"][profile] = outputs
+        self._write_entry(entry)
+
+    def _write_entry(self, entry: Dict[str, Any]) -> None:
+        self._write(self._path(entry["url"], ".json"), json.dumps(entry).encode())
@@ -0,0 +1,92 @@
+import mmap
+import os
+import struct
+from typing import Tuple
+
+import numpy as np
+
+
+class FrameCube:
+    """
+    A (time, height, width, channels) uint8 `.npy` cube, written frame by frame through a memory map.
+
+    The file is created sparse with room for `capacity` frames; frames are written straight into their slot, and
+    the mapped pages are flushed and dropped every `flush_every` frames, so memory stays flat however many frames
+    the job keeps. On `close()` the cube is shrunk to the frames actually appended, and the Unix timestamp of every
+    frame is written to a companion int64 `.npy` array. Both files can be opened with `np.load(..., mmap_mode='r')`.
+    """
+
+    def __init__(self, path: str, timestamps_path: str, capacity: int, width: int, height: int, channels: int = 3, flush_every: int = 64) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._path = path
+        self._timestamps_path = timestamps_path
+        self._shape = (height, width, channels)
+        self._flush_every = flush_every
+        self._cube = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=(max(1, capacity), *self._shape))
+        self._timestamps = np.empty(max(1, capacity), dtype=np.int64)
+        self._count = 0
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def frame_shape(self) -> Tuple[int, int, int]:
+        return self._shape
+
+    def append(self, timestamp: int, frame: np.ndarray) -> None:
+        if self._count >= len(self._timestamps):
+            raise ValueError(f"The frame cube is full: it was created for {len(self._timestamps)} frames")
+        if frame.shape != self._shape:
+            raise ValueError(f"Frame of shape {frame.shape} does not fit a cube of {self._shape} frames")
+
+        self._cube[self._count] = frame
+        self._timestamps[self._count] = timestamp
+        self._count += 1
+
+        if self._count % self._flush_every == 0:
+            self._release_pages()
+
+    def _release_pages(self) -> None:
+        self._cube.flush()
+        mapped = getattr(self._cube, "_mmap", None)
+        if mapped is not None and hasattr(mapped, "madvise"):
+            # Written pages are on disk after the flush, drop them from the resident set
+            mapped.madvise(mmap.MADV_DONTNEED)
+
+    def close(self) -> Tuple[str, str]:
+        """
+        Finish the cube. Returns the paths of the cube and of its timestamps.
+        """
+        self._cube.flush()
+        del self._cube
+
+        _shrink_npy(self._path, (self._count, *self._shape))
+        np.save(self._timestamps_path, self._timestamps[:self._count])
+
+        return self._path, self._timestamps_path
+
+
+def _shrink_npy(path: str, shape: Tuple[int, ...]) -> None:
+    """
+    Rewrite the header of an uint8 `.npy` file with a smaller leading dimension, and truncate its data.
+    The header keeps its length (it is padded with spaces), so the data offset does not change.
+    """
+    with open(path, "r+b") as f:
+        major, minor = np.lib.format.read_magic(f)
+        if (major, minor) == (1, 0):
+            np.lib.format.read_array_header_1_0(f)
+            length_format, prefix_length = "<H", 10
+        else:
+            np.lib.format.read_array_header_2_0(f)
+            length_format, prefix_length = "<I", 12
+        data_offset = f.tell()
+
+        header = repr({"descr": "|u1", "fortran_order": False, "shape": shape}).encode("latin1")
+        padding = data_offset - prefix_length - len(header) - 1
+
+        f.seek(0)
+        f.write(np.lib.format.magic(major, minor))
+        f.write(struct.pack(length_format, data_offset - prefix_length))
+        f.write(header + b" " * padding + b"\n")
+        f.truncate(data_offset + int(np.prod(shape)))
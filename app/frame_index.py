@@ -0,0 +1,83 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Tuple
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    webcam_id TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    resolution TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    status TEXT NOT NULL,
+    outputs TEXT,
+    content_hash TEXT,
+    indexed_at REAL NOT NULL,
+    PRIMARY KEY (webcam_id, resolution, profile, timestamp)
+);
+"""
+
+# 'registered': the outputs were uploaded and registered; 'dark': the frame was dropped as a night frame;
+# 'low_quality': the frame was dropped by the quality gate
+FRAME_STATUSES = ["registered", "dark", "low_quality"]
+
+
+class FrameIndex:
+    """
+    Persistent index of the frames registered by earlier jobs, in an SQLite database, keyed by (webcam, timestamp,
+    resolution, processing profile). For every frame it keeps its status, what it was registered as (the value of
+    its webcam report entry, i.e. its relative path(s) or archive entries) and the sha256 of the fetched frame.
+
+    Jobs look up the frames they would scrape with one range query before planning any fetch, and only scrape the
+    timestamps that are not indexed yet. Missing and failed frames are not indexed, so that later jobs retry them.
+    New entries are written in batches of `flush_every`; entries lost in a crash are only scraped again.
+    """
+
+    def __init__(self, path: str, flush_every: int = 64) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=60)
+        self._db.executescript(SCHEMA)
+        self._flush_every = flush_every
+        self._pending: List[Tuple] = []
+
+    def lookup(self, webcam_id: str, resolution: str, profile: str, start_timestamp: int, end_timestamp: int | None = None) -> Dict[int, Dict[str, Any]]:
+        """
+        The indexed frames of a webcam between two Unix timestamps (inclusive, no end if None), by timestamp:
+        {'status', 'outputs', 'content_hash'}.
+        """
+        query = "SELECT timestamp, status, outputs, content_hash FROM frames WHERE webcam_id = ? AND resolution = ? AND profile = ? AND timestamp >= ?"
+        params: List[Any] = [webcam_id, resolution, profile, start_timestamp]
+        if end_timestamp is not None:
+            query += " AND timestamp <= ?"
+            params.append(end_timestamp)
+
+        return {
+            timestamp: {"status": status, "outputs": json.loads(outputs), "content_hash": content_hash}
+            for timestamp, status, outputs, content_hash in self._db.execute(query, params)
+        }
+
+    def record(self, webcam_id: str, timestamp: int, resolution: str, profile: str, outputs: Any, content_hash: str | None, status: str | None = None) -> None:
+        """
+        Index a frame registered as `outputs`, or dropped if `outputs` is None: as dark unless another of
+        `FRAME_STATUSES` is given.
+        """
+        if status is None:
+            status = "dark" if outputs is None else "registered"
+        elif status not in FRAME_STATUSES:
+            raise ValueError(f"'{status}' is not a valid frame status. Valid frame statuses are: {FRAME_STATUSES}")
+        self._pending.append((webcam_id, timestamp, resolution, profile, status, json.dumps(outputs), content_hash, time.time()))
+        if len(self._pending) >= self._flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._pending)
+        self._pending.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self._db.close()
@@ -0,0 +1,139 @@
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+from PIL import Image
+
+
+# Width of the downsampled copy the statistics are computed on
+STATS_WIDTH = 256
+
+HISTOGRAM_BINS = 32
+
+# Roundshot frames are panoramas with the horizon around the middle: the top third is taken as the sky
+SKY_FRACTION = 1 / 3
+
+# Luma at or below / at or above which a pixel is taken as crushed to black / blown out to white
+SATURATED_LOW = 5
+SATURATED_HIGH = 250
+
+_LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+@dataclass
+class FrameStats:
+    """
+    Image statistics of a frame, computed on a copy downsampled to `STATS_WIDTH` pixels wide, before enhancement.
+
+    @attr brightness: mean luma, 0-255
+    @attr histogram: (3, HISTOGRAM_BINS) pixel counts of the R, G and B channels
+    @attr sky_saturation: mean HSV saturation of the top `SKY_FRACTION` of the frame, 0-1
+    @attr sharpness: variance of the Laplacian of the luma; higher is sharper, fog and blur bring it towards 0
+    """
+    brightness: float
+    histogram: np.ndarray
+    sky_saturation: float
+    sharpness: float
+
+
+def downsample(image: Image.Image, width: int = STATS_WIDTH) -> np.ndarray:
+    """
+    Returns a (height, width, 3) uint8 copy of the image, `width` pixels wide (or the original width if smaller).
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return np.asarray(image)
+
+
+def luma(rgb: np.ndarray) -> np.ndarray:
+    return rgb @ _LUMA_WEIGHTS
+
+
+def laplacian_variance(gray: np.ndarray) -> float:
+    """Variance of the 4-neighbour Laplacian of a 2D array."""
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        return 0.0
+    laplacian = (
+        gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+        - 4 * gray[1:-1, 1:-1]
+    )
+    return float(laplacian.var())
+
+
+def rms_contrast(gray: np.ndarray) -> float:
+    """Standard deviation of a luma array, 0-1. Fog, haze and a covered lens bring it towards 0."""
+    if gray.size == 0:
+        return 0.0
+    return float(gray.std()) / 255
+
+
+def saturated_fraction(gray: np.ndarray, low: float = SATURATED_LOW, high: float = SATURATED_HIGH) -> float:
+    """Fraction of the pixels of a luma array that are crushed to black or blown out to white, e.g. snow on the lens."""
+    if gray.size == 0:
+        return 0.0
+    return float(np.count_nonzero((gray <= low) | (gray >= high))) / gray.size
+
+
+def channel_histograms(rgb: np.ndarray, bins: int = HISTOGRAM_BINS) -> np.ndarray:
+    """(3, bins) pixel counts per channel, for a power of 2 number of bins, in a single pass over the pixels."""
+    shift = 8 - int(np.log2(bins))
+    indices = (rgb >> shift).astype(np.intp) + np.arange(3) * bins
+    return np.bincount(indices.ravel(), minlength=3 * bins).reshape(3, bins).astype(np.uint32)
+
+
+def mean_saturation(rgb: np.ndarray) -> float:
+    if rgb.size == 0:
+        return 0.0
+    high = rgb.max(axis=-1).astype(np.float32)
+    low = rgb.min(axis=-1).astype(np.float32)
+    saturation = np.divide(high - low, high, out=np.zeros_like(high), where=high > 0)
+    return float(saturation.mean())
+
+
+def compute_frame_stats(image: Image.Image, rgb: np.ndarray | None = None) -> FrameStats:
+    """The statistics of `image`, or of `rgb` if it was already downsampled."""
+    if rgb is None:
+        rgb = downsample(image)
+    gray = luma(rgb)
+    return FrameStats(
+        brightness=float(gray.mean()),
+        histogram=channel_histograms(rgb),
+        sky_saturation=mean_saturation(rgb[:max(1, round(rgb.shape[0] * SKY_FRACTION))]),
+        sharpness=laplacian_variance(gray),
+    )
+
+
+class StatsSeries:
+    """
+    Collects the statistics of the frames of a job as a columnar time series, one row per timestamp.
+
+    `save()` writes a compressed `.npz` with one array per column: 'timestamp' (Unix seconds), 'brightness',
+    'sky_saturation', 'sharpness' and 'histogram' of shape (rows, 3, HISTOGRAM_BINS).
+    """
+
+    def __init__(self) -> None:
+        self._timestamps: List[int] = []
+        self._stats: List[FrameStats] = []
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def append(self, timestamp: int, stats: FrameStats) -> None:
+        self._timestamps.append(timestamp)
+        self._stats.append(stats)
+
+    def save(self, path: str) -> str:
+        order = np.argsort(self._timestamps, kind="stable")
+        rows = [self._stats[i] for i in order]
+        np.savez_compressed(
+            path,
+            timestamp=np.asarray(self._timestamps, dtype=np.int64)[order],
+            brightness=np.array([s.brightness for s in rows], dtype=np.float32),
+            sky_saturation=np.array([s.sky_saturation for s in rows], dtype=np.float32),
+            sharpness=np.array([s.sharpness for s in rows], dtype=np.float32),
+            histogram=np.stack([s.histogram for s in rows]) if rows else np.zeros((0, 3, HISTOGRAM_BINS), dtype=np.uint32),
+        )
+        return path
@@ -0,0 +1,306 @@
+from datetime import timedelta
+from logging import Logger
+from typing import TYPE_CHECKING
+
+from pydantic import BaseModel
+
+from app.encoding import SOURCE_CODEC, OutputEncoding, validate_encoding
+from app.setup import datetime_parser, setup, string_validator
+from app.utils import get_webcam_rois
+
+if TYPE_CHECKING:
+    from app.bandwidth import TokenBucket
+    from app.sdk.scraped_data_repository import ScrapedDataRepository
+    from app.url_image_scraper import ScrapeJob
+
+
+class ScraperJobSpec(BaseModel):
+    """
+    The parameters of one scraper job, as taken by `webcam_scraper.main()` and by the worker service.
+
+    @attr start_date, end_date: 'YYYY-MM-DDTHH:MM', both required unless `follow` is set
+    @attr interval: minutes between frames
+    @attr cube_size: 'WIDTHxHEIGHT' of the frame cube, if one should be written
+    @attr stats: whether to upload a time series of brightness, histograms, sky saturation and sharpness
+    @attr min_sun_elevation: skip capture times at which the sun is lower than this, in degrees, None to keep all
+    @attr frame_cache_dir: directory of the frame cache kept between jobs, None to disable it
+    @attr frame_index: path of the index of the frames registered by earlier jobs, None to disable it
+    @attr publish_delay: with `follow`, seconds to wait after a capture time before polling for its frame
+    @attr shard_size_mb: maximum size of an archive shard, with `output_mode` 'archive'
+    @attr shard_index, shard_count: only scrape the capture times of this date-range shard, see `shard_of`
+    @attr shards: split the job into this many date-range shards, run concurrently, with one merged report
+    @attr report_path: also save the webcam report there and keep it, e.g. to merge the reports of shards
+    @attr work_queue: path of an SQLite work queue shared with other containers, to claim capture times from
+    @attr worker_id: name of this worker in the work queue, the hostname and process id by default
+    @attr lease_seconds: how long claimed capture times are reserved for this worker, renewed at every claim
+    @attr download_limit_mbps, upload_limit_mbps: host-wide limits, in Mbit/s, shared with every job of the host
+        using the same `bandwidth_dir`; None for no limit
+    @attr file_dir: root of the staging area of the job, e.g. on a tmpfs; the job only removes its own directory in it
+    @attr adaptive_interval: sample every this many minutes, then refine down to `interval` where the scene changes;
+        None to sample every `interval`
+    @attr change_threshold: with `adaptive_interval`, mean difference of two downsampled frames, 0-1, above which
+        the capture times between them are sampled too
+    @attr quality_mode: score every frame against the quality thresholds and 'tag' it, or 'drop' it if it misses one;
+        None to skip the quality gate
+    @attr min_sharpness, min_contrast, max_saturated_fraction: the quality thresholds, see `QualityGate`
+    @attr staging_quota_mb: most bytes the staging areas of the jobs of the process may hold under `file_dir`, in MB;
+        None for no limit
+    """
+    case_study_name: str
+    job_id: int
+    tracer_id: str
+    latitude: str
+    longitude: str
+    roundshot_webcam_id: str
+    kp_host: str
+    kp_port: int
+    kp_auth_token: str
+    kp_scheme: str = "http"
+    start_date: str | None = None
+    end_date: str | None = None
+    interval: int = 60
+    file_dir: str = "./.tmp"
+    log_level: str = "WARNING"
+    profile_dir: str = "./.profile"
+    cprofile: bool = False
+    tracemalloc_interval: float = 0.0
+    stack_sample_interval: float = 0.0
+    workers: int = 0
+    output_codec: str = SOURCE_CODEC
+    output_quality: int = 85
+    output_effort: int = 4
+    output_mode: str = "objects"
+    shard_size_mb: int = 256
+    cube_size: str | None = None
+    stats: bool = False
+    min_sun_elevation: float | None = None
+    frame_cache_dir: str | None = None
+    frame_index: str | None = None
+    follow: bool = False
+    publish_delay: int = 60
+    shard_index: int = 0
+    shard_count: int = 1
+    shards: int = 1
+    report_path: str | None = None
+    work_queue: str | None = None
+    worker_id: str | None = None
+    lease_seconds: int = 300
+    download_limit_mbps: float | None = None
+    upload_limit_mbps: float | None = None
+    bandwidth_dir: str | None = None
+    staging_quota_mb: int | None = None
+    adaptive_interval: int | None = None
+    change_threshold: float = 0.03
+    quality_mode: str | None = None
+    min_sharpness: float = 5.0
+    min_contrast: float = 0.05
+    max_saturated_fraction: float = 0.5
+
+    @property
+    def profiling_enabled(self) -> bool:
+        return self.cprofile or self.tracemalloc_interval > 0 or self.stack_sample_interval > 0
+
+
+def validate_job_ids(spec: ScraperJobSpec) -> None:
+    """
+    Check the identifiers of a job, which end up in the relative paths it registers. Raises a ValueError describing
+    the first problem found.
+    """
+    if not all([spec.case_study_name, spec.job_id, spec.tracer_id]):
+        raise ValueError(f"case_study_name, job_id and tracer_id must all be set.")
+
+    for name in ("case_study_name", "job_id", "tracer_id"):
+        string_validator(f"{getattr(spec, name)}", name)
+
+
+def validate_job(spec: ScraperJobSpec, logger: Logger) -> "ScrapeJob":
+    """
+    Validate a job spec and convert it into the `ScrapeJob` to pass to `scrape()`. The repository and the download
+    bucket are only set up to run the job (see `setup_repository` and `bandwidth_bucket`). Raises a ValueError
+    describing the first problem found.
+
+    NumPy, Pillow and the HTTP clients are only imported once the cheap checks have passed.
+    """
+    if not all([spec.case_study_name, spec.job_id, spec.tracer_id, spec.latitude, spec.longitude]):
+        raise ValueError(f"case_study_name, job_id, tracer_id, latitude, and longiture must all be set.")
+
+    string_variables = {
+        "case_study_name": spec.case_study_name,
+        "job_id": spec.job_id,
+        "tracer_id": spec.tracer_id,
+        "latitude": spec.latitude,
+        "longitude": spec.longitude
+    }
+
+    logger.info(f"Validating string variables:  {string_variables}")
+
+    for name, value in string_variables.items():
+        string_validator(f"{value}", name)
+
+    logger.info(f"String variables validated successfully!")
+
+    logger.info(f"Converting start_date, end_date, and interval to datetime objects")
+    if not spec.follow and not (spec.start_date and spec.end_date):
+        raise ValueError(f"start_date and end_date must both be set, unless following the webcam live with --follow.")
+    start_date_dt = datetime_parser(spec.start_date) if spec.start_date else None
+    end_date_dt = datetime_parser(spec.end_date) if spec.end_date else None
+    if start_date_dt and end_date_dt and start_date_dt > end_date_dt:
+        raise ValueError(f"Start date must be before end date. Found: {start_date_dt} > {end_date_dt}.")
+
+    if spec.follow and spec.cube_size:
+        raise ValueError(f"--cube-size needs a bounded date range and cannot be combined with --follow.")
+
+    if spec.publish_delay < 0:
+        raise ValueError(f"Publish delay must be greater than or equal to 0 seconds. Found: {spec.publish_delay}")
+
+    if spec.interval <= 0 or not isinstance(spec.interval, int):
+        raise ValueError(f"Interval must be an integer greater than 0, representing an interval in minutes. Found: {spec.interval}")
+    interval_timedelta = timedelta(minutes=spec.interval)
+
+    if spec.workers < 0 or not isinstance(spec.workers, int):
+        raise ValueError(f"Workers must be an integer greater than or equal to 0. Found: {spec.workers}")
+
+    cube_size_wh = None
+    if spec.cube_size:
+        try:
+            cube_size_wh = tuple(int(v) for v in spec.cube_size.lower().split("x"))
+        except ValueError:
+            cube_size_wh = ()
+        if len(cube_size_wh) != 2 or min(cube_size_wh) <= 0:
+            raise ValueError(f"Cube size must be given as WIDTHxHEIGHT, e.g. 512x128. Found: {spec.cube_size}")
+
+    encoding = validate_encoding(OutputEncoding(codec=spec.output_codec, quality=spec.output_quality, effort=spec.output_effort))
+    rois = tuple(get_webcam_rois(spec.roundshot_webcam_id))
+
+    if spec.min_sun_elevation is not None and not -90 <= spec.min_sun_elevation <= 90:
+        raise ValueError(f"Minimum sun elevation must be between -90 and 90 degrees. Found: {spec.min_sun_elevation}")
+
+    if spec.shard_count < 1 or not 0 <= spec.shard_index < spec.shard_count:
+        raise ValueError(f"Shard index must be between 0 and shard count - 1. Found: shard_index={spec.shard_index}, shard_count={spec.shard_count}")
+
+    if spec.shards < 1:
+        raise ValueError(f"Shards must be greater than or equal to 1. Found: {spec.shards}")
+
+    if spec.shards > 1 and (spec.shard_count > 1 or spec.follow):
+        raise ValueError(f"--shards splits a bounded date range, and cannot be combined with --shard-count nor --follow.")
+
+    if spec.work_queue and (spec.follow or spec.shards > 1 or spec.shard_count > 1):
+        raise ValueError(f"--work-queue splits a bounded date range between workers, and cannot be combined with --follow nor sharding.")
+
+    if spec.adaptive_interval is not None:
+        if spec.adaptive_interval < spec.interval or spec.adaptive_interval % spec.interval:
+            raise ValueError(f"Adaptive interval must be a multiple of the interval. Found: adaptive_interval={spec.adaptive_interval}, interval={spec.interval}")
+        if spec.follow or spec.work_queue or spec.shards > 1 or spec.shard_count > 1:
+            raise ValueError(f"--adaptive-interval samples a whole bounded date range, and cannot be combined with --follow, --work-queue nor sharding.")
+
+    if not 0 < spec.change_threshold <= 1:
+        raise ValueError(f"Change threshold must be between 0 and 1. Found: {spec.change_threshold}")
+
+    if spec.min_sharpness < 0:
+        raise ValueError(f"Minimum sharpness must be greater than or equal to 0. Found: {spec.min_sharpness}")
+
+    for name, value in (("Minimum contrast", spec.min_contrast), ("Maximum saturated fraction", spec.max_saturated_fraction)):
+        if not 0 <= value <= 1:
+            raise ValueError(f"{name} must be between 0 and 1. Found: {value}")
+
+    if spec.lease_seconds <= 0:
+        raise ValueError(f"Lease must be greater than 0 seconds. Found: {spec.lease_seconds}")
+
+    for name, limit in (("Download", spec.download_limit_mbps), ("Upload", spec.upload_limit_mbps)):
+        if limit is not None and limit <= 0:
+            raise ValueError(f"{name} limit must be greater than 0 Mbit/s. Found: {limit}")
+
+    if spec.shard_size_mb <= 0:
+        raise ValueError(f"Shard size must be greater than 0 MB. Found: {spec.shard_size_mb}")
+
+    if spec.staging_quota_mb is not None and spec.staging_quota_mb <= 0:
+        raise ValueError(f"Staging quota must be greater than 0 MB. Found: {spec.staging_quota_mb}")
+
+    if spec.tracemalloc_interval < 0 or spec.stack_sample_interval < 0:
+        raise ValueError(f"Profiling intervals must be greater than or equal to 0. Found: tracemalloc_interval={spec.tracemalloc_interval}, stack_sample_interval={spec.stack_sample_interval}")
+
+    from app.processing import ProcessingOptions
+    from app.quality import QUALITY_MODES, QualityGate
+    from app.url_image_scraper import OUTPUT_MODES, ScrapeJob
+
+    if spec.output_mode not in OUTPUT_MODES:
+        raise ValueError(f"Output mode must be one of {OUTPUT_MODES}. Found: {spec.output_mode}")
+
+    quality_gate = None
+    if spec.quality_mode is not None:
+        if spec.quality_mode not in QUALITY_MODES:
+            raise ValueError(f"Quality mode must be one of {QUALITY_MODES}. Found: {spec.quality_mode}")
+        quality_gate = QualityGate(mode=spec.quality_mode, min_sharpness=spec.min_sharpness, min_contrast=spec.min_contrast, max_saturated_fraction=spec.max_saturated_fraction)
+
+    processing_options = ProcessingOptions(encoding=encoding, rois=rois, cube_size=cube_size_wh, stats=spec.stats, quality=quality_gate)
+
+    logger.info(f"start_date, end_date, and interval converted to datetime objects successfully")
+
+    return ScrapeJob(
+        case_study_name=spec.case_study_name,
+        job_id=spec.job_id,
+        tracer_id=spec.tracer_id,
+        log_level=spec.log_level,
+        latitude=spec.latitude,
+        longitude=spec.longitude,
+        start_date=start_date_dt,
+        end_date=end_date_dt,
+        file_dir=spec.file_dir,
+        roundshot_webcam_id=spec.roundshot_webcam_id,
+        interval=interval_timedelta,
+        workers=spec.workers,
+        processing_options=processing_options,
+        output_mode=spec.output_mode,
+        shard_max_bytes=spec.shard_size_mb * 1024 * 1024,
+        follow=spec.follow,
+        publish_delay=timedelta(seconds=spec.publish_delay),
+        min_sun_elevation=spec.min_sun_elevation,
+        frame_cache_dir=spec.frame_cache_dir,
+        frame_index_path=spec.frame_index,
+        shard_index=spec.shard_index,
+        shard_count=spec.shard_count,
+        report_path=spec.report_path,
+        work_queue_path=spec.work_queue,
+        worker_id=spec.worker_id,
+        lease=timedelta(seconds=spec.lease_seconds),
+        staging_quota_bytes=spec.staging_quota_mb * 1024 * 1024 if spec.staging_quota_mb else None,
+        adaptive_interval=timedelta(minutes=spec.adaptive_interval) if spec.adaptive_interval else None,
+        change_threshold=spec.change_threshold,
+    )
+
+
+def bandwidth_bucket(spec: ScraperJobSpec, direction: str) -> "TokenBucket | None":
+    """
+    The host-wide token bucket of the job for 'download' or 'upload', None if it has no limit. Opens its state file
+    under `bandwidth_dir`: only call it to run the job.
+    """
+    limit_mbps = spec.download_limit_mbps if direction == "download" else spec.upload_limit_mbps
+    if limit_mbps is None:
+        return None
+
+    from app.bandwidth import host_bucket, mbps_to_bytes_per_s
+
+    return host_bucket(direction, mbps_to_bytes_per_s(limit_mbps), spec.bandwidth_dir)
+
+
+def setup_repository(spec: ScraperJobSpec, logger: Logger) -> "ScrapedDataRepository":
+    """
+    Set up the Kernel Planckster gateway, the storage protocol and the file repository for a job.
+    """
+    from app.sdk.scraped_data_repository import ScrapedDataRepository
+
+    kernel_planckster, protocol, file_repository = setup(
+        job_id=spec.job_id,
+        logger=logger,
+        kp_auth_token=spec.kp_auth_token,
+        kp_host=spec.kp_host,
+        kp_port=spec.kp_port,
+        kp_scheme=spec.kp_scheme,
+        upload_bucket=bandwidth_bucket(spec, "upload"),
+    )
+
+    return ScrapedDataRepository(
+        protocol=protocol,
+        kernel_planckster=kernel_planckster,
+        file_repository=file_repository,
+    )
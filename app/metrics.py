@@ -0,0 +1,85 @@
+from contextlib import contextmanager
+import math
+import threading
+import time
+from typing import Dict, Iterator, List
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of a list of values. Returns 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class JobMetrics:
+    """
+    Collects per-stage timings and counters for a single scraper job.
+
+    Stages are timed with the `stage` context manager and summarized as count, total, p50 and p99 seconds.
+    Counters are plain integers incremented with `incr`, gauges are last-value floats set with `set`.
+    The class is thread safe, so it can be shared between the scraping loop and any helper threads.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stages: Dict[str, List[float]] = {}
+        self._counters: Dict[str, int] = {}
+        self._gauges: Dict[str, float] = {}
+        self._started_at = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._stages.setdefault(name, []).append(seconds)
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started_at
+
+    def summary(self) -> dict:
+        """
+        A JSON serializable summary of the collected metrics.
+        """
+        with self._lock:
+            stages = {
+                name: {
+                    "count": len(values),
+                    "total_s": sum(values),
+                    "p50_s": percentile(values, 50),
+                    "p99_s": percentile(values, 99),
+                }
+                for name, values in self._stages.items()
+            }
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        return {
+            "elapsed_s": self.elapsed,
+            "stages": stages,
+            "counters": counters,
+            "gauges": gauges,
+        }
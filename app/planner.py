@@ -0,0 +1,194 @@
+from datetime import datetime, timedelta
+import logging
+import statistics
+import time
+from typing import Any, Dict, List
+
+from app.frame_cache import FrameCache
+from app.frame_index import FrameIndex
+from app.metrics import JobMetrics
+from app.processing import ProcessingOptions, process_frame
+from app.sdk.kernel_plackster_gateway import KernelPlancksterGateway
+from app.sdk.models import KernelPlancksterSourceData, ProtocolEnum
+from app.url_image_scraper import FETCH_PAUSE_S, ROUNDSHOT_TIMEOUT_S, ScrapeJob, _roundshot_session, filter_capture_times, frame_profile, historical_capture_times, roundshot_url
+from app.utils import url_template_resolution
+
+
+logger = logging.getLogger(__name__)
+
+# Kernel Planckster calls per registered object: a ping and the upload credentials, a ping and the registration
+GATEWAY_CALLS_PER_OBJECT = 4
+
+# The same, with upload credentials scoped to the job: a ping and the registration, plus one grant per shard
+SCOPED_GATEWAY_CALLS_PER_OBJECT = 2
+
+
+def probe_frames(roundshot_webcam_id: str, dates: List[datetime], processing_options: ProcessingOptions) -> Dict[str, Any]:
+    """
+    Fetch and process a few frames, to measure what one frame costs: its size, the latency and throughput of the
+    origin, the processing time and the size of the outputs. Nothing is uploaded.
+    """
+    sizes, latencies, fetch_times, process_times, output_sizes, outputs_per_frame = [], [], [], [], [], []
+    missing = 0
+    for date in dates:
+        start = time.perf_counter()
+        try:
+            response = _roundshot_session.get(roundshot_url(roundshot_webcam_id, date), timeout=ROUNDSHOT_TIMEOUT_S)
+            response.raise_for_status()
+        except Exception as error:
+            logger.info(f"Probe of {date} failed: {error}")
+            missing += 1
+            continue
+        fetch_times.append(time.perf_counter() - start)
+        latencies.append(response.elapsed.total_seconds())
+        sizes.append(len(response.content))
+
+        processed = process_frame(response.content, processing_options)
+        process_times.append(processed.decode_s + processed.process_s + processed.stats_s + processed.quality_s)
+        if not processed.dark and not processed.low_quality:
+            outputs_per_frame.append(len(processed.outputs))
+            output_sizes.append(sum(len(output.data) for output in processed.outputs))
+
+    fetched_bytes, fetched_s = sum(sizes), sum(fetch_times)
+    return {
+        "frames": len(dates),
+        "missing_fraction": missing / len(dates) if dates else 0.0,
+        "frame_bytes": statistics.mean(sizes) if sizes else 0.0,
+        "latency_s": statistics.median(latencies) if latencies else 0.0,
+        "fetch_s": statistics.median(fetch_times) if fetch_times else 0.0,
+        "bytes_per_s": fetched_bytes / fetched_s if fetched_s > 0 else 0.0,
+        "process_s": statistics.median(process_times) if process_times else 0.0,
+        "outputs_per_frame": statistics.mean(outputs_per_frame) if outputs_per_frame else 1.0,
+        "output_bytes": statistics.mean(output_sizes) if output_sizes else 0.0,
+    }
+
+
+def probe_gateway(kp_host: str, kp_port: int, kp_auth_token: str, kp_scheme: str, pings: int = 3) -> float | None:
+    """Median round trip to Kernel Planckster, in seconds, None if it cannot be reached."""
+    gateway = KernelPlancksterGateway(kp_host, str(kp_port), kp_auth_token, kp_scheme)
+    round_trips = []
+    for _ in range(pings):
+        start = time.perf_counter()
+        try:
+            if not gateway.ping():
+                return None
+        except Exception as error:
+            logger.info(f"Kernel Planckster probe failed: {error}")
+            return None
+        round_trips.append(time.perf_counter() - start)
+    return statistics.median(round_trips)
+
+
+def probe_scoped_credentials(kp_host: str, kp_port: int, kp_auth_token: str, kp_scheme: str, case_study_name: str, tracer_id: str, job_id: int) -> bool:
+    """Whether Kernel Planckster grants upload credentials scoped to the job. Nothing is uploaded."""
+    try:
+        gateway = KernelPlancksterGateway(kp_host, str(kp_port), kp_auth_token, kp_scheme)
+        source_data = KernelPlancksterSourceData(
+            name="plan", protocol=ProtocolEnum.S3, relative_path=f"{case_study_name}/{tracer_id}/{job_id}/plan.json",
+        )
+        return gateway.request_scoped_grant(source_data) is not None
+    except Exception as error:
+        logger.info(f"Kernel Planckster probe failed: {error}")
+        return False
+
+
+def plan_job(
+    job: ScrapeJob,
+    shards: int = 1,
+    kp_round_trip_s: float | None = None,
+    scoped_credentials: bool = False,
+    probe_samples: int = 3,
+) -> Dict[str, Any]:
+    """
+    Plan a job without scraping it: go through its capture times as `scrape()` would, apply its shard, the night
+    skipping and the frame index, and split what is left into full fetches and, with the frame cache, conditional
+    ones.
+    Then extrapolate the bytes, gateway calls and wall time of the job from a probe of `probe_samples` frames and
+    from `kp_round_trip_s` (see `probe_gateway`), with upload credentials per object or, with `scoped_credentials`, per
+    shard (see `probe_scoped_credentials`).
+
+    The wall time assumes the frames of every shard are fetched and registered one after the other, with the
+    processing overlapping in a pool of `job.workers` processes, and `shards` shards running concurrently. Uploads are
+    assumed to run at the download throughput of the origin.
+
+    With `job.adaptive_interval`, only the coarse samples can be known in advance: the plan is a lower bound, and
+    'max_capture_times' is the number of capture times at `job.interval`, i.e. if the scene changes all the time.
+    """
+    metrics = JobMetrics()
+    report_dict: Dict[int, Any] = {}
+    profile = frame_profile(job.output_mode, job.processing_options)
+
+    all_capture_times = list(historical_capture_times(job.start_date, job.end_date, job.adaptive_interval or job.interval))
+    indexed = None
+    if job.frame_index_path:
+        frame_index = FrameIndex(job.frame_index_path)
+        indexed = frame_index.lookup(job.roundshot_webcam_id, url_template_resolution(), profile, int(job.start_date.timestamp()), int(job.end_date.timestamp()))
+        frame_index.close()
+
+    planned = []
+    for shard in range(shards) if shards > 1 else [job.shard_index]:
+        planned.extend(filter_capture_times(
+            all_capture_times, job.roundshot_webcam_id, job.interval, metrics, report_dict,
+            shard_index=shard, shard_count=max(shards, job.shard_count), min_sun_elevation=job.min_sun_elevation, indexed=indexed,
+        ))
+    planned.sort()
+
+    # With the cache, frames registered before with this profile are only revalidated
+    frame_cache = FrameCache(job.frame_cache_dir) if job.frame_cache_dir else None
+    fetches, revalidations, expected_cache_hits = [], [], 0
+    for date in planned:
+        entry = frame_cache.entry(roundshot_url(job.roundshot_webcam_id, date)) if frame_cache is not None else None
+        if entry is None:
+            fetches.append(date)
+            continue
+        revalidations.append(date)
+        if profile in entry["outputs"]:
+            expected_cache_hits += 1
+
+    probe_candidates = fetches or revalidations
+    probe_dates = probe_candidates[::max(1, len(probe_candidates) // probe_samples)][:probe_samples] if probe_samples > 0 else []
+    probe = probe_frames(job.roundshot_webcam_id, probe_dates, job.processing_options)
+
+    frames_found = len(fetches) * (1 - probe["missing_fraction"])
+    processed_frames = frames_found + len(revalidations) - expected_cache_hits
+    upload_bytes = processed_frames * probe["output_bytes"]
+    if job.output_mode == "archive":
+        objects = -(-int(upload_bytes) // job.shard_max_bytes) if upload_bytes else 0
+    else:
+        objects = round(processed_frames * probe["outputs_per_frame"])
+    # The report, the frame cube and its timestamps, the statistics
+    objects += 1 + (2 if job.processing_options.cube_size else 0) + (1 if job.processing_options.stats else 0)
+
+    if scoped_credentials:
+        gateway_calls = objects * SCOPED_GATEWAY_CALLS_PER_OBJECT + max(1, shards)
+    else:
+        gateway_calls = objects * GATEWAY_CALLS_PER_OBJECT
+    round_trip_s = kp_round_trip_s or 0.0
+    bytes_per_s = probe["bytes_per_s"] or float("inf")
+    register_s = gateway_calls * round_trip_s + upload_bytes / bytes_per_s
+    fetch_s = len(fetches) * probe["fetch_s"] + len(revalidations) * probe["latency_s"] + len(planned) * FETCH_PAUSE_S
+    process_s = processed_frames * probe["process_s"]
+    # Frames are fetched and registered in the loop of each shard; with workers, the processing runs alongside
+    loop_s = (fetch_s + register_s) / max(1, shards)
+    wall_s = max(loop_s, process_s / job.workers) if job.workers > 0 else loop_s + process_s / max(1, shards)
+
+    plan = {
+        "capture_times": len(all_capture_times),
+        "other_shards": len(all_capture_times) - len(planned) - metrics.counter("frames_skipped_night") - metrics.counter("index_hits"),
+        "skipped_night": metrics.counter("frames_skipped_night"),
+        "index_hits": metrics.counter("index_hits"),
+        "planned": len(planned),
+        "fetches": len(fetches),
+        "conditional_fetches": len(revalidations),
+        "expected_cache_hits": expected_cache_hits,
+        "expected_download_bytes": round(frames_found * probe["frame_bytes"]),
+        "expected_upload_bytes": round(upload_bytes),
+        "objects_registered": objects,
+        "gateway_calls": gateway_calls,
+        "roundshot_requests": len(fetches) + len(revalidations),
+        "estimated_wall_s": round(wall_s, 1),
+        "probe": {**probe, "kp_round_trip_s": kp_round_trip_s, "scoped_credentials": scoped_credentials},
+    }
+    if job.adaptive_interval is not None:
+        plan["max_capture_times"] = int((job.end_date - job.start_date) / job.interval) + 1
+    return plan
@@ -0,0 +1,369 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from hashlib import sha256
+from io import BytesIO
+import logging
+import os
+import threading
+import time
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.encoding import OutputEncoding, encode_image
+from app.frame_stats import FrameStats, compute_frame_stats, downsample, luma
+from app.quality import FrameQuality, QualityGate, compute_frame_quality
+
+
+logger = logging.getLogger(__name__)
+
+
+Roi = Tuple[int, int, int, int]
+
+
+@dataclass(frozen=True)
+class ProcessingOptions:
+    """
+    Parameters of the CPU bound processing stage. Must stay picklable: it is sent to the worker processes.
+
+    @attr factor: multiplicative factor applied to the pixel values before clipping
+    @attr clip_range: range the scaled pixel values are clipped to, before being mapped back to [0, 255]
+    @attr encoding: how the processed frame is encoded
+    @attr rois: pixel regions of interest as (left, top, right, bottom); when set, only these crops are enhanced,
+        encoded and returned, instead of the full frame
+    @attr cube_size: (width, height) of a downsampled, enhanced RGB copy of every kept frame, None to skip it
+    @attr stats: whether to compute the `FrameStats` of every decoded frame
+    @attr quality: thresholds to score every frame that is not dark against, None to skip the quality gate
+    """
+    factor: float = 1.5 / 255
+    clip_range: Tuple[float, float] = (0, 1)
+    encoding: OutputEncoding = OutputEncoding()
+    rois: Tuple[Roi, ...] = ()
+    cube_size: Tuple[int, int] | None = None
+    stats: bool = False
+    quality: QualityGate | None = None
+
+
+def output_profile(options: ProcessingOptions) -> str:
+    """
+    A short key of the options that change the encoded outputs of a frame, e.g. to tell whether what was registered
+    for a frame by an earlier job can be reused.
+    """
+    settings = (options.factor, options.clip_range, options.encoding, options.rois)
+    if options.quality is not None and options.quality.drops:
+        # Frames may be dropped, or kept, with other thresholds
+        settings += (options.quality,)
+    return sha256(repr(settings).encode()).hexdigest()[:16]
+
+
+@dataclass
+class EncodedFrame:
+    """
+    One encoded output of a frame: the full frame, or one of its regions of interest.
+
+    @attr data: the encoded image
+    @attr file_extension: the extension matching the encoding of `data`
+    @attr roi: the region of interest this output was cropped to, None for the full frame
+    """
+    data: bytes
+    file_extension: str
+    roi: Roi | None = None
+
+
+@dataclass
+class ProcessedFrame:
+    """
+    The result of processing a single frame.
+
+    @attr outputs: the encoded outputs, empty if the frame was dropped
+    @attr dark: whether the frame was dropped for being completely black (with ROIs: every crop was black)
+    @attr low_quality: whether the frame was dropped for failing the quality gate
+    @attr decode_s: time spent decoding the frame, in seconds
+    @attr process_s: time spent cropping, enhancing and encoding the frame, in seconds
+    @attr thumbnail: the downsampled copy requested with `cube_size`, as a (height, width, 3) uint8 array
+    @attr stats: the statistics of the full frame, if requested; also computed for dark frames
+    @attr stats_s: time spent computing `stats`, in seconds
+    @attr quality: the quality scores of the full frame, if requested; None for dark frames
+    @attr quality_s: time spent computing `quality`, in seconds
+    @attr cpu_s: CPU time spent processing the frame, in seconds
+    """
+    outputs: List[EncodedFrame]
+    dark: bool
+    decode_s: float
+    process_s: float
+    thumbnail: np.ndarray | None = None
+    stats: FrameStats | None = None
+    stats_s: float = 0.0
+    low_quality: bool = False
+    quality: FrameQuality | None = None
+    quality_s: float = 0.0
+    cpu_s: float = 0.0
+
+
+def enhance_image(image: Image.Image, factor: float = 1.0, clip_range: Tuple[float, float] = (0, 1)) -> Image.Image:
+    """Scale the pixel values of the image, clip them and map them back to 8 bits."""
+    np_image = np.array(image) * factor
+    np_image = np.clip(np_image, clip_range[0], clip_range[1])
+    np_image = (np_image * 255).astype(np.uint8)
+    return Image.fromarray(np_image)
+
+
+def process_frame(frame: bytes, options: ProcessingOptions) -> ProcessedFrame:
+    """
+    Decode a frame, drop it if it is completely black or, with a dropping `options.quality`, fails the quality gate,
+    and enhance and encode it with `options.encoding` otherwise.
+
+    With `options.rois`, each region of interest is cropped right after decoding and handled on its own, so the
+    enhancement and the encoding only ever touch the pixels that are uploaded. Pillow cannot crop a JPEG while
+    decoding it, so the full frame is still decoded once.
+    """
+    start = time.perf_counter()
+    image = Image.open(BytesIO(frame))
+    source_format = image.format
+
+    if not options.rois:
+        dark = np.mean(image) == 0.0
+        decoded = time.perf_counter()
+        regions = [] if dark else [(None, image)]
+    else:
+        image.load()
+        decoded = time.perf_counter()
+        width, height = image.size
+        regions = []
+        for roi in options.rois:
+            left, top, right, bottom = roi
+            if right > width or bottom > height:
+                raise ValueError(f"ROI {roi} is outside of the {width}x{height} frame")
+            crop = image.crop(roi)
+            if np.mean(crop) != 0.0:
+                regions.append((roi, crop))
+        dark = not regions
+
+    # The statistics and the quality scores share one downsampled copy of the full frame
+    rgb = None
+    stats = None
+    stats_s = 0.0
+    if options.stats:
+        stats_start = time.perf_counter()
+        rgb = downsample(image)
+        stats = compute_frame_stats(image, rgb)
+        stats_s = time.perf_counter() - stats_start
+
+    quality = None
+    quality_s = 0.0
+    low_quality = False
+    if options.quality is not None and not dark:
+        quality_start = time.perf_counter()
+        quality = compute_frame_quality(luma(rgb if rgb is not None else downsample(image)))
+        # Scored before the enhancement and the encoding, which a dropped frame is spared
+        low_quality = options.quality.drops and bool(options.quality.failures(quality))
+        if low_quality:
+            regions = []
+        quality_s = time.perf_counter() - quality_start
+
+    outputs = []
+    for roi, region in regions:
+        enhanced = enhance_image(region, factor=options.factor, clip_range=options.clip_range)
+        data, file_extension = encode_image(enhanced, options.encoding, source_format=source_format)
+        outputs.append(EncodedFrame(data=data, file_extension=file_extension, roi=roi))
+
+    thumbnail = None
+    if options.cube_size and not dark and not low_quality:
+        # The enhancement is per pixel, so it is applied after downsampling, where it is cheap
+        small = image.convert("RGB").resize(options.cube_size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        thumbnail = np.asarray(enhance_image(small, factor=options.factor, clip_range=options.clip_range))
+
+    return ProcessedFrame(
+        outputs=outputs,
+        dark=dark,
+        decode_s=decoded - start,
+        process_s=time.perf_counter() - decoded - stats_s - quality_s,
+        thumbnail=thumbnail,
+        stats=stats,
+        stats_s=stats_s,
+        low_quality=low_quality,
+        quality=quality,
+        quality_s=quality_s,
+    )
+
+
+def _to_shared_memory(data: bytes) -> Tuple[str, int]:
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+    shm.buf[:len(data)] = data
+    shm.close()
+    return shm.name, len(data)
+
+
+def _from_shared_memory(name: str, size: int) -> bytes:
+    """Copy the content of a shared memory block out, and release the block."""
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(shm.buf[:size])
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _process_frame_in_worker(frame: bytes | Tuple[str, int], options: ProcessingOptions, shared: bool) -> ProcessedFrame:
+    """
+    Entry point of the worker processes. When `shared` is set, the frame is read from (and the encoded outputs
+    written to) shared memory blocks, so that only their names cross the process boundary.
+    """
+    if not shared:
+        start = time.process_time()
+        processed = process_frame(frame, options)
+        processed.cpu_s = time.process_time() - start
+        return processed
+
+    frame = _from_shared_memory(*frame)
+    # A worker runs one task at a time: the CPU time of its process is that of the task
+    start = time.process_time()
+    processed = process_frame(frame, options)
+    processed.cpu_s = time.process_time() - start
+    for output in processed.outputs:
+        output.data = _to_shared_memory(output.data)
+    return processed
+
+
+def _start_resource_tracker() -> bool:
+    try:
+        from multiprocessing import resource_tracker
+        # Start the tracker before forking, so that the workers share it with this process
+        resource_tracker.ensure_running()
+        return True
+    except Exception as error:
+        logger.warning(f"Shared memory unavailable, frames will be pickled instead: {error}")
+        return False
+
+
+def make_frame_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    A process pool for `FrameProcessor`s to share, with shared memory set up for its workers.
+    """
+    _start_resource_tracker()
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+class FrameProcessor:
+    """
+    Runs `process_frame` either inline, in the calling thread, or in a pool of worker processes.
+
+    With `workers` set to 0 every submitted frame is processed immediately; the returned future is already done.
+    With `workers` greater than 0 the frames are processed concurrently in a `ProcessPoolExecutor`, and frame bytes
+    are exchanged through shared memory unless it is unavailable on the host.
+
+    An `executor` shared between processors (e.g. by the worker service) can be passed instead of `workers`; it is
+    used as is and left running on `close()`.
+    """
+
+    def __init__(self, options: ProcessingOptions, workers: int = 0, use_shared_memory: bool = True, executor: ProcessPoolExecutor | None = None) -> None:
+        self._options = options
+        self._workers = workers
+        self._use_shared_memory = use_shared_memory
+        self._executor = None
+        self._owns_executor = executor is None
+        self._started_at = time.perf_counter()
+        self._cpu_s = 0.0
+        self._cpu_lock = threading.Lock()
+
+        if executor is not None:
+            # The owner of the pool started the resource tracker before its workers were forked
+            self._workers = executor._max_workers
+            self._executor = executor
+        elif workers > 0:
+            if use_shared_memory:
+                self._use_shared_memory = _start_resource_tracker()
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    @property
+    def max_pending(self) -> int:
+        """How many submitted frames may be in flight before the caller should collect results."""
+        return 2 * self._workers
+
+    def _count_cpu(self, processed: ProcessedFrame) -> None:
+        with self._cpu_lock:
+            self._cpu_s += processed.cpu_s
+
+    def submit(self, frame: bytes) -> "Future[ProcessedFrame]":
+        if self._executor is None:
+            future = Future()
+            try:
+                # Other jobs may process frames in their own threads at the same time
+                start = time.thread_time()
+                processed = process_frame(frame, self._options)
+                processed.cpu_s = time.thread_time() - start
+                self._count_cpu(processed)
+                future.set_result(processed)
+            except Exception as error:
+                future.set_exception(error)
+            return future
+
+        if self._use_shared_memory:
+            try:
+                shared_frame = _to_shared_memory(frame)
+            except OSError as error:
+                logger.warning(f"Could not use shared memory, frames will be pickled instead: {error}")
+                self._use_shared_memory = False
+            else:
+                future = self._executor.submit(_process_frame_in_worker, shared_frame, self._options, True)
+                return self._collect(future, shared_frame)
+
+        return self._collect(self._executor.submit(_process_frame_in_worker, frame, self._options, False))
+
+    def _collect(self, future: Future, shared_frame: Tuple[str, int] | None = None) -> "Future[ProcessedFrame]":
+        """The result of a worker, with its outputs read back from shared memory and its CPU time counted."""
+        result = Future()
+
+        def done(f: Future) -> None:
+            try:
+                processed = f.result()
+                if shared_frame is not None:
+                    for output in processed.outputs:
+                        output.data = _from_shared_memory(*output.data)
+                # Counted before the caller can see the result and close the processor
+                self._count_cpu(processed)
+                result.set_result(processed)
+            except Exception as error:
+                # The worker may have died before consuming the input block
+                if shared_frame is not None:
+                    try:
+                        _from_shared_memory(*shared_frame)
+                    except FileNotFoundError:
+                        pass
+                result.set_exception(error)
+
+        future.add_done_callback(done)
+        return result
+
+    def close(self) -> dict:
+        """
+        Shut the pool down and return its CPU utilization: the CPU seconds spent processing the frames submitted to
+        this processor, measured per frame where it was processed, divided by the wall time since the processor was
+        created. Other processors sharing the pool are not counted.
+        """
+        if self._executor is not None and self._owns_executor:
+            self._executor.shutdown(wait=True)
+        self._executor = None
+
+        wall_s = time.perf_counter() - self._started_at
+        with self._cpu_lock:
+            cpu_s = self._cpu_s
+        cores = os.cpu_count() or 1
+        utilization = cpu_s / wall_s if wall_s > 0 else 0.0
+
+        return {
+            "workers": self._workers,
+            "cpu_s": cpu_s,
+            "wall_s": wall_s,
+            "cpu_utilization": utilization,
+            "cpu_utilization_per_core": utilization / cores,
+        }
@@ -0,0 +1,164 @@
+import cProfile
+from collections import Counter
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from typing import List
+
+from app.sdk.models import KernelPlancksterSourceData
+from app.sdk.scraped_data_repository import ScrapedDataRepository
+
+
+logger = logging.getLogger(__name__)
+
+
+class ScraperProfiler:
+    """
+    Optional profiling of a scraper run, used as a context manager around `scrape()`.
+
+    - cprofile: deterministic profile of the calling thread, dumped as 'cprofile.pstats' (load it with `pstats.Stats`)
+    - tracemalloc_interval: every N seconds, the top allocation sites are written to 'tracemalloc_NNN.txt'
+    - stack_sample_interval: every N seconds, the stack of every thread is sampled; the samples are written as
+      folded stacks to 'wallclock_stacks.folded' (one 'thread;frame;frame count' line per distinct stack, the format
+      flamegraph tools expect)
+
+    Intervals of 0 disable the corresponding profiler. All files are written to `output_dir`.
+    """
+
+    def __init__(
+            self,
+            output_dir: str,
+            cprofile: bool = False,
+            tracemalloc_interval: float = 0.0,
+            stack_sample_interval: float = 0.0,
+            tracemalloc_top: int = 25,
+    ) -> None:
+        self._output_dir = output_dir
+        self._cprofile = cProfile.Profile() if cprofile else None
+        self._tracemalloc_interval = tracemalloc_interval
+        self._stack_sample_interval = stack_sample_interval
+        self._tracemalloc_top = tracemalloc_top
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._stack_samples: Counter = Counter()
+        self._snapshot_count = 0
+        self._output_files: List[str] = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._cprofile or self._tracemalloc_interval > 0 or self._stack_sample_interval > 0)
+
+    @property
+    def output_files(self) -> List[str]:
+        return list(self._output_files)
+
+    def __enter__(self) -> "ScraperProfiler":
+        if not self.enabled:
+            return self
+
+        os.makedirs(self._output_dir, exist_ok=True)
+        self._stop.clear()
+
+        if self._tracemalloc_interval > 0:
+            tracemalloc.start()
+            self._start_thread(self._tracemalloc_loop, "profiler-tracemalloc")
+
+        if self._stack_sample_interval > 0:
+            self._start_thread(self._stack_sample_loop, "profiler-stacks")
+
+        if self._cprofile:
+            self._cprofile.enable()
+
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if not self.enabled:
+            return
+
+        if self._cprofile:
+            self._cprofile.disable()
+            path = os.path.join(self._output_dir, "cprofile.pstats")
+            self._cprofile.dump_stats(path)
+            self._output_files.append(path)
+
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+        if self._tracemalloc_interval > 0:
+            self._write_tracemalloc_snapshot()
+            tracemalloc.stop()
+
+        if self._stack_sample_interval > 0:
+            path = os.path.join(self._output_dir, "wallclock_stacks.folded")
+            with open(path, "w") as f:
+                for stack, count in self._stack_samples.most_common():
+                    f.write(f"{stack} {count}\n")
+            self._output_files.append(path)
+
+        logger.info(f"Profiling output written to '{self._output_dir}': {self._output_files}")
+
+    def _start_thread(self, target, name: str) -> None:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _tracemalloc_loop(self) -> None:
+        while not self._stop.wait(self._tracemalloc_interval):
+            self._write_tracemalloc_snapshot()
+
+    def _write_tracemalloc_snapshot(self) -> None:
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+
+        path = os.path.join(self._output_dir, f"tracemalloc_{self._snapshot_count:03d}.txt")
+        with open(path, "w") as f:
+            f.write(f"current={current} peak={peak}\n")
+            for stat in snapshot.statistics("lineno")[:self._tracemalloc_top]:
+                f.write(f"{stat}\n")
+
+        self._snapshot_count += 1
+        self._output_files.append(path)
+
+    def _stack_sample_loop(self) -> None:
+        while not self._stop.wait(self._stack_sample_interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if names.get(ident, "").startswith("profiler-"):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._stack_samples[";".join(reversed(stack))] += 1
+
+    def register(self, scraped_data_repository: ScrapedDataRepository, case_study_name: str, tracer_id: str, job_id: int) -> List[KernelPlancksterSourceData]:
+        """
+        Upload every profiling output file next to the webcam report, through `register_scraped_json`.
+        """
+        registered = []
+        for path in self._output_files:
+            file_name = os.path.basename(path)
+            source_data = KernelPlancksterSourceData(
+                name=f"webcam_profile_{case_study_name}_{tracer_id}",
+                protocol=scraped_data_repository.protocol,
+                relative_path=f"{case_study_name}/{tracer_id}/{job_id}/webcam_report/profile/{file_name}",
+            )
+            try:
+                scraped_data_repository.register_scraped_json(
+                    source_data=source_data,
+                    job_id=job_id,
+                    local_file_name=path,
+                )
+                registered.append(source_data)
+            except Exception as error:
+                logger.warning(f"{job_id}: Could not upload profiling output '{path}': {error}")
+
+        return registered
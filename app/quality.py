@@ -0,0 +1,67 @@
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.frame_stats import laplacian_variance, rms_contrast, saturated_fraction
+
+
+# 'tag': score every frame and keep it; 'drop': also drop the frames failing a threshold before they are encoded
+QUALITY_MODES = ["tag", "drop"]
+
+
+@dataclass
+class FrameQuality:
+    """
+    Quality scores of a frame, computed on the luma of a copy downsampled to `STATS_WIDTH` pixels wide.
+
+    @attr sharpness: variance of the Laplacian; blur, fog and a camera caught mid-rotation bring it towards 0
+    @attr contrast: standard deviation of the luma, 0-1; fog, haze and a covered lens bring it towards 0
+    @attr saturated_fraction: fraction of the pixels crushed to black or blown out to white, 0-1, e.g. snow on the lens
+    """
+    sharpness: float
+    contrast: float
+    saturated_fraction: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass(frozen=True)
+class QualityGate:
+    """
+    Thresholds a frame must meet to be usable. Must stay picklable: it is sent to the worker processes.
+
+    @attr mode: one of `QUALITY_MODES`
+    @attr min_sharpness: lowest `FrameQuality.sharpness` of a usable frame
+    @attr min_contrast: lowest `FrameQuality.contrast` of a usable frame
+    @attr max_saturated_fraction: highest `FrameQuality.saturated_fraction` of a usable frame
+    """
+    mode: str = "tag"
+    min_sharpness: float = 5.0
+    min_contrast: float = 0.05
+    max_saturated_fraction: float = 0.5
+
+    @property
+    def drops(self) -> bool:
+        return self.mode == "drop"
+
+    def failures(self, quality: FrameQuality) -> List[str]:
+        """The scores of `quality` that miss their threshold, empty for a usable frame."""
+        failures = []
+        if quality.sharpness < self.min_sharpness:
+            failures.append("sharpness")
+        if quality.contrast < self.min_contrast:
+            failures.append("contrast")
+        if quality.saturated_fraction > self.max_saturated_fraction:
+            failures.append("saturated_fraction")
+        return failures
+
+
+def compute_frame_quality(gray: np.ndarray) -> FrameQuality:
+    """The quality of a frame from the luma of its downsampled copy, see `frame_stats.downsample` and `luma`."""
+    return FrameQuality(
+        sharpness=laplacian_variance(gray),
+        contrast=rms_contrast(gray),
+        saturated_fraction=saturated_fraction(gray),
+    )
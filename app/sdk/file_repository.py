@@ -1,25 +1,40 @@
+import asyncio
 import logging
 import os
 import shutil
+from typing import TYPE_CHECKING, AsyncIterator
 
+import httpx
 import requests
 from app.sdk.models import KernelPlancksterSourceData, ProtocolEnum
 
+if TYPE_CHECKING:
+    from app.bandwidth import TokenBucket
+
 
 class FileRepository:
     def __init__(
             self,
             protocol: ProtocolEnum,
             data_dir: str = "data",  # can be used for config
+            upload_bucket: "TokenBucket | None" = None,
     ) -> None:
         self._protocol = protocol
         self._data_dir = data_dir
+        # Budget shared by the uploads of every job on the host, None for no limit
+        self._upload_bucket = upload_bucket
         self._logger = logging.getLogger(__name__)
+        # Reused for every upload, so that connections are kept alive across frames
+        self._session = requests.Session()
 
     @property
     def protocol(self) -> ProtocolEnum:
         return self._protocol
 
+    @property
+    def upload_bucket(self) -> "TokenBucket | None":
+        return self._upload_bucket
+
     @property
     def data_dir(self) -> str:
         return self._data_dir
@@ -68,7 +83,12 @@ class FileRepository:
         """
 
         with open(file_path, "rb") as f:
-            upload_res = requests.put(signed_url, data=f, verify=False)
+            data = f
+            if self._upload_bucket is not None:
+                from app.bandwidth import ThrottledFile
+
+                data = ThrottledFile(f, os.path.getsize(file_path), self._upload_bucket)
+            upload_res = self._session.put(signed_url, data=data, verify=False)
 
         self.logger.info(f"Uploaded file to signed url: {signed_url}")
         self.logger.info(f"Upload response: {upload_res.text}")
@@ -78,3 +98,29 @@ class FileRepository:
         if upload_res.status_code != 200:
             raise ValueError(f"Failed to upload file to signed url: {upload_res.text}")
 
+
+    async def public_upload_async(self, signed_url: str, file_path: str, client: httpx.AsyncClient, chunk_size: int = 1024 * 1024) -> None:
+        """
+        Upload a file to a signed url, with an async client. The file is streamed in chunks, with its size as
+        Content-Length, since signed URLs do not accept chunked transfer encoding.
+
+        :param signed_url: The signed url to upload to.
+        :param file_path: The path to the file to upload.
+        :param client: The client to upload with, e.g. shared between all uploads of a job.
+        """
+
+        async def file_chunks() -> AsyncIterator[bytes]:
+            with open(file_path, "rb") as f:
+                while chunk := f.read(chunk_size):
+                    if self._upload_bucket is not None:
+                        await asyncio.sleep(self._upload_bucket.reserve(len(chunk)))
+                    yield chunk
+
+        headers = {"Content-Length": str(os.path.getsize(file_path))}
+        upload_res = await client.put(signed_url, content=file_chunks(), headers=headers)
+
+        self.logger.info(f"Uploaded file to signed url: {signed_url}")
+        self.logger.info(f"Upload status code: {upload_res.status_code}")
+
+        if upload_res.status_code != 200:
+            raise ValueError(f"Failed to upload file to signed url: {upload_res.text}")
@@ -1,38 +1,99 @@
+from dataclasses import dataclass
+import asyncio
 import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple
+from urllib.parse import quote
 import httpx
 
 from app.sdk.models import KernelPlancksterSourceData
 
 
+# Requests built by the gateways: (endpoint, params, headers)
+GatewayRequest = Tuple[str, Dict[str, str], Dict[str, str]]
 
-class KernelPlancksterGateway:
-    def __init__(self, host: str, port: str, auth_token: str, scheme: str) -> None:
+# Scoped grants are renewed this long before they expire, so that an upload never starts on an expiring grant
+SCOPED_GRANT_MARGIN_S = 60.0
+
+# After a failed scoped grant request, e.g. a 503, objects of the job get per-object signed URLs for this long
+SCOPED_GRANT_RETRY_S = 60.0
+
+# Answers of a Kernel Planckster without scoped upload credentials
+UNSUPPORTED_STATUS_CODES = {404, 405, 501}
+
+
+@dataclass(frozen=True)
+class ScopedUploadGrant:
+    """
+    Upload credentials for every object under a prefix, e.g. all the outputs of a job.
+
+    @attr prefix: the relative paths the grant covers start with it, e.g. '{case_study}/{tracer_id}/{job_id}/'
+    @attr url_template: the signed URL of an object, with '{relative_path}' in place of its relative path
+    @attr expires_at: Unix time after which uploads with the grant are refused
+    """
+    prefix: str
+    url_template: str
+    expires_at: float
+
+    def covers(self, relative_path: str, margin_s: float = SCOPED_GRANT_MARGIN_S) -> bool:
+        return relative_path.startswith(self.prefix) and time.time() + margin_s < self.expires_at
+
+    def signed_url(self, relative_path: str) -> str:
+        return self.url_template.replace("{relative_path}", quote(relative_path, safe="/"))
+
+
+def job_prefix(relative_path: str) -> str:
+    """The prefix of the job an object belongs to: the case study, tracer id and job id of its relative path."""
+    return "/".join(relative_path.split("/")[:3]) + "/"
+
+
+class _BaseKernelPlancksterGateway:
+    """
+    Builds the Kernel Planckster requests and checks their responses. The sync and async gateways only differ in
+    how the requests are sent.
+
+    With `scoped_credentials`, signed URLs come from one grant per job prefix (see `ScopedUploadGrant`), cached until
+    `SCOPED_GRANT_MARGIN_S` before it expires, instead of from a round trip per object. If Kernel Planckster does
+    not grant scoped credentials, the gateway falls back to per-object signed URLs for the rest of its life. If a
+    grant request fails otherwise, the job falls back to them for `SCOPED_GRANT_RETRY_S` before asking again.
+    """
+
+    def __init__(self, host: str, port: str, auth_token: str, scheme: str, scoped_credentials: bool = True) -> None:
         self._host = host
         self._port = port
         self._client_id = 1  # NOTE: this should match the default client for this project
         self._auth_token = auth_token
         self._scheme = scheme
         self._logger = logging.getLogger(__name__)
+        self._scoped_credentials = scoped_credentials
+        self._grants: Dict[Tuple[str, str], ScopedUploadGrant] = {}
+        # One lock per grant, so that concurrent callers wait for a single request instead of each making their own
+        self._grant_locks: Dict[Tuple[str, str], Any] = {}
+        # Unix time before which no grant is requested again, per grant whose last request failed
+        self._grant_retry_at: Dict[Tuple[str, str], float] = {}
+        self._grants_lock = threading.Lock()
 
     @property
     def url(self) -> str:
         return f"{self._scheme}://{self._host}:{self._port}"
 
-    @property   
+    @property
     def logger(self) -> logging.Logger:
         return self._logger
 
-    def ping(self) -> bool:
-        self.logger.info(f"Pinging Kernel Plankster Gateway at {self.url}")
-        res = httpx.get(f"{self.url}/ping")
-        self.logger.info(f"Ping response: {res.text}")
-        return res.status_code == 200
+    @property
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "x-auth-token": self._auth_token,
+            }
 
-    def generate_signed_url(self, source_data: KernelPlancksterSourceData) -> str:
-        if not self.ping():
-            self.logger.error(f"Failed to ping Kernel Plankster Gateway at {self.url}")
-            raise Exception("Failed to ping Kernel Plankster Gateway")
+    def _ping_failed(self) -> Exception:
+        self.logger.error(f"Failed to ping Kernel Plankster Gateway at {self.url}")
+        return Exception("Failed to ping Kernel Plankster Gateway")
 
+    def _signed_url_request(self, source_data: KernelPlancksterSourceData) -> GatewayRequest:
         self.logger.info(f"Generating signed url for {source_data.relative_path}")
 
         endpoint = f"{self.url}/client/{self._client_id}/upload-credentials"
@@ -42,17 +103,9 @@ class KernelPlancksterGateway:
             "relative_path": source_data.relative_path,
         }
 
-        headers = {
-            "Content-Type": "application/json",
-            "x-auth-token": self._auth_token,
-            }
-
-        res = httpx.get(
-            url=endpoint,
-            params=params,
-            headers=headers,
-        )
+        return endpoint, params, self._headers
 
+    def _parse_signed_url(self, res: httpx.Response) -> str:
         self.logger.info(f"Generate signed url response: {res.text}")
         if res.status_code != 200:
             raise ValueError(f"Failed to generate signed url: {res.text}")
@@ -65,20 +118,92 @@ class KernelPlancksterGateway:
             raise ValueError(f"Failed to generate signed url. Signed URL not found in response. Dumping raw response:\n{res_json}")
 
         return signed_url
-        
 
-    def register_new_source_data(self, source_data: KernelPlancksterSourceData) -> dict[str, str]:
+    @staticmethod
+    def _grant_key(source_data: KernelPlancksterSourceData) -> Tuple[str, str]:
+        return source_data.protocol.value, job_prefix(source_data.relative_path)
+
+    def _cached_grant(self, source_data: KernelPlancksterSourceData) -> ScopedUploadGrant | None:
+        with self._grants_lock:
+            grant = self._grants.get(self._grant_key(source_data))
+        return grant if grant is not None and grant.covers(source_data.relative_path) else None
+
+    def _may_request_grant(self, source_data: KernelPlancksterSourceData) -> bool:
+        """Whether a grant covering `source_data` can be requested: scoped credentials are on, and not backing off."""
+        if not self._scoped_credentials:
+            return False
+        with self._grants_lock:
+            return time.time() >= self._grant_retry_at.get(self._grant_key(source_data), 0.0)
+
+    def _grant_failed(self, source_data: KernelPlancksterSourceData) -> None:
+        with self._grants_lock:
+            self._grant_retry_at[self._grant_key(source_data)] = time.time() + SCOPED_GRANT_RETRY_S
+        self.logger.warning(f"Using per-object signed urls for {job_prefix(source_data.relative_path)} for {SCOPED_GRANT_RETRY_S:.0f} seconds")
+
+    def _grant_lock(self, source_data: KernelPlancksterSourceData, make_lock: Callable[[], Any]) -> Any:
+        """The lock serializing the requests of the grant covering `source_data`, made with `make_lock` if needed."""
+        key = self._grant_key(source_data)
+        with self._grants_lock:
+            lock = self._grant_locks.get(key)
+            if lock is None:
+                lock = self._grant_locks[key] = make_lock()
+            return lock
+
+    def drop_scoped_grant(self, source_data: KernelPlancksterSourceData) -> bool:
         """
-        Registers new source data with Kernel Plankster Gateway.
-        
-        Args:
-        - source_data: KernelPlancksterSourceData
+        Forget the grant covering `source_data`, e.g. after an upload with it was refused. Returns False if there
+        was none, i.e. its signed URL was a per-object one.
+        """
+        with self._grants_lock:
+            return self._grants.pop(self._grant_key(source_data), None) is not None
+
+    def _scoped_grant_request(self, source_data: KernelPlancksterSourceData) -> GatewayRequest:
+        prefix = job_prefix(source_data.relative_path)
+        self.logger.info(f"Requesting upload credentials scoped to {prefix}")
+
+        endpoint = f"{self.url}/client/{self._client_id}/scoped-upload-credentials"
+
+        params = {
+            "protocol": source_data.protocol.value,
+            "prefix": prefix,
+        }
 
+        return endpoint, params, self._headers
+
+    def _parse_scoped_grant(self, res: httpx.Response, source_data: KernelPlancksterSourceData) -> ScopedUploadGrant | None:
         """
-        if not self.ping():
-            self.logger.error(f"Failed to ping Kernel Plankster Gateway at {self.url}")
-            raise Exception("Failed to ping Kernel Plankster Gateway")
+        The grant in the response, None if it has none: scoped credentials are then disabled if unsupported, and the
+        job backs off for `SCOPED_GRANT_RETRY_S` otherwise.
+        """
+        if res.status_code in UNSUPPORTED_STATUS_CODES:
+            self.logger.warning(f"Kernel Planckster at {self.url} does not grant scoped upload credentials ({res.status_code}), falling back to per-object signed urls")
+            self._scoped_credentials = False
+            return None
+        if res.status_code != 200:
+            self.logger.warning(f"Failed to get scoped upload credentials ({res.status_code}), using a per-object signed url: {res.text}")
+            self._grant_failed(source_data)
+            return None
 
+        res_json = res.json()
+        prefix = job_prefix(source_data.relative_path)
+        try:
+            grant = ScopedUploadGrant(prefix=res_json["prefix"], url_template=res_json["url_template"], expires_at=float(res_json["expires_at"]))
+        except (KeyError, TypeError, ValueError):
+            self.logger.warning(f"Invalid scoped upload credentials, using a per-object signed url. Dumping raw response:\n{res_json}")
+            self._grant_failed(source_data)
+            return None
+        if grant.prefix != prefix or "{relative_path}" not in grant.url_template or not grant.covers(source_data.relative_path):
+            self.logger.warning(f"Scoped upload credentials do not cover {source_data.relative_path}, using a per-object signed url")
+            self._grant_failed(source_data)
+            return None
+
+        with self._grants_lock:
+            self._grants[(source_data.protocol.value, prefix)] = grant
+            self._grant_retry_at.pop((source_data.protocol.value, prefix), None)
+        self.logger.info(f"Got upload credentials scoped to {prefix}, valid for {grant.expires_at - time.time():.0f} seconds")
+        return grant
+
+    def _register_request(self, source_data: KernelPlancksterSourceData) -> GatewayRequest:
         self.logger.info(f"Registering new data with Kernel Plankster Gateway at {self.url}")
 
         params = {
@@ -89,17 +214,9 @@ class KernelPlancksterGateway:
 
         endpoint = f"{self.url}/client/{self._client_id}/source"
 
-        headers = {
-            "Content-Type": "application/json",
-            "x-auth-token": self._auth_token,
-            }
-
-        res = httpx.post(
-            url=endpoint,
-            params=params,
-            headers=headers,
-        )
+        return endpoint, params, self._headers
 
+    def _parse_registered(self, res: httpx.Response, source_data: KernelPlancksterSourceData) -> dict[str, str]:
         self.logger.info(f"Register new data response: {res.text}")
         if res.status_code != 200:
             raise ValueError(
@@ -121,3 +238,160 @@ class KernelPlancksterGateway:
         assert res_name == source_data.name
 
         return kp_source_data
+
+
+class KernelPlancksterGateway(_BaseKernelPlancksterGateway):
+    def __init__(self, host: str, port: str, auth_token: str, scheme: str, scoped_credentials: bool = True) -> None:
+        super().__init__(host, port, auth_token, scheme, scoped_credentials)
+        # Reused for every call, so that connections are kept alive across frames
+        self._client = httpx.Client()
+
+    def ping(self) -> bool:
+        self.logger.info(f"Pinging Kernel Plankster Gateway at {self.url}")
+        res = self._client.get(f"{self.url}/ping")
+        self.logger.info(f"Ping response: {res.text}")
+        return res.status_code == 200
+
+    def generate_signed_url(self, source_data: KernelPlancksterSourceData, scoped: bool = True) -> str:
+        """
+        A signed url to upload `source_data` to: from the scoped grant of its job if there is one, or can be had,
+        and `scoped` is set; from a per-object request otherwise.
+        """
+        if scoped and self._scoped_credentials:
+            grant = self._cached_grant(source_data)
+            if grant is None and self._may_request_grant(source_data):
+                with self._grant_lock(source_data, threading.Lock):
+                    # Another caller may have got the grant while this one waited
+                    grant = self._cached_grant(source_data)
+                    if grant is None and self._may_request_grant(source_data):
+                        grant = self.request_scoped_grant(source_data)
+            if grant is not None:
+                return grant.signed_url(source_data.relative_path)
+
+        if not self.ping():
+            raise self._ping_failed()
+
+        endpoint, params, headers = self._signed_url_request(source_data)
+        res = self._client.get(
+            url=endpoint,
+            params=params,
+            headers=headers,
+        )
+        return self._parse_signed_url(res)
+
+    def request_scoped_grant(self, source_data: KernelPlancksterSourceData) -> ScopedUploadGrant | None:
+        """A new grant for the job of `source_data`, None if Kernel Planckster does not grant one."""
+        endpoint, params, headers = self._scoped_grant_request(source_data)
+        try:
+            res = self._client.get(url=endpoint, params=params, headers=headers)
+        except httpx.HTTPError as error:
+            self.logger.warning(f"Failed to get scoped upload credentials, using a per-object signed url: {error}")
+            self._grant_failed(source_data)
+            return None
+        return self._parse_scoped_grant(res, source_data)
+
+    def register_new_source_data(self, source_data: KernelPlancksterSourceData) -> dict[str, str]:
+        """
+        Registers new source data with Kernel Plankster Gateway.
+
+        Args:
+        - source_data: KernelPlancksterSourceData
+
+        """
+        if not self.ping():
+            raise self._ping_failed()
+
+        endpoint, params, headers = self._register_request(source_data)
+        res = self._client.post(
+            url=endpoint,
+            params=params,
+            headers=headers,
+        )
+        return self._parse_registered(res, source_data)
+
+
+def make_async_client(max_connections: int = 100, max_keepalive_connections: int = 20, **kwargs: Any) -> httpx.AsyncClient:
+    """
+    An `httpx.AsyncClient` with connection limits, to share between async gateways and repositories. Calls beyond
+    `max_connections` wait for a free connection instead of opening more.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections),
+        timeout=httpx.Timeout(60.0, pool=None),
+        **kwargs,
+    )
+
+
+class AsyncKernelPlancksterGateway(_BaseKernelPlancksterGateway):
+    """
+    Same API as `KernelPlancksterGateway`, with coroutines, so that many calls can be in flight on one event loop.
+
+    Pass a `client` to share one connection pool (see `make_async_client`) between gateways; a gateway only closes
+    the client it created itself.
+    """
+
+    def __init__(self, host: str, port: str, auth_token: str, scheme: str, client: httpx.AsyncClient | None = None, scoped_credentials: bool = True) -> None:
+        super().__init__(host, port, auth_token, scheme, scoped_credentials)
+        self._owns_client = client is None
+        self._client = client if client is not None else make_async_client()
+
+    async def __aenter__(self) -> "AsyncKernelPlancksterGateway":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self._client.aclose()
+
+    async def ping(self) -> bool:
+        self.logger.info(f"Pinging Kernel Plankster Gateway at {self.url}")
+        res = await self._client.get(f"{self.url}/ping")
+        self.logger.info(f"Ping response: {res.text}")
+        return res.status_code == 200
+
+    async def generate_signed_url(self, source_data: KernelPlancksterSourceData, scoped: bool = True) -> str:
+        if scoped and self._scoped_credentials:
+            grant = self._cached_grant(source_data)
+            if grant is None and self._may_request_grant(source_data):
+                async with self._grant_lock(source_data, asyncio.Lock):
+                    # Another caller may have got the grant while this one waited
+                    grant = self._cached_grant(source_data)
+                    if grant is None and self._may_request_grant(source_data):
+                        grant = await self.request_scoped_grant(source_data)
+            if grant is not None:
+                return grant.signed_url(source_data.relative_path)
+
+        if not await self.ping():
+            raise self._ping_failed()
+
+        endpoint, params, headers = self._signed_url_request(source_data)
+        res = await self._client.get(
+            url=endpoint,
+            params=params,
+            headers=headers,
+        )
+        return self._parse_signed_url(res)
+
+    async def request_scoped_grant(self, source_data: KernelPlancksterSourceData) -> ScopedUploadGrant | None:
+        endpoint, params, headers = self._scoped_grant_request(source_data)
+        try:
+            res = await self._client.get(url=endpoint, params=params, headers=headers)
+        except httpx.HTTPError as error:
+            self.logger.warning(f"Failed to get scoped upload credentials, using a per-object signed url: {error}")
+            self._grant_failed(source_data)
+            return None
+        return self._parse_scoped_grant(res, source_data)
+
+    async def register_new_source_data(self, source_data: KernelPlancksterSourceData) -> dict[str, str]:
+        if not await self.ping():
+            raise self._ping_failed()
+
+        endpoint, params, headers = self._register_request(source_data)
+        res = await self._client.post(
+            url=endpoint,
+            params=params,
+            headers=headers,
+        )
+        return self._parse_registered(res, source_data)
@@ -1,6 +1,7 @@
 from enum import Enum
 import os
 import re
+from string import Formatter
 from typing import List, TypeVar
 from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
@@ -24,6 +25,13 @@ class ProtocolEnum(Enum):
     LOCAL = "local"
 
 
+_ALL_PROTOCOLS_STR = [p.value for p in ProtocolEnum]
+_IMPLEMENTED_PROTOCOLS = [ProtocolEnum.S3]
+_IMPLEMENTED_PROTOCOLS_STR = [p.value for p in _IMPLEMENTED_PROTOCOLS]
+
+_RELATIVE_PATH_FORBIDDEN_CHARACTERS = re.compile(r"[^a-zA-Z0-9_\./-]")
+
+
 class KernelPlancksterSourceData(BaseModel):
     """
     Synchronize this with Kernel Planckster's SourceData model, so that this client generates valid requests.
@@ -67,8 +75,7 @@ class KernelPlancksterSourceData(BaseModel):
             value_error_msg += f"The relative path must not be empty. "
             raise ValueError(value_error_msg)
 
-        v2 = re.sub(r"[^a-zA-Z0-9_\./-]", "", v)
-        if v != v2:
+        if _RELATIVE_PATH_FORBIDDEN_CHARACTERS.search(v):
             value_error_flag = True
             value_error_msg += f"The relative path must contain only alphanumeric characters, underscores, slashes, and dots. Other characters are not allowed. "
 
@@ -90,24 +97,19 @@ class KernelPlancksterSourceData(BaseModel):
 
     @classmethod
     def protocol_validation(cls, v: str) -> ProtocolEnum:
-        all_protocols = [e for e in ProtocolEnum]
-        all_protocols_str = [p.value for p in all_protocols]
-        implemented_protocols = [ProtocolEnum.S3]
-        implemented_protocols_str = [p.value for p in implemented_protocols]
-
         try:
             enum = ProtocolEnum(v)
         except ValueError:
             raise ValueError(
-                f"'{v}' is not a valid protocol. Valid protocols are:\n{all_protocols_str}\nImplemented protocols are:\n{implemented_protocols_str}"
+                f"'{v}' is not a valid protocol. Valid protocols are:\n{_ALL_PROTOCOLS_STR}\nImplemented protocols are:\n{_IMPLEMENTED_PROTOCOLS_STR}"
             )
 
-        if enum not in implemented_protocols:
+        if enum not in _IMPLEMENTED_PROTOCOLS:
             raise ValueError(
-                f"The protocol '{v}' is not implemented. Please use one of the following: {implemented_protocols_str}"
+                f"The protocol '{v}' is not implemented. Please use one of the following: {_IMPLEMENTED_PROTOCOLS_STR}"
             )
 
-        return ProtocolEnum(v)
+        return enum
 
     @field_validator("name")
     def name_must_not_be_empty(cls, v: str) -> str:
@@ -122,6 +124,40 @@ class KernelPlancksterSourceData(BaseModel):
         return cls.protocol_validation(v.value)
 
 
+class TrustedSourceDataBuilder:
+    """
+    Builds `KernelPlancksterSourceData` whose relative paths all follow one template, e.g. the frames of a job,
+    without running the validators for every instance.
+
+    The name, the protocol and the relative path template are validated once, with the model's own validators, the
+    template being filled with the `samples` given for each of its placeholders. Instances are then created with
+    `model_construct`. Only fill the placeholders with trusted values: ints, or strings that are validated beforehand
+    (e.g. with `string_validator` at startup). Build anything else with the `KernelPlancksterSourceData` constructor.
+    """
+
+    def __init__(self, name: str, protocol: ProtocolEnum, relative_path_template: str, **samples: str | int) -> None:
+        placeholders = {field for _, field, _, _ in Formatter().parse(relative_path_template) if field is not None}
+        missing = placeholders - samples.keys()
+        if missing:
+            raise ValueError(f"No sample value given for the placeholders {sorted(missing)} of '{relative_path_template}'")
+
+        sample = KernelPlancksterSourceData(
+            name=name,
+            protocol=protocol,
+            relative_path=relative_path_template.format(**samples),
+        )
+        self._name = sample.name
+        self._protocol = sample.protocol
+        self._relative_path_template = relative_path_template
+
+    def build(self, **values: str | int) -> KernelPlancksterSourceData:
+        return KernelPlancksterSourceData.model_construct(
+            name=self._name,
+            protocol=self._protocol,
+            relative_path=self._relative_path_template.format(**values),
+        )
+
+
 class BaseJob(BaseModel):
     """
     NOTE: deprecated.
@@ -1,6 +1,8 @@
+import asyncio
 import logging
+import httpx
 from app.sdk.file_repository import FileRepository
-from app.sdk.kernel_plackster_gateway import KernelPlancksterGateway
+from app.sdk.kernel_plackster_gateway import AsyncKernelPlancksterGateway, KernelPlancksterGateway, make_async_client
 from app.sdk.models import KernelPlancksterSourceData, ProtocolEnum
 
 
@@ -27,21 +29,30 @@ class ScrapedDataRepository:
         return self._logger
 
 
+    def _upload(self, source_data: KernelPlancksterSourceData, job_id: int, local_file_name: str, file_type: str) -> None:
+        signed_url = self.kernel_planckster.generate_signed_url(source_data=source_data)
+
+        self.logger.info(f"{job_id}: Uploading {file_type} to object store")
+
+        try:
+            self.file_repository.public_upload(signed_url, local_file_name)
+        except ValueError:
+            # A scoped grant can be revoked before it expires: retry once with a per-object signed url
+            if not self.kernel_planckster.drop_scoped_grant(source_data):
+                raise
+            self.logger.warning(f"{job_id}: Upload with scoped credentials refused, retrying with a per-object signed url")
+            signed_url = self.kernel_planckster.generate_signed_url(source_data=source_data, scoped=False)
+            self.file_repository.public_upload(signed_url, local_file_name)
+
+        self.logger.info(f"{job_id}: Uploaded {file_type} to {signed_url}")
+
     def register_scraped_photo(self, source_data: KernelPlancksterSourceData, job_id: int, local_file_name: str) -> KernelPlancksterSourceData:
 
         match self.protocol:
 
             case ProtocolEnum.S3:
 
-                signed_url = self.kernel_planckster.generate_signed_url(source_data=source_data) 
-                
-                self.logger.info(f"{job_id}: Uploading photo to object store")
-
-                self.file_repository.public_upload(signed_url, local_file_name)
-                
-                self.logger.info(
-                f"{job_id}: Uploaded photo to {signed_url}"
-                )
+                self._upload(source_data, job_id, local_file_name, "photo")
 
                 self.kernel_planckster.register_new_source_data(source_data=source_data)
 
@@ -64,15 +75,7 @@ class ScrapedDataRepository:
 
             case ProtocolEnum.S3:
 
-                signed_url = self.kernel_planckster.generate_signed_url(source_data=source_data) 
-                
-                self.logger.info(f"{job_id}: Uploading video to object store")
-
-                self.file_repository.public_upload(signed_url, local_file_name)
-                
-                self.logger.info(
-                f"{job_id}: Uploaded video to {signed_url}"
-                )
+                self._upload(source_data, job_id, local_file_name, "video")
 
                 self.kernel_planckster.register_new_source_data(source_data=source_data)
 
@@ -92,15 +95,7 @@ class ScrapedDataRepository:
 
             case ProtocolEnum.S3:
 
-                signed_url = self.kernel_planckster.generate_signed_url(source_data=source_data) 
-                
-                self.logger.info(f"{job_id}: Uploading json to object store")
-
-                self.file_repository.public_upload(signed_url, local_file_name)
-                
-                self.logger.info(
-                f"{job_id}: Uploaded json to {signed_url}"
-                )
+                self._upload(source_data, job_id, local_file_name, "json")
 
                 self.kernel_planckster.register_new_source_data(source_data=source_data)
 
@@ -113,4 +108,87 @@ class ScrapedDataRepository:
                 file_type="json",
                 )
 
-        return source_data
\ No newline at end of file
+        return source_data
+
+
+class AsyncScrapedDataRepository:
+    """
+    Same API as `ScrapedDataRepository`, with coroutines: signed URLs, uploads and registrations of many files can
+    be in flight at once on one event loop.
+
+    Uploads go through `upload_client`, by default a client with connection limits and without TLS verification
+    (as the sync uploads). Pass one to share its connection pool; the repository only closes a client it created.
+    """
+
+    def __init__(
+            self,
+            protocol: ProtocolEnum,
+            kernel_planckster: AsyncKernelPlancksterGateway,
+            file_repository: FileRepository,
+            upload_client: httpx.AsyncClient | None = None,
+    ) -> None:
+        self.protocol = protocol
+        self.kernel_planckster = kernel_planckster
+        self.file_repository = file_repository
+        self._owns_upload_client = upload_client is None
+        self._upload_client = upload_client if upload_client is not None else make_async_client(verify=False)
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self._logger
+
+    async def __aenter__(self) -> "AsyncScrapedDataRepository":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._owns_upload_client:
+            await self._upload_client.aclose()
+        await self.kernel_planckster.aclose()
+
+    async def _register(self, source_data: KernelPlancksterSourceData, job_id: int, local_file_name: str, file_type: str) -> KernelPlancksterSourceData:
+
+        match self.protocol:
+
+            case ProtocolEnum.S3:
+
+                signed_url = await self.kernel_planckster.generate_signed_url(source_data=source_data)
+
+                self.logger.info(f"{job_id}: Uploading {file_type} to object store")
+
+                try:
+                    await self.file_repository.public_upload_async(signed_url, local_file_name, self._upload_client)
+                except ValueError:
+                    # A scoped grant can be revoked before it expires: retry once with a per-object signed url
+                    if not self.kernel_planckster.drop_scoped_grant(source_data):
+                        raise
+                    self.logger.warning(f"{job_id}: Upload with scoped credentials refused, retrying with a per-object signed url")
+                    signed_url = await self.kernel_planckster.generate_signed_url(source_data=source_data, scoped=False)
+                    await self.file_repository.public_upload_async(signed_url, local_file_name, self._upload_client)
+
+                self.logger.info(f"{job_id}: Uploaded {file_type} to {signed_url}")
+
+                await self.kernel_planckster.register_new_source_data(source_data=source_data)
+
+            case ProtocolEnum.LOCAL:
+                # NOTE: local is deprecated
+                await asyncio.to_thread(
+                    self.file_repository.save_file_locally,
+                    file_to_save=local_file_name,
+                    source_data=source_data,
+                    file_type=file_type,
+                )
+
+        return source_data
+
+    async def register_scraped_photo(self, source_data: KernelPlancksterSourceData, job_id: int, local_file_name: str) -> KernelPlancksterSourceData:
+        return await self._register(source_data, job_id, local_file_name, "photo")
+
+    async def register_scraped_video_or_document(self, source_data: KernelPlancksterSourceData, job_id: int, local_file_name: str) -> KernelPlancksterSourceData:
+        return await self._register(source_data, job_id, local_file_name, "video")
+
+    async def register_scraped_json(self, source_data: KernelPlancksterSourceData, job_id: int, local_file_name: str) -> KernelPlancksterSourceData:
+        return await self._register(source_data, job_id, local_file_name, "json")
@@ -2,11 +2,14 @@ from datetime import datetime
 from logging import Logger
 import os
 import re
-from typing import Tuple
+from typing import TYPE_CHECKING, Tuple
 
-from app.sdk.file_repository import FileRepository
-from app.sdk.kernel_plackster_gateway import KernelPlancksterGateway
-from app.sdk.models import ProtocolEnum
+if TYPE_CHECKING:
+    # Imported when setting up, so that validating the arguments does not load the SDK and its HTTP clients
+    from app.bandwidth import TokenBucket
+    from app.sdk.file_repository import FileRepository
+    from app.sdk.kernel_plackster_gateway import KernelPlancksterGateway
+    from app.sdk.models import ProtocolEnum
 
 def string_validator(value: str, arg_name: str) -> str:
     value_error_flag = False
@@ -43,7 +46,8 @@ def _setup_kernel_planckster(
     kernel_planckster_port: int,
     kernel_planckster_auth_token: str,
     kernel_planckster_scheme: str,
-) -> KernelPlancksterGateway:
+) -> "KernelPlancksterGateway":
+    from app.sdk.kernel_plackster_gateway import KernelPlancksterGateway
 
     try:
 
@@ -71,15 +75,18 @@ def _setup_kernel_planckster(
 
 def _setup_file_repository(
     job_id: int,
-    storage_protocol: ProtocolEnum,
+    storage_protocol: "ProtocolEnum",
     logger: Logger,
-) -> FileRepository:
+    upload_bucket: "TokenBucket | None" = None,
+) -> "FileRepository":
+    from app.sdk.file_repository import FileRepository
 
     try:
         logger.info(f"{job_id}: Setting up the File Repository.")
 
         file_repository = FileRepository(
             protocol=storage_protocol,
+            upload_bucket=upload_bucket,
         )
 
         logger.info(f"{job_id}: File Repository setup successfully.")
@@ -99,12 +106,14 @@ def setup(
     kp_host: str,
     kp_port: int,
     kp_scheme: str,
-) -> Tuple[KernelPlancksterGateway, ProtocolEnum, FileRepository]:
+    upload_bucket: "TokenBucket | None" = None,
+) -> Tuple["KernelPlancksterGateway", "ProtocolEnum", "FileRepository"]:
     """
     Setup the Kernel Planckster Gateway, the storage protocol and the file repository.
 
     NOTE: needs and '.env' file within context.
     """
+    from app.sdk.models import ProtocolEnum
 
     try:
         kernel_planckster = _setup_kernel_planckster(
@@ -120,7 +129,7 @@ def setup(
 
         logger.info(f"{job_id}: Storage protocol: {protocol}")
 
-        file_repository = _setup_file_repository(job_id, protocol, logger)
+        file_repository = _setup_file_repository(job_id, protocol, logger, upload_bucket)
 
         return kernel_planckster, protocol, file_repository
 
@@ -0,0 +1,142 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List
+
+from app.sdk.models import BaseJobState, JobOutput, KernelPlancksterSourceData
+from app.sdk.scraped_data_repository import ScrapedDataRepository
+from app.staging import StagingArea, staging_root
+
+if TYPE_CHECKING:
+    from app.bandwidth import TokenBucket
+    from app.url_image_scraper import ScrapeJob
+
+
+logger = logging.getLogger(__name__)
+
+
+def shard_of(date: datetime, interval: timedelta, shard_count: int) -> int:
+    """
+    The shard of a capture time: its slot, i.e. the number of `interval`s since the Unix epoch, modulo
+    `shard_count`. It only depends on the capture time, so shards given the same interval never overlap, whatever
+    date range each of them is run with. Consecutive capture times go to different shards, which spreads night and
+    day, and missing frames, evenly between them.
+    """
+    return (int(date.timestamp()) // int(interval.total_seconds())) % shard_count
+
+
+def shard_capture_times(capture_times: Iterable[datetime], shard_index: int, shard_count: int, interval: timedelta) -> Iterator[datetime]:
+    """Keep the capture times of shard `shard_index` out of `shard_count`."""
+    return (date for date in capture_times if shard_of(date, interval, shard_count) == shard_index)
+
+
+def shard_capacity(start_date: datetime, end_date: datetime, interval: timedelta, shard_count: int) -> int:
+    """The most capture times one shard can get between `start_date` and `end_date`."""
+    slots = int((end_date - start_date) / interval) + 1
+    return -(-slots // shard_count)
+
+
+def shard_label(shard_index: int, shard_count: int) -> str:
+    """Directory of the job-level outputs of a shard (report, archive, cube, statistics), under the parent job."""
+    return f"date-shard-{shard_index}-of-{shard_count}"
+
+
+def load_report(path: str) -> Dict[int, Any]:
+    with open(path) as f:
+        return {int(unix_timestamp): entry for unix_timestamp, entry in json.load(f).items()}
+
+
+def merge_reports(reports: Iterable[Dict[int, Any]]) -> Dict[int, Any]:
+    """
+    Merge the webcam reports of the shards of a job into one, in timestamp order. Raises a ValueError if two
+    reports share a timestamp, i.e. if the shards overlapped or a report was given twice.
+    """
+    merged: Dict[int, Any] = {}
+    for report in reports:
+        overlap = merged.keys() & report.keys()
+        if overlap:
+            raise ValueError(f"Shard reports overlap on {len(overlap)} timestamps, e.g. {min(overlap)}")
+        merged.update(report)
+    return dict(sorted(merged.items()))
+
+
+def register_merged_report(report_paths: List[str], file_dir: str, scraped_data_repository: ScrapedDataRepository, case_study_name: str, tracer_id: str, job_id: int) -> KernelPlancksterSourceData:
+    """
+    Merge the shard reports saved at `report_paths` and register the result as the webcam report of `job_id`.
+    The merged report is staged in a staging area of its own under `file_dir`.
+    """
+    from app.url_image_scraper import register_job_output, save_report
+
+    merged = merge_reports(load_report(path) for path in report_paths)
+    logger.info(f"{job_id}: Merged {len(report_paths)} shard reports into {len(merged)} timestamps")
+
+    staging = StagingArea(staging_root(file_dir), f"job-{job_id}-merge")
+    try:
+        report_path = os.path.join(staging.path, "webcam_report.json")
+        save_report(merged, report_path)
+        return register_job_output("webcam_report", report_path, scraped_data_repository, case_study_name, tracer_id, job_id)
+    finally:
+        staging.close()
+
+
+def scrape_sharded(job: "ScrapeJob", shard_count: int, scraped_data_repository: ScrapedDataRepository, download_bucket: "TokenBucket | None" = None) -> JobOutput:
+    """
+    Split a job into `shard_count` shards run concurrently in this process, then register the merged webcam report
+    under the job's id.
+
+    Shards fetch on their own threads and, with `job.workers` greater than 0, share one frame processing pool. The
+    job fails if any shard failed; the report of the other shards is still merged and registered. Every shard stages
+    its files in an area of its own under `job.file_dir`, and the shard reports are kept in another one until merged.
+    """
+    from app.processing import make_frame_executor
+    from app.url_image_scraper import scrape
+
+    report_staging = StagingArea(staging_root(job.file_dir, job.staging_quota_bytes), f"job-{job.job_id}-shard-reports")
+    report_paths = [os.path.join(report_staging.path, f"{shard_label(shard_index, shard_count)}.json") for shard_index in range(shard_count)]
+
+    frame_executor = make_frame_executor(job.workers) if job.workers > 0 else None
+    try:
+        with ThreadPoolExecutor(max_workers=shard_count, thread_name_prefix="shard") as executor:
+            futures = [
+                executor.submit(
+                    scrape,
+                    replace(job, shard_index=shard_index, shard_count=shard_count, report_path=report_paths[shard_index]),
+                    scraped_data_repository=scraped_data_repository,
+                    frame_executor=frame_executor,
+                    download_bucket=download_bucket,
+                )
+                for shard_index in range(shard_count)
+            ]
+            shard_outputs = [future.result() for future in futures]
+    except BaseException:
+        report_staging.close()
+        raise
+    finally:
+        if frame_executor is not None:
+            frame_executor.shutdown()
+
+    source_data_list = [source_data for output in shard_outputs for source_data in output.source_data_list]
+    failed = [shard_index for shard_index, output in enumerate(shard_outputs) if output.job_state == BaseJobState.FAILED]
+    if failed:
+        logger.error(f"{job.job_id}: Shards {failed} out of {shard_count} failed")
+    job_state = BaseJobState.FAILED if failed else BaseJobState.FINISHED
+
+    try:
+        source_data_list.append(register_merged_report(
+            [path for path in report_paths if os.path.exists(path)],
+            job.file_dir, scraped_data_repository, job.case_study_name, job.tracer_id, job.job_id,
+        ))
+    except Exception as error:
+        logger.warning(f"Could not register the merged webcam report: {error}")
+        job_state = BaseJobState.FAILED
+    finally:
+        report_staging.close()
+
+    return JobOutput(
+        job_state=job_state,
+        tracer_id=job.tracer_id,
+        source_data_list=source_data_list,
+    )
@@ -0,0 +1,74 @@
+import numpy as np
+
+
+def solar_elevation(unix_timestamps: np.ndarray, latitude: float, longitude: float) -> np.ndarray:
+    """
+    Apparent elevation of the sun, in degrees above the horizon, at each Unix timestamp, seen from (latitude,
+    longitude) in decimal degrees.
+
+    Vectorized version of the NOAA solar position algorithm (NOAA Global Monitoring Laboratory solar calculator),
+    including its approximation of atmospheric refraction. Accurate to well under a degree between 1800 and 2100,
+    which is plenty to tell night from day.
+    """
+    timestamps = np.asarray(unix_timestamps, dtype=np.float64)
+
+    julian_day = timestamps / 86400.0 + 2440587.5
+    julian_century = (julian_day - 2451545.0) / 36525.0
+
+    mean_longitude = np.mod(280.46646 + julian_century * (36000.76983 + julian_century * 0.0003032), 360.0)
+    mean_anomaly = 357.52911 + julian_century * (35999.05029 - 0.0001537 * julian_century)
+    eccentricity = 0.016708634 - julian_century * (0.000042037 + 0.0000001267 * julian_century)
+
+    anomaly_rad = np.radians(mean_anomaly)
+    equation_of_center = (
+        np.sin(anomaly_rad) * (1.914602 - julian_century * (0.004817 + 0.000014 * julian_century))
+        + np.sin(2 * anomaly_rad) * (0.019993 - 0.000101 * julian_century)
+        + np.sin(3 * anomaly_rad) * 0.000289
+    )
+    omega_rad = np.radians(125.04 - 1934.136 * julian_century)
+    apparent_longitude = mean_longitude + equation_of_center - 0.00569 - 0.00478 * np.sin(omega_rad)
+
+    mean_obliquity = 23.0 + (26.0 + (21.448 - julian_century * (46.815 + julian_century * (0.00059 - julian_century * 0.001813))) / 60.0) / 60.0
+    obliquity_rad = np.radians(mean_obliquity + 0.00256 * np.cos(omega_rad))
+    declination_rad = np.arcsin(np.sin(obliquity_rad) * np.sin(np.radians(apparent_longitude)))
+
+    # Equation of time, in minutes
+    y = np.tan(obliquity_rad / 2) ** 2
+    longitude_rad = np.radians(mean_longitude)
+    equation_of_time = 4 * np.degrees(
+        y * np.sin(2 * longitude_rad)
+        - 2 * eccentricity * np.sin(anomaly_rad)
+        + 4 * eccentricity * y * np.sin(anomaly_rad) * np.cos(2 * longitude_rad)
+        - 0.5 * y ** 2 * np.sin(4 * longitude_rad)
+        - 1.25 * eccentricity ** 2 * np.sin(2 * anomaly_rad)
+    )
+
+    minutes_utc = np.mod(timestamps, 86400.0) / 60.0
+    true_solar_time = np.mod(minutes_utc + equation_of_time + 4 * longitude, 1440.0)
+    hour_angle_rad = np.radians(true_solar_time / 4 - 180.0)
+
+    latitude_rad = np.radians(latitude)
+    cos_zenith = (
+        np.sin(latitude_rad) * np.sin(declination_rad)
+        + np.cos(latitude_rad) * np.cos(declination_rad) * np.cos(hour_angle_rad)
+    )
+    elevation = 90.0 - np.degrees(np.arccos(np.clip(cos_zenith, -1.0, 1.0)))
+
+    return elevation + _refraction(elevation)
+
+
+def _refraction(elevation: np.ndarray) -> np.ndarray:
+    """NOAA's approximation of atmospheric refraction, in degrees, for a geometric elevation in degrees."""
+    tan_elevation = np.tan(np.radians(np.clip(elevation, -89.0, 89.0)))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # np.select evaluates every branch, including the ones dividing by tan(0)
+        arcseconds = np.select(
+            [elevation > 85.0, elevation > 5.0, elevation > -0.575],
+            [
+                np.zeros_like(elevation),
+                58.1 / tan_elevation - 0.07 / tan_elevation ** 3 + 0.000086 / tan_elevation ** 5,
+                1735.0 + elevation * (-518.2 + elevation * (103.4 + elevation * (-12.79 + elevation * 0.711))),
+            ],
+            default=-20.772 / tan_elevation,
+        )
+    return arcseconds / 3600.0
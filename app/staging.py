@@ -0,0 +1,198 @@
+from contextlib import contextmanager
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, List, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Longest wait for staging space. Jobs hold part of the budget until they end, e.g. for their frame cube: two jobs
+# whose held space leaves no room for the other's uploads would otherwise wait for each other forever
+STAGING_WAIT_TIMEOUT_S = 300.0
+
+
+class StagingTimeout(TimeoutError):
+    """No staging space was released within the wait timeout: the budget is too small for the concurrent jobs."""
+
+
+class StagingRoot:
+    """
+    A directory holding the staging areas of the jobs of a process, with a hard budget of `quota_bytes` shared by
+    all of them (None for no budget). Point it at a tmpfs, e.g. '/dev/shm/webcam-scraper', to keep temporary files
+    off the disk.
+
+    The root itself is never deleted: jobs only ever remove the area they created in it.
+    """
+
+    def __init__(self, path: str, quota_bytes: int | None = None, wait_timeout_s: float = STAGING_WAIT_TIMEOUT_S) -> None:
+        if quota_bytes is not None and quota_bytes <= 0:
+            raise ValueError(f"The staging quota must be greater than 0 bytes. Found: {quota_bytes}")
+        os.makedirs(path, exist_ok=True)
+        self._path = path
+        self._quota_bytes = quota_bytes
+        self._wait_timeout_s = wait_timeout_s
+        self._used_bytes = 0
+        self._room = threading.Condition()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def quota_bytes(self) -> int | None:
+        return self._quota_bytes
+
+    @property
+    def used_bytes(self) -> int:
+        return self._used_bytes
+
+    def try_reserve(self, amount: int) -> bool:
+        """Take `amount` bytes of the budget if they are free, without waiting."""
+        with self._room:
+            if self._quota_bytes is not None and self._used_bytes + amount > self._quota_bytes:
+                return False
+            self._used_bytes += amount
+            return True
+
+    def reserve(self, amount: int) -> float:
+        """
+        Take `amount` bytes of the budget, waiting until other jobs release enough of it. Returns the time waited, in
+        seconds. Raises a ValueError if `amount` is larger than the whole budget, and a `StagingTimeout` if not enough
+        of it was released within the wait timeout.
+        """
+        if self._quota_bytes is not None and amount > self._quota_bytes:
+            raise ValueError(f"{amount} bytes do not fit in a staging quota of {self._quota_bytes} bytes")
+        start = time.perf_counter()
+        with self._room:
+            fits = self._room.wait_for(lambda: self._quota_bytes is None or self._used_bytes + amount <= self._quota_bytes, timeout=self._wait_timeout_s)
+            if not fits:
+                raise StagingTimeout(
+                    f"Waited {self._wait_timeout_s:.0f} s for {amount} bytes of staging space in '{self._path}', "
+                    f"{self._used_bytes} of {self._quota_bytes} bytes are held by the jobs. Raise the staging quota or run fewer jobs at once."
+                )
+            self._used_bytes += amount
+        return time.perf_counter() - start
+
+    def release(self, amount: int) -> None:
+        with self._room:
+            self._used_bytes = max(0, self._used_bytes - amount)
+            self._room.notify_all()
+
+
+_roots: Dict[Tuple[str, int | None], StagingRoot] = {}
+_roots_lock = threading.Lock()
+
+
+def staging_root(path: str, quota_bytes: int | None = None) -> StagingRoot:
+    """
+    The staging root at `path` with `quota_bytes`, one instance per process, so that the concurrent jobs staging
+    there with the same quota share it.
+    """
+    key = (os.path.realpath(path), quota_bytes)
+    with _roots_lock:
+        if key not in _roots:
+            _roots[key] = StagingRoot(path, quota_bytes)
+        return _roots[key]
+
+
+class StagingArea:
+    """
+    The temporary files of one job: a directory of its own, with a unique name, under a `StagingRoot`.
+
+    Every byte written in the area is reserved from the root's budget first, so that a job waits, rather than fills
+    the volume, while concurrent jobs hold the budget. Small files, e.g. the frames uploaded one at a time, are
+    staged with `staged_file` and recycled through a pool: a released file is truncated and written over by the next
+    one instead of being unlinked. `close` removes the area and what is left in it, and nothing outside of it.
+    """
+
+    def __init__(self, root: StagingRoot, name: str) -> None:
+        self._root = root
+        self._path = tempfile.mkdtemp(prefix=f"{name}-", dir=root.path)
+        self._lock = threading.Lock()
+        self._free_files: List[str] = []
+        self._file_count = 0
+        self._held_bytes = 0
+        self._peak_bytes = 0
+        self._wait_s = 0.0
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def root(self) -> StagingRoot:
+        return self._root
+
+    def dir(self, *parts: str) -> str:
+        """A directory of the area, created if needed."""
+        path = os.path.join(self._path, *parts)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def try_reserve(self, amount: int) -> bool:
+        if not self._root.try_reserve(amount):
+            return False
+        self._held(amount)
+        return True
+
+    def reserve(self, amount: int) -> None:
+        wait_s = self._root.reserve(amount)
+        if wait_s > 0.01:
+            logger.info(f"Waited {wait_s:.2f} s for {amount} bytes of staging space in '{self._root.path}'")
+        with self._lock:
+            self._wait_s += wait_s
+        self._held(amount)
+
+    def release(self, amount: int) -> None:
+        with self._lock:
+            amount = min(amount, self._held_bytes)
+            self._held_bytes -= amount
+        self._root.release(amount)
+
+    def _held(self, amount: int) -> None:
+        with self._lock:
+            self._held_bytes += amount
+            self._peak_bytes = max(self._peak_bytes, self._held_bytes)
+
+    @contextmanager
+    def staged_file(self, data: bytes) -> Iterator[str]:
+        """Write `data` to a pooled file of the area for the duration of the block, e.g. to upload it."""
+        self.reserve(len(data))
+        with self._lock:
+            if self._free_files:
+                path = self._free_files.pop()
+            else:
+                path = os.path.join(self._path, f"staged-{self._file_count:04d}")
+                self._file_count += 1
+        try:
+            with open(path, "wb") as f:
+                f.write(data)
+            yield path
+        finally:
+            try:
+                os.truncate(path, 0)
+                with self._lock:
+                    self._free_files.append(path)
+            except OSError as error:
+                logger.warning(f"Could not recycle staged file '{path}': {error}")
+            self.release(len(data))
+
+    def usage(self) -> Dict[str, float]:
+        """The bytes the area holds and held at most, and the time it waited for staging space."""
+        with self._lock:
+            return {
+                "held_bytes": self._held_bytes,
+                "peak_bytes": self._peak_bytes,
+                "wait_s": self._wait_s,
+                "pooled_files": self._file_count,
+            }
+
+    def close(self) -> None:
+        """Release what the area still holds and remove it."""
+        self.release(self._held_bytes)
+        shutil.rmtree(self._path, ignore_errors=True)
+        logger.info(f"Deleted staging area '{self._path}'")
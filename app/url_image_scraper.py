@@ -1,68 +1,320 @@
 from datetime import datetime, timedelta
-from pprint import pprint
-from app.sdk.models import KernelPlancksterSourceData, BaseJobState, JobOutput
+from pprint import pformat
+from app.sdk.models import KernelPlancksterSourceData, BaseJobState, JobOutput, TrustedSourceDataBuilder
 from app.sdk.scraped_data_repository import KernelPlancksterSourceData, ScrapedDataRepository
 import time
 import numpy as np
-from typing import List
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
 import requests
+from app.metrics import JobMetrics
 from PIL import Image
 from io import BytesIO
 import logging
 import time
 import os
-import shutil
 from PIL import Image
 import json
+from collections import deque
+from hashlib import sha256
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
 
-from app.utils import URL_TEMPLATE, generate_relative_path, get_webcam_info_from_name, get_webcam_name
+from app.adaptive import AdaptiveSampler
+from app.archive import ShardedArchive
+from app.bandwidth import CHUNK_BYTES, TokenBucket, throttled_chunks
+from app.frame_cache import FrameCache
+from app.frame_cube import FrameCube
+from app.frame_index import FrameIndex
+from app.frame_stats import StatsSeries
+from app.processing import EncodedFrame, FrameProcessor, ProcessingOptions, enhance_image, output_profile
+from app.sharding import shard_capacity, shard_capture_times, shard_label
+from app.solar import solar_elevation
+from app.staging import StagingArea, StagingTimeout, staging_root
+from app.work_queue import QueueJob, WorkQueue, claimed_capture_times, default_worker_id
+from app.utils import URL_TEMPLATE, generate_relative_path, get_webcam_info_from_name, get_webcam_interval, get_webcam_location, get_webcam_name, get_webcam_timezone, get_webcam_rois, roi_label, url_template_resolution
 
 
+OUTPUT_MODES = ["objects", "archive"]
+
+ROUNDSHOT_TIMEOUT_S = 60
+
+# Pause between two capture times in the scraping loop, to go easy on the Roundshot origin
+FETCH_PAUSE_S = 0.1
+
+# Shared by every fetch, so that connections to the Roundshot origin are kept alive across frames
+_roundshot_session = requests.Session()
+
 # Setup logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def fetch_image_from_roundshot(roundshot_webcam_id: str, date: datetime) -> Image.Image | None:
-    
+def job_output_path(case_study_name: str, tracer_id: str, job_id: int, kind: str, file_name: str, label: str | None = None) -> str:
+    """
+    Relative path of a job-level output, e.g. the webcam report. Each shard of a sharded job (see `shard_label`),
+    or worker of a job run from a work queue, keeps its own outputs in a `label` directory, so that they never
+    collide under the same job id.
+    """
+    if label:
+        return f"{case_study_name}/{tracer_id}/{job_id}/{kind}/{label}/{file_name}"
+    return f"{case_study_name}/{tracer_id}/{job_id}/{kind}/{file_name}"
+
+
+def register_cube(cube: FrameCube, scraped_data_repository: ScrapedDataRepository, case_study_name: str, tracer_id: str, job_id: int, label: str | None = None) -> List[KernelPlancksterSourceData]:
+    """
+    Close the frame cube and upload it, with its timestamps, as two objects under 'webcam_cube/'.
+    """
+    cube_path, timestamps_path = cube.close()
+    if cube.count == 0:
+        logger.info(f"{job_id}: No frames kept, skipping the upload of the frame cube")
+        return []
+
+    registered = []
+    for local_file_name in (cube_path, timestamps_path):
+        media_data = KernelPlancksterSourceData(
+            name=f"webcam_cube_{case_study_name}_{tracer_id}",
+            protocol=scraped_data_repository.protocol,
+            relative_path=job_output_path(case_study_name, tracer_id, job_id, "webcam_cube", os.path.basename(local_file_name), label),
+        )
+        scraped_data_repository.register_scraped_video_or_document(
+            job_id=job_id,
+            source_data=media_data,
+            local_file_name=local_file_name,
+        )
+        registered.append(media_data)
+
+    logger.info(f"{job_id}: Uploaded a frame cube of {cube.count} frames of shape {cube.frame_shape}")
+    return registered
+
+
+def register_job_output(kind: str, local_file_name: str, scraped_data_repository: ScrapedDataRepository, case_study_name: str, tracer_id: str, job_id: int, label: str | None = None) -> KernelPlancksterSourceData:
+    """
+    Upload a job-level output file, e.g. the webcam report, as '<kind>_<case study>_<tracer id>' with the file's
+    extension, in the `kind` directory of the job (see `job_output_path`).
+    """
+    output_name = f"{kind}_{case_study_name}_{tracer_id}"
+    extension = os.path.splitext(local_file_name)[1]
+
+    media_data = KernelPlancksterSourceData(
+        name=output_name,
+        protocol=scraped_data_repository.protocol,
+        relative_path=job_output_path(case_study_name, tracer_id, job_id, kind, f"{output_name}{extension}", label),
+    )
+    scraped_data_repository.register_scraped_json(
+        job_id=job_id,
+        source_data=media_data,
+        local_file_name=local_file_name,
+    )
+
+    logger.info(f"{job_id}: Uploaded {media_data.relative_path}")
+    return media_data
+
+
+def roundshot_url(roundshot_webcam_id: str, date: datetime) -> str:
+    return URL_TEMPLATE.format(
+        webcam_id=roundshot_webcam_id,
+        year=date.year,
+        month=f"{date.month:02}",
+        day=f"{date.day:02}",
+        hour=f"{date.hour:02}",
+        minute=f"{date.minute:02}",
+    )
+
+
+def read_frame(response: requests.Response, download_bucket: TokenBucket | None) -> bytes:
+    """The body of a Roundshot response, read within the budget of `download_bucket` if it is not None."""
+    if download_bucket is None:
+        return response.content
+    return b"".join(throttled_chunks(response.iter_content(chunk_size=CHUNK_BYTES), download_bucket))
+
+
+def fetch_frame_from_roundshot(roundshot_webcam_id: str, date: datetime, download_bucket: TokenBucket | None = None) -> bytes | None:
+    """
+    Fetch the encoded frame for the given date, without decoding it.
+    """
+
     try:
-        
-        url = URL_TEMPLATE.format(
-                webcam_id=roundshot_webcam_id,
-                year=date.year,
-                month=f"{date.month:02}",
-                day=f"{date.day:02}",
-                hour=f"{date.hour:02}",
-                minute=f"{date.minute:02}",
-            )
+
+        url = roundshot_url(roundshot_webcam_id, date)
         logger.info(f"Fetching image from: {url}")
-            
+
         # Fetch the image from the URL
-        response = requests.get(url)
+        response = _roundshot_session.get(url, timeout=ROUNDSHOT_TIMEOUT_S, stream=download_bucket is not None)
         response.raise_for_status()  # Raise an error for bad responses
-            
-        # Convert the response content to a PIL Image
-        image = Image.open(BytesIO(response.content))
-        
-        return image
-    
+
+        return read_frame(response, download_bucket)
+
+    except Exception as e:
+        logger.warning(f"Unable to fetch image from '{url}'. Error: {e}")
+        return None
+
+
+def fetch_frame_with_cache(roundshot_webcam_id: str, date: datetime, frame_cache: FrameCache, metrics: JobMetrics, download_bucket: TokenBucket | None = None) -> Tuple[bytes | None, Dict[str, Any] | None]:
+    """
+    Fetch a frame, with a conditional request ('If-None-Match'/'If-Modified-Since') if it is already cached.
+
+    Returns the frame and, when the origin answered 304 Not Modified, its cache entry; the frame is then read from
+    the cache. Frames served with a 200 are cached with their validators.
+    """
+    url = roundshot_url(roundshot_webcam_id, date)
+    try:
+        entry = frame_cache.entry(url)
+        headers = frame_cache.conditional_headers(entry)
+        logger.info(f"Fetching image from: {url}")
+
+        response = _roundshot_session.get(url, timeout=ROUNDSHOT_TIMEOUT_S, headers=headers, stream=download_bucket is not None)
+        if headers:
+            metrics.incr("cache_revalidations")
+
+        if response.status_code == 304 and entry is not None:
+            metrics.incr("cache_not_modified")
+            return frame_cache.frame(url), entry
+
+        response.raise_for_status()
+        frame = read_frame(response, download_bucket)
+        frame_cache.store(url, frame, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return frame, None
+
     except Exception as e:
         logger.warning(f"Unable to fetch image from '{url}'. Error: {e}")
+        return None, None
+
+
+def fetch_frame_with_retry(roundshot_webcam_id: str, date: datetime, deadline: datetime, backoff: timedelta, max_backoff: timedelta, download_bucket: TokenBucket | None = None) -> bytes | None:
+    """
+    Fetch a frame that may not be published yet: retry with an exponential backoff until it appears, or until the
+    next attempt would start after `deadline`.
+    """
+    delay = backoff
+    while True:
+        frame = fetch_frame_from_roundshot(roundshot_webcam_id, date, download_bucket)
+        if frame is not None:
+            return frame
+
+        if datetime.now() + delay >= deadline:
+            return None
+
+        logger.info(f"Frame for {date} not published yet, retrying in {delay.total_seconds():.0f} seconds")
+        time.sleep(delay.total_seconds())
+        delay = min(delay * 2, max_backoff)
+
+
+def next_capture_time(after: datetime, step: timedelta) -> datetime:
+    """
+    The first capture time at or after `after`. Roundshot captures are aligned to multiples of the camera interval
+    since midnight, e.g. 13:00, 13:10, 13:20 for a 10 minute camera.
+    """
+    midnight = after.replace(hour=0, minute=0, second=0, microsecond=0)
+    slots = -((midnight - after) // step)  # ceil division
+    return midnight + slots * step
+
+
+def historical_capture_times(start_date: datetime, end_date: datetime, interval: timedelta) -> Iterator[datetime]:
+    current_date = start_date
+    while current_date <= end_date:
+        yield current_date
+        current_date += interval
+
+
+def live_capture_times(start_date: datetime | None, end_date: datetime | None, step: timedelta, publish_delay: timedelta, before_wait: Callable[[], None]) -> Iterator[datetime]:
+    """
+    Capture times from `start_date` (or now) onwards, without end unless `end_date` is given. Times in the past are
+    yielded right away; for a future capture time, `before_wait` is called and the generator sleeps until the frame
+    should have been published, i.e. `publish_delay` after the capture time.
+    """
+    current_date = next_capture_time(start_date or datetime.now(), step)
+    while end_date is None or current_date <= end_date:
+        wait = (current_date + publish_delay - datetime.now()).total_seconds()
+        if wait > 0:
+            before_wait()
+            logger.info(f"Waiting {wait:.0f} seconds for the frame captured at {current_date}")
+            time.sleep(wait)
+        yield current_date
+        current_date += step
+
+
+def daylight_capture_times(capture_times: Iterable[datetime], roundshot_webcam_id: str, min_sun_elevation: float, metrics: JobMetrics, batch: int | None = None) -> Iterator[datetime]:
+    """
+    Drop the capture times at which the sun is below `min_sun_elevation` degrees at the webcam, before anything is
+    fetched. The elevation is computed for `batch` capture times at once, all of them if None; live capture times
+    must be taken one at a time. Dropped capture times are counted as 'frames_skipped_night'.
+
+    Capture times are the camera's local wall-clock times, so they are localized to its time zone before the sun
+    position is computed for them.
+    """
+    latitude, longitude = get_webcam_location(roundshot_webcam_id)
+    camera_timezone = get_webcam_timezone(roundshot_webcam_id)
+    capture_times = iter(capture_times)
+    while True:
+        chunk = list(islice(capture_times, batch))
+        if not chunk:
+            return
+        elevations = solar_elevation(np.array([date.replace(tzinfo=camera_timezone).timestamp() for date in chunk]), latitude, longitude)
+        skipped = int(np.count_nonzero(elevations < min_sun_elevation))
+        if skipped:
+            metrics.incr("frames_skipped_night", skipped)
+        yield from (date for date, elevation in zip(chunk, elevations) if elevation >= min_sun_elevation)
+
+
+def unindexed_capture_times(capture_times: Iterable[datetime], indexed: Dict[int, Dict[str, Any]], report_dict: Dict[int, Any], metrics: JobMetrics, on_hit: Callable[[int], None] | None = None) -> Iterator[datetime]:
+    """
+    Drop the capture times of frames found in the frame index, and put what they were registered as in the report.
+    Dropped capture times are counted as 'index_hits', and passed to `on_hit` as Unix timestamps.
+    """
+    for date in capture_times:
+        unix_timestamp = int(date.timestamp())
+        entry = indexed.get(unix_timestamp)
+        if entry is None:
+            yield date
+            continue
+        metrics.incr("index_hits")
+        report_dict[unix_timestamp] = entry["outputs"]
+        if on_hit is not None:
+            on_hit(unix_timestamp)
+
+
+def filter_capture_times(capture_times: Iterable[datetime], roundshot_webcam_id: str, interval: timedelta, metrics: JobMetrics, report_dict: Dict[int, Any], shard_index: int = 0, shard_count: int = 1, min_sun_elevation: float | None = None, indexed: Dict[int, Dict[str, Any]] | None = None, live: bool = False) -> Iterator[datetime]:
+    """
+    The capture times a job scrapes, out of all the capture times in its range: those of its shard, in daylight,
+    and not in the frame index (`indexed`, see `FrameIndex.lookup`). Used by `scrape()` and by the planner.
+    """
+    if shard_count > 1:
+        capture_times = shard_capture_times(capture_times, shard_index, shard_count, interval)
+
+    if min_sun_elevation is not None:
+        capture_times = daylight_capture_times(capture_times, roundshot_webcam_id, min_sun_elevation, metrics, batch=1 if live else None)
+
+    if indexed is not None:
+        capture_times = unindexed_capture_times(capture_times, indexed, report_dict, metrics)
+
+    return iter(capture_times)
+
+
+def frame_profile(output_mode: str, processing_options: ProcessingOptions) -> str:
+    """What a frame is registered as depends on the processing options and on the output mode."""
+    return f"{output_mode}-{output_profile(processing_options)}"
+
+
+def fetch_image_from_roundshot(roundshot_webcam_id: str, date: datetime) -> Image.Image | None:
+
+    frame = fetch_frame_from_roundshot(roundshot_webcam_id, date)
+    if frame is None:
         return None
 
+    # Convert the response content to a PIL Image
+    return Image.open(BytesIO(frame))
+
 
 def save_image(image, path, factor=1.0, clip_range=(0, 1)):
     """Save the image to the given path."""
-    np_image = np.array(image) * factor
-    np_image = np.clip(np_image, clip_range[0], clip_range[1])
-    np_image = (np_image * 255).astype(np.uint8)
-    Image.fromarray(np_image).save(path)
+    enhance_image(image, factor=factor, clip_range=clip_range).save(path)
 
 
 def save_report(report_dict, file_path):
     try:
         with open(file_path, 'w') as json_file:
-            logger.info(f"Report dictionary to be printed: {pprint.pformat(report_dict)}")
+            logger.info(f"Report dictionary to be printed: {pformat(report_dict)}")
             json.dump(report_dict, json_file, indent=4)  # indent for pretty-printing
         logger.info(f"Report saved to {file_path}")
 
@@ -70,160 +322,538 @@ def save_report(report_dict, file_path):
         logger.warning(f"Error saving report: {e}")
 
 
+@dataclass(frozen=True)
+class ScrapeJob:
+    """
+    The settings of a `scrape()` job, built from a `ScraperJobSpec` by `validate_job`.
+
+    @attr case_study_name: case study the outputs of the job are registered under
+    @attr job_id: id of the job; the shards and the work queue containers of a job share it
+    @attr tracer_id: traces the job across the SDA runtime
+    @attr latitude: latitude of the webcam, as given to the job
+    @attr longitude: longitude of the webcam, as given to the job
+    @attr roundshot_webcam_id: the Roundshot webcam to scrape
+    @attr start_date: first capture time; None in follow mode starts now
+    @attr end_date: last capture time; None in follow mode runs until interrupted
+    @attr interval: time between capture times; in follow mode, rounded to a multiple of the camera's own interval
+    @attr file_dir: root of the job's staging area; the job only removes its own directory in it
+    @attr log_level: the log level of the job
+    @attr processing_options: how frames are processed; None for the defaults, with the ROIs of the webcam
+    @attr workers: worker processes for frame processing, 0 to process frames in the job's thread
+    @attr output_mode: one of `OUTPUT_MODES`: a registered object per frame, or frames packed in tar shards
+    @attr shard_max_bytes: most bytes of a tar shard in 'archive' mode
+    @attr follow: poll the webcam live, until interrupted or until `end_date`
+    @attr publish_delay: in follow mode, how long after a capture its frame is first requested
+    @attr poll_backoff: in follow mode, first wait before requesting a frame that was not published yet again
+    @attr min_sun_elevation: skip the capture times at which the sun is lower than this many degrees; None keeps all
+    @attr frame_cache_dir: directory of the `FrameCache` revalidating the frames fetched before; None for no cache
+    @attr frame_index_path: path of the `FrameIndex` of the frames registered before; None for no index
+    @attr shard_index: the shard of the date range to scrape, see `shard_of`
+    @attr shard_count: number of shards of the date range; 1 scrapes all of it
+    @attr report_path: where to also save the report, kept after the job for `register_merged_report`
+    @attr work_queue_path: path of the `WorkQueue` shared by the containers running the job; None to scrape alone
+    @attr worker_id: name of this container in the work queue; None for `default_worker_id`
+    @attr lease: how long capture times claimed from the work queue stay reserved for this container
+    @attr staging_quota_bytes: budget of the staging areas of the process under `file_dir`; None for no budget
+    @attr adaptive_interval: coarsest interval of adaptive sampling; None samples every `interval`
+    @attr change_threshold: difference between two samples above which adaptive sampling refines between them
+    """
+    case_study_name: str
+    job_id: int
+    tracer_id: str
+    latitude: str
+    longitude: str
+    roundshot_webcam_id: str
+    start_date: datetime | None
+    end_date: datetime | None
+    interval: timedelta
+    file_dir: str
+    log_level: str = "WARNING"
+    processing_options: ProcessingOptions | None = None
+    workers: int = 0
+    output_mode: str = "objects"
+    shard_max_bytes: int = 256 * 1024 * 1024
+    follow: bool = False
+    publish_delay: timedelta = timedelta(minutes=1)
+    poll_backoff: timedelta = timedelta(seconds=15)
+    min_sun_elevation: float | None = None
+    frame_cache_dir: str | None = None
+    frame_index_path: str | None = None
+    shard_index: int = 0
+    shard_count: int = 1
+    report_path: str | None = None
+    work_queue_path: str | None = None
+    worker_id: str | None = None
+    lease: timedelta = timedelta(minutes=5)
+    staging_quota_bytes: int | None = None
+    adaptive_interval: timedelta | None = None
+    change_threshold: float = 0.03
+
+
 # Updated scrape_URL function
-def scrape(case_study_name: str, job_id: int, tracer_id: str, scraped_data_repository: ScrapedDataRepository, log_level: str, latitude, longitude, start_date: datetime, end_date: datetime, file_dir: str, roundshot_webcam_id: str, interval: timedelta) -> JobOutput:
+def scrape(job: ScrapeJob, scraped_data_repository: ScrapedDataRepository, metrics: JobMetrics | None = None, frame_executor: ProcessPoolExecutor | None = None, download_bucket: TokenBucket | None = None) -> JobOutput:
+    """
+    Scrape the frames of a Roundshot webcam, from `job.start_date` to `job.end_date` every `job.interval`, and
+    register them with `scraped_data_repository`.
+
+    Frames are fetched in this thread and handed to a `FrameProcessor`, in `job.workers` processes or in the
+    `frame_executor` shared by concurrent jobs, with up to `2 * workers` frames in flight; results are registered in
+    timestamp order. Capture times are filtered before anything is fetched: by shard, by sun elevation and, with the
+    frame index, by what was registered before ('index_hits'). Frames the cache finds not modified and registered
+    with the same options are not processed again ('cache_hits').
+
+    At the end of the job, the report (Unix timestamp -> registered paths, or archive entries) and the optional
+    outputs are registered under 'webcam_report/', 'webcam_cube/', 'webcam_stats/', 'webcam_quality/' and
+    'webcam_sampling/'. Those of a shard or of a work queue container go in a directory of their own, so that they
+    can be merged; with a work queue, a frame's task is completed once it is registered, dark or missing.
+
+    Temporary files go in a `StagingArea` of the job's own under `job.file_dir`, removed at the end of the job. With a
+    `download_bucket`, frames are downloaded within its host-wide budget; the upload budget is the one of the
+    repository's `FileRepository`. Counters, stage timings and gauges of the job are added to `metrics`.
+    """
+
+    # The interval is rounded to the camera's in follow mode, and the other two get their defaults once known
+    interval, worker_id, processing_options = job.interval, job.worker_id, job.processing_options
 
     job_state = BaseJobState.CREATED
+    if metrics is None:
+        metrics = JobMetrics()
+    processor = None
+    archive = None
+    cube = None
+    stats_series = StatsSeries()
+    report_dict = {}
+    quality_dict = {}
+    label = shard_label(job.shard_index, job.shard_count) if job.shard_count > 1 else None
+    work_queue = None
+    queue_job = None
+    frame_index = None
+    staging = None
+    sampler = None
 
     start_time = time.time()
-    relative_path = None
-    image_path = None
     try:
         logger = logging.getLogger(__name__)
-        logging.basicConfig(level=log_level)
+        logging.basicConfig(level=job.log_level)
 
         protocol = scraped_data_repository.protocol
 
         output_data_list: List[KernelPlancksterSourceData] = []
 
-        logger.info(f"{job_id}: Starting Job")
+        logger.info(f"{job.job_id}: Starting Job")
 
         job_state = BaseJobState.RUNNING
 
-        logger.info(f"starting with webcam URL")
-        image_dir = os.path.join(file_dir, "images")
-        os.makedirs(image_dir, exist_ok=True)
-        current_date = start_date
-        report_dict = {}
-        logger.info(f"Data scraping Interval set at: {interval}")
+        if job.output_mode not in OUTPUT_MODES:
+            raise ValueError(f"'{job.output_mode}' is not a valid output mode. Valid output modes are: {OUTPUT_MODES}")
 
-        while (current_date <= end_date):
+        if job.follow:
+            if processing_options is not None and processing_options.cube_size:
+                raise ValueError("The frame cube needs a bounded date range and cannot be used in follow mode.")
+            camera_interval = timedelta(minutes=get_webcam_interval(job.roundshot_webcam_id))
+            interval = max(1, round(interval / camera_interval)) * camera_interval
+        elif job.start_date is None or job.end_date is None:
+            raise ValueError("start_date and end_date are required unless following the camera live.")
 
-            try:
-                unix_timestamp = int(current_date.timestamp())
+        if job.work_queue_path:
+            if job.follow:
+                raise ValueError("The work queue needs a bounded date range and cannot be used in follow mode.")
+            work_queue = WorkQueue(job.work_queue_path, lease=job.lease)
+            queue_job = QueueJob(job.case_study_name, job.tracer_id, job.job_id, job.roundshot_webcam_id, int(job.start_date.timestamp()), int(job.end_date.timestamp()))
+            worker_id = worker_id or default_worker_id()
+            label = f"worker-{worker_id}"
+
+        if job.adaptive_interval is not None and (job.follow or job.work_queue_path or job.shard_count > 1):
+            raise ValueError("Adaptive sampling needs the whole bounded date range and cannot be used in follow mode, with a work queue nor with shards.")
+
+        logger.info(f"starting with webcam URL")
+        staging = StagingArea(staging_root(job.file_dir, job.staging_quota_bytes), f"job-{job.job_id}")
+        logger.info(f"{job.job_id}: Staging temporary files in '{staging.path}'")
+        logger.info(f"Data scraping Interval set at: {interval}")
 
-                image = fetch_image_from_roundshot(roundshot_webcam_id, current_date)
+        webcam_name = get_webcam_name(job.roundshot_webcam_id)
+        if processing_options is None:
+            processing_options = ProcessingOptions(rois=tuple(get_webcam_rois(job.roundshot_webcam_id)))
+        processor = FrameProcessor(options=processing_options, workers=job.workers, executor=frame_executor)
+        pending: deque = deque()
+
+        frame_cache = FrameCache(job.frame_cache_dir) if job.frame_cache_dir else None
+        frame_index = FrameIndex(job.frame_index_path) if job.frame_index_path else None
+        resolution = url_template_resolution()
+        cache_profile = frame_profile(job.output_mode, processing_options)
+        archived_dates: Dict[int, datetime] = {}
+        # sha256 of the fetched frames, until they are indexed
+        frame_hashes: Dict[int, str] = {}
+
+        # Validated once here: per frame, only the timestamp, the ROI label and the codec's extension change
+        frame_source_data = TrustedSourceDataBuilder(
+            name=webcam_name,
+            protocol=protocol,
+            relative_path_template=generate_relative_path(
+                case_study_name=job.case_study_name,
+                tracer_id=job.tracer_id,
+                job_id=job.job_id,
+                timestamp="{timestamp}",
+                dataset=webcam_name,
+                evalscript_name="{evalscript_name}",
+                image_hash="nohash",
+                file_extension="{file_extension}",
+            ),
+            timestamp=0,
+            evalscript_name="webcam",
+            file_extension="jpeg",
+        )
 
-                if image is None:
-                    relative_path = None
-                    raise Exception(f"Could not fetch image for {current_date}, with Unix timestamp {unix_timestamp}")
+        def register_output(unix_timestamp: int, output: EncodedFrame) -> str:
+            evalscript_name = "webcam" if output.roi is None else f"webcam-{roi_label(output.roi)}"
+            media_data = frame_source_data.build(
+                timestamp=unix_timestamp,
+                evalscript_name=evalscript_name,
+                file_extension=output.file_extension,
+            )
 
-                if (current_date <= end_date) and (np.mean(image) != 0.0):  
+            # Staged in a pooled file of the job's staging area for the upload, then recycled
+            with staging.staged_file(output.data) as image_path:
+                with metrics.stage("register"):
+                    scraped_data_repository.register_scraped_photo(
+                        job_id=job.job_id,
+                        source_data=media_data,
+                        local_file_name=image_path,
+                    )
 
-                    # Save the image locally
-                    file_extension = image.format.lower() if image.format else "png"
-                    image_filename = f"URLbased_webcam.{file_extension}"
-                    image_path = os.path.join(image_dir, "scraped", image_filename)
-                    os.makedirs(os.path.dirname(image_path), exist_ok=True)
-                    save_image(image, image_path, factor=1.5 / 255, clip_range=(0, 1))
-                    logger.info(f"Scraped Image at {time.time()} and saved to: {image_path}")
+            output_data_list.append(media_data)
+            return media_data.relative_path
 
-                    dd_mm_yy = current_date.strftime("%d_%m_%y")
+        def register_json(kind: str, entries: Dict[int, Any]) -> KernelPlancksterSourceData:
+            # Job-level outputs by Unix timestamp, like the report
+            path = os.path.join(staging.path, f"{kind}.json")
+            save_report(dict(sorted(entries.items())), path)
+            return register_job_output(kind, path, scraped_data_repository, job.case_study_name, job.tracer_id, job.job_id, label)
 
-                    # Register it in Kernel Planckster
-                    webcam_name = get_webcam_name(roundshot_webcam_id)
+        def register_shard(local_path: str, shard_number: int) -> str:
+            shard_name = f"webcam_archive_{job.case_study_name}_{job.tracer_id}"
+            relative_path = job_output_path(job.case_study_name, job.tracer_id, job.job_id, "webcam_archive", f"shard-{shard_number:05d}.tar", label)
 
-                    relative_path = generate_relative_path(
-                        case_study_name=case_study_name,
-                        tracer_id=tracer_id,
-                        job_id=job_id,
-                        timestamp=unix_timestamp,
-                        dataset=webcam_name,
-                        evalscript_name="webcam",
-                        image_hash="nohash",
-                        file_extension=file_extension
-                    )
+            media_data = KernelPlancksterSourceData(
+                name=shard_name,
+                protocol=protocol,
+                relative_path=relative_path,
+            )
 
-                    media_data = KernelPlancksterSourceData(
-                        name=webcam_name,
-                        protocol=protocol,
-                        relative_path=relative_path,
-                    )
-                    
-                    scraped_data_repository.register_scraped_photo(
-                        job_id=job_id,
+            try:
+                with metrics.stage("register"):
+                    scraped_data_repository.register_scraped_video_or_document(
+                        job_id=job.job_id,
                         source_data=media_data,
-                        local_file_name=image_path,
+                        local_file_name=local_path,
                     )
+            except Exception:
+                metrics.incr("shards_failed")
+                raise
+
+            output_data_list.append(media_data)
+            metrics.incr("shards_registered")
+            return relative_path
+
+        if job.output_mode == "archive":
+            archive = ShardedArchive(
+                shard_dir=staging.dir("shards"),
+                max_shard_bytes=job.shard_max_bytes,
+                register_shard=register_shard,
+                staging=staging,
+            )
 
-                    output_data_list.append(media_data)
+        if processing_options.cube_size:
+            cube_width, cube_height = processing_options.cube_size
+            cube_capacity = shard_capacity(job.start_date, job.end_date, interval, job.shard_count)
+            cube_frame_bytes = cube_width * cube_height * 3 + 8
+            # The cube file is sparse: its headers are reserved now, and each frame as it is appended, until the end of the job
+            staging.reserve(2 * 128)
+            cube = FrameCube(
+                path=os.path.join(staging.dir("cube"), "frames.npy"),
+                timestamps_path=os.path.join(staging.dir("cube"), "timestamps.npy"),
+                capacity=cube_capacity,
+                width=cube_width,
+                height=cube_height,
+            )
 
+        def index_outputs(unix_timestamp: int, outputs: Any, status: str | None = None) -> None:
+            if frame_index is not None:
+                frame_index.record(job.roundshot_webcam_id, unix_timestamp, resolution, cache_profile, outputs, frame_hashes.pop(unix_timestamp, None), status)
+
+        def remember_outputs(current_date: datetime, outputs: Any, status: str | None = None) -> None:
+            if frame_cache is not None:
+                frame_cache.record_outputs(roundshot_url(job.roundshot_webcam_id, current_date), cache_profile, outputs)
+            index_outputs(int(current_date.timestamp()), outputs, status)
+
+        def complete_task(unix_timestamp: int, ok: bool = True) -> None:
+            if work_queue is None:
+                return
+            metrics.incr("queue_tasks_done" if ok else "queue_tasks_failed")
+            if not work_queue.complete(worker_id, queue_job, unix_timestamp, ok):
+                logger.warning(f"{job.job_id}: The lease on {unix_timestamp} expired before the frame was finished")
+                metrics.incr("queue_leases_lost")
+
+        def fail_unarchived() -> None:
+            # The frames of a shard that could not be registered are lost: offered again with the work queue
+            for unix_timestamp in archive.take_failed():
+                archived_dates.pop(unix_timestamp, None)
+                metrics.incr("frames_failed")
+                complete_task(unix_timestamp, ok=False)
+
+        def finalize(current_date: datetime, unix_timestamp: int, future: Future) -> None:
+            try:
+                processed = future.result()
+                metrics.record("decode", processed.decode_s)
+
+                if processed.stats is not None:
+                    metrics.record("stats", processed.stats_s)
+                    stats_series.append(unix_timestamp, processed.stats)
+
+                if processed.dark:
+                    metrics.incr("frames_dark")
+                    remember_outputs(current_date, None)
+                    complete_task(unix_timestamp)
+                    return
+
+                if processed.quality is not None:
+                    metrics.record("quality", processed.quality_s)
+                    failures = processing_options.quality.failures(processed.quality)
+                    quality_dict[unix_timestamp] = {**processed.quality.to_dict(), "failures": failures, "dropped": processed.low_quality}
+                    if failures:
+                        metrics.incr("frames_low_quality")
+
+                if processed.low_quality:
+                    remember_outputs(current_date, None, status="low_quality")
+                    complete_task(unix_timestamp)
+                    return
+
+                metrics.record("process", processed.process_s)
+
+                if cube is not None and processed.thumbnail is not None:
+                    staging.reserve(cube_frame_bytes)
+                    cube.append(unix_timestamp, processed.thumbnail)
+
+                if archive is not None:
+                    for output in processed.outputs:
+                        evalscript_name = "webcam" if output.roi is None else f"webcam-{roi_label(output.roi)}"
+                        member_name = f"{unix_timestamp}/{webcam_name}_{evalscript_name}_nohash.{output.file_extension}"
+                        archive.add(unix_timestamp, member_name, output.data)
+                    archived_dates[unix_timestamp] = current_date
+                    # Adding a frame may have closed a shard; frames are only kept once their shard is registered
+                    fail_unarchived()
+                    return
+
+                relative_paths = [register_output(unix_timestamp, output) for output in processed.outputs]
+
+                # One path per frame, or one path per crop when the webcam has regions of interest
+                report_dict[unix_timestamp] = relative_paths if processing_options.rois else relative_paths[0]
+                remember_outputs(current_date, report_dict[unix_timestamp])
+                complete_task(unix_timestamp)
+                metrics.incr("frames_kept")
+
+            except StagingTimeout:
+                # Every other frame would wait as long: the job fails
+                metrics.incr("frames_failed")
+                complete_task(unix_timestamp, ok=False)
+                raise
             except Exception as e:
-                logger.warning(f"Error while scraping data: {e}")
-
-            finally:
-                if image_path:
-                    if os.path.exists(image_path):
-                        try:
-                            os.remove(image_path)
-                            logger.info(f"Deleted scraped image at {image_path}")
-                        except Exception as e:
-                            logger.warning(f"Could not delete scraped image: {e}")
-
-                if relative_path:
-                    report_dict[unix_timestamp] = relative_path
-                else: 
-                    report_dict[unix_timestamp] = None
-
-                current_date += interval
-                time.sleep(0.1)   
-                continue
-                    
+                logger.warning(f"Error while scraping data for {current_date}: {e}")
+                metrics.incr("frames_failed")
+                frame_hashes.pop(unix_timestamp, None)
+                complete_task(unix_timestamp, ok=False)
+
+        def drain() -> None:
+            while pending:
+                finalize(*pending.popleft())
+
+        if job.follow:
+            capture_times = live_capture_times(job.start_date, job.end_date, interval, job.publish_delay, before_wait=drain)
+        elif job.adaptive_interval is not None:
+            sampler = AdaptiveSampler(job.start_date, job.end_date, job.adaptive_interval, interval, job.change_threshold)
+            capture_times = iter(sampler)
+        else:
+            capture_times = historical_capture_times(job.start_date, job.end_date, interval)
+
+        indexed = None
+        if frame_index is not None:
+            indexed = frame_index.lookup(job.roundshot_webcam_id, resolution, cache_profile, int(job.start_date.timestamp()) if job.start_date else 0, int(job.end_date.timestamp()) if job.end_date else None)
+            logger.info(f"{job.job_id}: {len(indexed)} frames of the date range are in the frame index")
+
+        # The sampler only refines after each frame was observed: its capture times are filtered one at a time, like live ones
+        # With a work queue, indexed frames are skipped once claimed instead: every container filters the whole job
+        capture_times = filter_capture_times(capture_times, job.roundshot_webcam_id, interval, metrics, report_dict, job.shard_index, job.shard_count, job.min_sun_elevation, indexed if work_queue is None else None, live=job.follow or sampler is not None)
+
+        if work_queue is not None:
+            # Every container enqueues the whole job; tasks that are already queued are left as they are
+            metrics.incr("queue_tasks_enqueued", work_queue.enqueue(queue_job, (int(date.timestamp()) for date in capture_times)))
+            capture_times = claimed_capture_times(work_queue, worker_id, queue_job, batch=processor.max_pending + 1)
+            if indexed is not None:
+                # Only the container claiming an indexed frame reports it, so that the reports of the containers can be merged
+                capture_times = unindexed_capture_times(capture_times, indexed, report_dict, metrics, on_hit=complete_task)
+
+        try:
+            for current_date in capture_times:
+
+                unix_timestamp = int(current_date.timestamp())
+                # Keeps the report in timestamp order; overwritten once the frame is registered
+                report_dict[unix_timestamp] = None
+
+                cache_entry = None
+                with metrics.stage("fetch"):
+                    if job.follow and current_date + interval > datetime.now():
+                        # Live frame: it may be published late, poll until the next capture is due
+                        frame = fetch_frame_with_retry(job.roundshot_webcam_id, current_date, deadline=current_date + interval, backoff=job.poll_backoff, max_backoff=interval / 4, download_bucket=download_bucket)
+                    elif frame_cache is not None:
+                        frame, cache_entry = fetch_frame_with_cache(job.roundshot_webcam_id, current_date, frame_cache, metrics, download_bucket)
+                    else:
+                        frame = fetch_frame_from_roundshot(job.roundshot_webcam_id, current_date, download_bucket)
+
+                if sampler is not None:
+                    try:
+                        with metrics.stage("change_score"):
+                            sampler.observe(current_date, frame)
+                    except Exception as error:
+                        logger.warning(f"Could not compare the frame of {current_date} for adaptive sampling: {error}")
+
+                if frame is None:
+                    logger.warning(f"Could not fetch image for {current_date}, with Unix timestamp {unix_timestamp}")
+                    metrics.incr("frames_missing")
+                    complete_task(unix_timestamp)
+                elif cache_entry is not None and cache_profile in cache_entry["outputs"]:
+                    # Not modified and already registered with the same options: nothing to decode nor upload
+                    metrics.incr("cache_hits")
+                    report_dict[unix_timestamp] = cache_entry["outputs"][cache_profile]
+                    if frame_index is not None:
+                        frame_hashes[unix_timestamp] = sha256(frame).hexdigest()
+                    index_outputs(unix_timestamp, report_dict[unix_timestamp])
+                    complete_task(unix_timestamp)
+                else:
+                    if frame_index is not None:
+                        frame_hashes[unix_timestamp] = sha256(frame).hexdigest()
+                    pending.append((current_date, unix_timestamp, processor.submit(frame)))
+
+                while len(pending) > processor.max_pending:
+                    finalize(*pending.popleft())
+
+                time.sleep(FETCH_PAUSE_S)
+
+        except KeyboardInterrupt:
+            if not job.follow:
+                raise
+            logger.info(f"{job.job_id}: Stopped following webcam {job.roundshot_webcam_id}, finishing the job")
+
+        drain()
+
+        if archive is not None:
+            try:
+                index = archive.close()
+                fail_unarchived()
+                for unix_timestamp, entries in index.items():
+                    report_dict[unix_timestamp] = entries if processing_options.rois else entries[0]
+                    if unix_timestamp in archived_dates:
+                        remember_outputs(archived_dates[unix_timestamp], report_dict[unix_timestamp])
+                    # Archived frames are only safe once their shard is registered
+                    complete_task(unix_timestamp)
+                    metrics.incr("frames_kept")
+            except Exception as error:
+                logger.warning(f"Could not close the frame archive: {error}")
+                for unix_timestamp in archived_dates:
+                    if report_dict.get(unix_timestamp) is None:
+                        complete_task(unix_timestamp, ok=False)
+
+        if cube is not None:
+            try:
+                with metrics.stage("register"):
+                    output_data_list.extend(register_cube(cube, scraped_data_repository, job.case_study_name, job.tracer_id, job.job_id, label))
+            except Exception as error:
+                logger.warning(f"Could not upload the frame cube: {error}")
+
+        if len(stats_series):
+            try:
+                with metrics.stage("register"):
+                    stats_path = stats_series.save(os.path.join(staging.dir("stats"), "webcam_stats.npz"))
+                    output_data_list.append(register_job_output("webcam_stats", stats_path, scraped_data_repository, job.case_study_name, job.tracer_id, job.job_id, label))
+            except Exception as error:
+                logger.warning(f"Could not upload the frame statistics: {error}")
+
+        if quality_dict:
+            try:
+                output_data_list.append(register_json("webcam_quality", quality_dict))
+            except Exception as error:
+                logger.warning(f"Could not upload the frame quality scores: {error}")
+
+        if sampler is not None:
+            for reason, count in sampler.summary().items():
+                metrics.incr(f"samples_{reason}", count)
+            try:
+                output_data_list.append(register_json("webcam_sampling", sampler.sampled))
+            except Exception as error:
+                logger.warning(f"Could not upload the adaptive sampling: {error}")
 
         response_time = time.time() - start_time
-        logger.info(f"{job_id}: Job finished successfully. Response time: {response_time:.2f} seconds")
-        
+        logger.info(f"{job.job_id}: Job finished successfully. Response time: {response_time:.2f} seconds")
+
         return JobOutput(
             job_state=BaseJobState.FINISHED,
-            tracer_id=tracer_id,
+            tracer_id=job.tracer_id,
             source_data_list=output_data_list
         )
 
 
     except Exception as error:
-        logger.error(f"{job_id}: Unable to scrape data. Job with tracer_id {tracer_id} failed. Job state was '{job_state.value}' Error: {error}")
+        logger.error(f"{job.job_id}: Unable to scrape data. Job with tracer_id {job.tracer_id} failed. Job state was '{job_state.value}' Error: {error}")
 
         return JobOutput(
             job_state=BaseJobState.FAILED,
-            tracer_id=tracer_id,
+            tracer_id=job.tracer_id,
             source_data_list=[]
         )
     
     finally:
+        if processor is not None:
+            for name, value in processor.close().items():
+                metrics.set(f"processing_{name}", value)
+
+        if work_queue is not None:
+            metrics.set("queue_frames_per_s", work_queue.worker_status(worker_id)["frames_per_s"])
+            work_queue.close()
+
+        buckets = {"download": download_bucket, "upload": scraped_data_repository.file_repository.upload_bucket}
+        for direction, bucket in buckets.items():
+            if bucket is not None:
+                for name, value in bucket.usage().items():
+                    metrics.set(f"bandwidth_{direction}_{name}", value)
+
+        if staging is not None:
+            for name, value in staging.usage().items():
+                metrics.set(f"staging_{name}", value)
+
+        if frame_index is not None:
+            try:
+                frame_index.close()
+            except Exception as error:
+                logger.warning(f"Could not update the frame index: {error}")
+
+        logger.info(f"{job.job_id}: Job metrics: {pformat(metrics.summary())}")
+
+        if sampler is not None:
+            # Refined capture times were sampled after the end of their segment
+            report_dict = dict(sorted(report_dict.items()))
+
         try:
-            if report_dict:
-                report_path = os.path.join(file_dir, "webcam_report.json")
-                os.makedirs(os.path.dirname(report_path), exist_ok=True)
-                save_report(report_dict, report_path)
-                logger.info(f"Report saved at {time.time()} and saved to: {report_path}")
-
-                webcam_name = f"webcam_report_{case_study_name}_{tracer_id}"
-
-                relative_path = f"{case_study_name}/{tracer_id}/{job_id}/webcam_report/{webcam_name}.json"
-                
-                media_data = KernelPlancksterSourceData(
-                        name=webcam_name,
-                        protocol=protocol,
-                        relative_path=relative_path,
-                    )
-                    
-                scraped_data_repository.register_scraped_json(
-                        job_id=job_id,
-                        source_data=media_data,
-                        local_file_name=report_path,
-                    )
+            if job.report_path:
+                # Kept after the job, for the report of a sharded job to be merged from its shards' reports
+                os.makedirs(os.path.dirname(job.report_path) or ".", exist_ok=True)
+                save_report(report_dict, job.report_path)
 
-                output_data_list.append(media_data)
+            if report_dict and staging is not None:
+                output_data_list.append(register_json("webcam_report", report_dict))
         except Exception as error:
             logger.warning(f"Could not upload webcam report: {error}")    
 
-        try:
-            if os.path.exists(file_dir):
-                shutil.rmtree(file_dir)
-                logger.info(f"Deleted tmp directory '{file_dir}'.")
-            else:
-                logger.info(f"Temporary directory '{file_dir}' does not exist, skipping deletion.")
-
-        except Exception as e:
-            logger.warning(f"Could not delete tmp directory: {e}")
-        
+        if staging is not None:
+            try:
+                staging.close()
+            except Exception as e:
+                logger.warning(f"Could not delete the staging area: {e}")
@@ -1,9 +1,24 @@
+import os
 import re
-from typing import NamedTuple
+from typing import List, NamedTuple, Tuple
+from zoneinfo import ZoneInfo
 
 from app.config import ROUNDSHOT_WEBCAM_MATRIX
 
-URL_TEMPLATE = "https://storage.roundshot.com/{webcam_id}/{year}-{month}-{day}/{hour}-{minute}-00/{year}-{month}-{day}-{hour}-{minute}-00_half.jpg"
+# NOTE: can be overridden to point the scraper at a mirror or at a local stand-in (see benchmarks/)
+URL_TEMPLATE = os.getenv(
+    "ROUNDSHOT_URL_TEMPLATE",
+    "https://storage.roundshot.com/{webcam_id}/{year}-{month}-{day}/{hour}-{minute}-00/{year}-{month}-{day}-{hour}-{minute}-00_half.jpg",
+)
+
+
+def url_template_resolution(url_template: str = URL_TEMPLATE) -> str:
+    """
+    The frame resolution served by a Roundshot URL template: the suffix of its file name, e.g. 'half' for
+    '..._half.jpg', or the whole file name pattern if it has no suffix.
+    """
+    file_name = os.path.splitext(url_template.rsplit("/", 1)[-1])[0]
+    return file_name.rsplit("_", 1)[-1]
 
 
 class KernelPlancksterRelativePath(NamedTuple):
@@ -40,19 +55,17 @@ def sanitize_location(location: str):
 
 def get_webcam_name(webcam_id: str) -> str:
 
-    webcam_dict_array = (dict for dict in ROUNDSHOT_WEBCAM_MATRIX if dict["webcam_id"] == webcam_id)
+    webcam_dict = next((dict for dict in ROUNDSHOT_WEBCAM_MATRIX if dict["webcam_id"] == webcam_id), None)
+    if webcam_dict is None:
+        raise ValueError(f"Webcam ID '{webcam_id}' not found in ROUNDSHOT_WEBCAM_MATRIX")
 
     try:
-        webcam_dict = next(webcam_dict_array)
         location_raw, country, latitude, longitude = webcam_dict["location"], webcam_dict["country"], webcam_dict["latitude"], webcam_dict["longitude"]
         location = sanitize_location(location_raw)
 
 
         return f"{location}..{country}..{latitude}..{longitude}"
 
-    except StopIteration:
-        raise StopIteration(f"Webcam ID '{webcam_id}' not found in ROUNDSHOT_WEBCAM_MATRIX")
-
     except Exception as e:
         raise Exception(f"Error while fetching webcam info for webcam ID '{webcam_id}': {e}")    
 
@@ -70,4 +83,72 @@ def get_webcam_info_from_name(webcam_name: str) -> dict[str, str]:
     }
 
     return webcam_dict
-        
\ No newline at end of file
+        
+
+def get_webcam_interval(webcam_id: str) -> int:
+    """
+    The capture interval of a webcam, in minutes, as configured in ROUNDSHOT_WEBCAM_MATRIX.
+    """
+    webcam_dict = next((dict for dict in ROUNDSHOT_WEBCAM_MATRIX if dict["webcam_id"] == webcam_id), None)
+    if webcam_dict is None:
+        raise ValueError(f"Webcam ID '{webcam_id}' not found in ROUNDSHOT_WEBCAM_MATRIX")
+
+    return int(webcam_dict["interval"])
+
+
+def get_webcam_location(webcam_id: str) -> Tuple[float, float]:
+    """
+    The (latitude, longitude) of a webcam in decimal degrees, as configured in ROUNDSHOT_WEBCAM_MATRIX.
+    """
+    webcam_dict = next((dict for dict in ROUNDSHOT_WEBCAM_MATRIX if dict["webcam_id"] == webcam_id), None)
+    if webcam_dict is None:
+        raise ValueError(f"Webcam ID '{webcam_id}' not found in ROUNDSHOT_WEBCAM_MATRIX")
+
+    return float(webcam_dict["latitude"]), float(webcam_dict["longitude"])
+
+
+def get_webcam_timezone(webcam_id: str) -> ZoneInfo:
+    """
+    The time zone of a webcam's capture times, as configured in ROUNDSHOT_WEBCAM_MATRIX.
+    """
+    webcam_dict = next((dict for dict in ROUNDSHOT_WEBCAM_MATRIX if dict["webcam_id"] == webcam_id), None)
+    if webcam_dict is None:
+        raise ValueError(f"Webcam ID '{webcam_id}' not found in ROUNDSHOT_WEBCAM_MATRIX")
+
+    return ZoneInfo(webcam_dict["timezone"])
+
+
+def get_webcam_rois(webcam_id: str) -> List[Tuple[int, int, int, int]]:
+    """
+    The pixel regions of interest configured for a webcam under its optional 'roi' key, as (left, top, right, bottom)
+    tuples. The key holds either a single ROI or a list of ROIs. Returns an empty list if no ROI is configured.
+    """
+    webcam_dict = next((dict for dict in ROUNDSHOT_WEBCAM_MATRIX if dict["webcam_id"] == webcam_id), None)
+    if webcam_dict is None:
+        raise ValueError(f"Webcam ID '{webcam_id}' not found in ROUNDSHOT_WEBCAM_MATRIX")
+
+    rois = webcam_dict.get("roi")
+    if not rois:
+        return []
+    if all(isinstance(v, int) for v in rois):
+        rois = [rois]
+
+    validated = []
+    for roi in rois:
+        if len(roi) != 4 or not all(isinstance(v, int) for v in roi):
+            raise ValueError(f"ROI {roi} of webcam '{webcam_id}' must be 4 integers: left, top, right, bottom.")
+        left, top, right, bottom = roi
+        if left < 0 or top < 0 or right <= left or bottom <= top:
+            raise ValueError(f"ROI {roi} of webcam '{webcam_id}' must satisfy 0 <= left < right and 0 <= top < bottom.")
+        validated.append((left, top, right, bottom))
+
+    return validated
+
+
+def roi_label(roi: Tuple[int, int, int, int]) -> str:
+    """
+    Encode a ROI for use in a relative path, e.g. 'roi-0-120-800-480'. Contains no underscores, so that
+    `parse_relative_path` keeps working.
+    """
+    left, top, right, bottom = roi
+    return f"roi-{left}-{top}-{right}-{bottom}"
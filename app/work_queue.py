@@ -0,0 +1,228 @@
+"""
+A work queue of (job, webcam, capture time) tasks in an SQLite database, for several scraper containers sharing a
+volume to split the frames of the same jobs between them.
+
+    python -m app.work_queue /data/queue.sqlite     # tasks per status, and the throughput of every worker
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import json
+import os
+import socket
+import sqlite3
+import time
+from typing import Iterable, Iterator, List, NamedTuple
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_tasks (
+    case_study_name TEXT NOT NULL,
+    tracer_id TEXT NOT NULL,
+    job_id INTEGER NOT NULL,
+    webcam_id TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    finished_at REAL,
+    PRIMARY KEY (case_study_name, tracer_id, job_id, webcam_id, timestamp)
+);
+CREATE INDEX IF NOT EXISTS job_tasks_claimable ON job_tasks (case_study_name, tracer_id, job_id, webcam_id, status, timestamp);
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    claimed INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    first_claimed_at REAL,
+    last_finished_at REAL
+);
+"""
+
+TASK_STATUSES = ["pending", "leased", "done", "failed"]
+
+# Restricts a statement to the tasks of one job, with the fields of its `QueueJob` as parameters
+JOB_TASKS = "case_study_name = ? AND tracer_id = ? AND job_id = ? AND webcam_id = ? AND timestamp BETWEEN ? AND ?"
+
+
+class QueueJob(NamedTuple):
+    """
+    The job a task belongs to: tasks of different jobs never mix, even on the same webcam and capture times.
+    Only the tasks with a timestamp in [start, end] are claimed and completed for the job.
+    """
+    case_study_name: str
+    tracer_id: str
+    job_id: int
+    webcam_id: str
+    start: int
+    end: int
+
+
+def default_worker_id() -> str:
+    """The container's hostname (its id, under Docker) and the process id."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    Tasks are enqueued once per (job, webcam, timestamp), whoever enqueues them, and claimed in timestamp order with a
+    lease of `lease` per claim. A task whose lease expired before it was completed, e.g. because its container was
+    killed, is offered again; after `max_attempts` failed or expired attempts it is left as 'failed'.
+
+    Claims run in immediate transactions, so that two containers never lease the same task. The database can live
+    on a volume shared by containers of one host; SQLite locking is not reliable over network file systems.
+    """
+
+    def __init__(self, path: str, lease: timedelta = timedelta(minutes=5), max_attempts: int = 3) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lease_s = lease.total_seconds()
+        self._max_attempts = max_attempts
+        # Autocommit: transactions are opened explicitly, see `_transaction`
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._db.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._db
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def close(self) -> None:
+        self._db.close()
+
+    def enqueue(self, job: QueueJob, timestamps: Iterable[int]) -> int:
+        """Add the tasks of `job` that are not queued yet. Returns the number of tasks added."""
+        key = job[:4]
+        with self._transaction() as db:
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO job_tasks (case_study_name, tracer_id, job_id, webcam_id, timestamp) VALUES (?, ?, ?, ?, ?)",
+                ((*key, int(timestamp)) for timestamp in timestamps if job.start <= int(timestamp) <= job.end),
+            )
+            return db.total_changes - before
+
+    def claim(self, worker: str, job: QueueJob, limit: int = 1) -> List[int]:
+        """
+        Lease up to `limit` pending or expired tasks of `job` to `worker`. Returns their timestamps, in order; an
+        empty list once every task of the job is done, failed, or leased.
+
+        Claiming also renews the leases `worker` still holds, e.g. on frames waiting in an archive shard, so a worker
+        only loses its tasks once it stops claiming.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                f"UPDATE job_tasks SET lease_expires_at = ? WHERE {JOB_TASKS} AND status = 'leased' AND worker = ?",
+                (now + self._lease_s, *job, worker),
+            )
+            # Expired leases that used up their attempts are not offered again
+            db.execute(
+                "UPDATE job_tasks SET status = 'failed', worker = NULL, finished_at = ? "
+                f"WHERE {JOB_TASKS} AND status = 'leased' AND lease_expires_at < ? AND attempts >= ?",
+                (now, *job, now, self._max_attempts),
+            )
+            timestamps = [row[0] for row in db.execute(
+                "SELECT timestamp FROM job_tasks "
+                f"WHERE {JOB_TASKS} AND (status = 'pending' OR (status = 'leased' AND lease_expires_at < ?)) "
+                "ORDER BY timestamp LIMIT ?",
+                (*job, now, limit),
+            )]
+            if not timestamps:
+                return []
+            db.executemany(
+                "UPDATE job_tasks SET status = 'leased', worker = ?, lease_expires_at = ?, attempts = attempts + 1 "
+                f"WHERE {JOB_TASKS} AND timestamp = ?",
+                ((worker, now + self._lease_s, *job, timestamp) for timestamp in timestamps),
+            )
+            db.execute(
+                "INSERT INTO workers (worker, claimed, first_claimed_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (worker) DO UPDATE SET claimed = claimed + excluded.claimed",
+                (worker, len(timestamps), now),
+            )
+        return timestamps
+
+    def complete(self, worker: str, job: QueueJob, timestamp: int, ok: bool = True) -> bool:
+        """
+        Finish a task of `job` leased to `worker`. A task that failed is offered again until it used up its attempts.
+        Returns False if the lease was lost, i.e. it expired and the task was claimed by another worker.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            if ok:
+                status = "done"
+            else:
+                attempts = db.execute(f"SELECT attempts FROM job_tasks WHERE {JOB_TASKS} AND timestamp = ?", (*job, timestamp)).fetchone()
+                status = "failed" if attempts and attempts[0] >= self._max_attempts else "pending"
+            updated = db.execute(
+                "UPDATE job_tasks SET status = ?, worker = NULL, lease_expires_at = NULL, finished_at = ? "
+                f"WHERE {JOB_TASKS} AND timestamp = ? AND status = 'leased' AND worker = ?",
+                (status, now if status != "pending" else None, *job, timestamp, worker),
+            ).rowcount
+            if updated:
+                column = "done" if ok else "failed"
+                db.execute(f"UPDATE workers SET {column} = {column} + 1, last_finished_at = ? WHERE worker = ?", (now, worker))
+        return bool(updated)
+
+    def status(self) -> dict:
+        """
+        Tasks per status, per 'case_study_name/tracer_id/job_id/webcam_id', and the number of tasks finished per worker, with
+        their frames per second.
+        """
+        tasks: dict = {}
+        for case_study_name, tracer_id, job_id, webcam_id, status, count in self._db.execute(
+            "SELECT case_study_name, tracer_id, job_id, webcam_id, status, COUNT(*) FROM job_tasks "
+            "GROUP BY case_study_name, tracer_id, job_id, webcam_id, status"
+        ):
+            tasks.setdefault(f"{case_study_name}/{tracer_id}/{job_id}/{webcam_id}", dict.fromkeys(TASK_STATUSES, 0))[status] = count
+
+        workers = {row[0]: _worker_summary(*row[1:]) for row in self._db.execute(f"SELECT worker, {WORKER_COLUMNS} FROM workers ORDER BY worker")}
+
+        return {"tasks": tasks, "workers": workers}
+
+    def worker_status(self, worker: str) -> dict:
+        """The number of tasks claimed, done and failed by `worker`, and its frames per second."""
+        row = self._db.execute(f"SELECT {WORKER_COLUMNS} FROM workers WHERE worker = ?", (worker,)).fetchone()
+        return _worker_summary(*row) if row else _worker_summary(0, 0, 0, None, None)
+
+
+WORKER_COLUMNS = "claimed, done, failed, first_claimed_at, last_finished_at"
+
+
+def _worker_summary(claimed: int, done: int, failed: int, first_claimed_at: float | None, last_finished_at: float | None) -> dict:
+    busy_s = (last_finished_at - first_claimed_at) if last_finished_at else 0.0
+    return {
+        "claimed": claimed,
+        "done": done,
+        "failed": failed,
+        "frames_per_s": done / busy_s if busy_s > 0 else 0.0,
+    }
+
+
+def claimed_capture_times(work_queue: WorkQueue, worker: str, job: QueueJob, batch: int = 1) -> Iterator[datetime]:
+    """
+    Capture times claimed from the queue, `batch` at a time, until no task of the job is left to claim. Tasks
+    leased by a worker that died are offered again once their lease expired, to whichever worker claims next or to
+    the next run of the job. Every capture time must be completed with `WorkQueue.complete`.
+    """
+    while True:
+        timestamps = work_queue.claim(worker, job, limit=batch)
+        if not timestamps:
+            return
+        yield from (datetime.fromtimestamp(timestamp) for timestamp in timestamps)
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show the state of a scraper work queue.")
+    parser.add_argument("path", type=str, help="Path of the SQLite work queue")
+
+    args = parser.parse_args()
+
+    print(json.dumps(WorkQueue(args.path).status(), indent=4))
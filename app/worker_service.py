@@ -0,0 +1,245 @@
+"""
+A long-lived scraper worker: accepts job specs over a small local HTTP API and runs them concurrently in one warm
+process, sharing the Kernel Planckster gateways, the connection pools and the frame processing pool between jobs.
+
+    python -m app.worker_service --port 8300 --max-jobs 4 --workers 2
+
+    POST /jobs            a ScraperJobSpec as JSON; 202 with the job record, or 200 with the finished record if
+                          '?wait=1' is given
+    GET  /jobs            all job records
+    GET  /jobs/<id>       one job record; 'output' holds the JobOutput once the job is done
+    GET  /health          liveness, and the number of jobs per status
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import threading
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+import uuid
+
+from pydantic import ValidationError
+
+from app.bandwidth import buckets_usage
+from app.jobs import ScraperJobSpec, bandwidth_bucket, setup_repository, validate_job
+from app.metrics import JobMetrics
+from app.processing import make_frame_executor
+from app.sdk.scraped_data_repository import ScrapedDataRepository
+from app.url_image_scraper import ScrapeJob, scrape
+
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ["queued", "running", "done", "error"]
+
+
+class WorkerService:
+    """
+    Runs scraper jobs on a pool of `max_jobs` threads.
+
+    Jobs with the same Kernel Planckster host, port, token and scheme (and upload limit) share one `ScrapedDataRepository`, so the
+    gateway is pinged once and its connections stay open between jobs. With `workers` greater than 0 all jobs hand
+    their frames to one shared process pool. Every job stages its files in a directory of its own under its
+    `file_dir`, so that concurrent jobs never clean up each other's files, and jobs staging under the same
+    `file_dir` share its `staging_quota_mb`.
+    """
+
+    def __init__(self, max_jobs: int = 4, workers: int = 0) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="job")
+        self._frame_executor = make_frame_executor(workers) if workers > 0 else None
+        self._repositories: Dict[Tuple, ScrapedDataRepository] = {}
+        self._repositories_lock = threading.Lock()
+        self._jobs: Dict[str, dict] = {}
+        self._jobs_lock = threading.Lock()
+
+    def repository(self, spec: ScraperJobSpec) -> ScrapedDataRepository:
+        key = (spec.kp_host, spec.kp_port, spec.kp_auth_token, spec.kp_scheme, spec.upload_limit_mbps, spec.bandwidth_dir)
+        with self._repositories_lock:
+            if key not in self._repositories:
+                self._repositories[key] = setup_repository(spec, logger)
+            return self._repositories[key]
+
+    def submit(self, spec: ScraperJobSpec) -> str:
+        """
+        Validate a job and queue it. Raises a ValueError if the spec is not valid.
+        """
+        return self.enqueue(spec, self.prepare(spec))
+
+    def prepare(self, spec: ScraperJobSpec) -> ScrapeJob:
+        """
+        Validate a job for the service and return the `ScrapeJob` to `enqueue` it with. Raises a
+        ValueError if the spec is not valid.
+        """
+        if spec.profiling_enabled:
+            raise ValueError("Profiling is process-wide and not supported in the worker service, run the job with webcam_scraper.py instead.")
+        if spec.follow and not spec.end_date:
+            raise ValueError("Jobs following a webcam in the worker service need an end_date, so that they finish.")
+        if spec.shards > 1:
+            raise ValueError("Submit the shards of a job as separate jobs, with shard_index and shard_count.")
+
+        return validate_job(spec, logger)
+
+    def enqueue(self, spec: ScraperJobSpec, job: ScrapeJob) -> str:
+        """Queue a job validated with `prepare`. Returns its service job id."""
+        service_job_id = uuid.uuid4().hex
+        record = {
+            "id": service_job_id,
+            "status": "queued",
+            "submitted_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "spec": spec.model_dump(exclude={"kp_auth_token"}),
+            "output": None,
+            "metrics": None,
+            "error": None,
+        }
+        with self._jobs_lock:
+            self._jobs[service_job_id] = record
+
+        record["future"] = self._executor.submit(self._run, record, spec, job)
+        return service_job_id
+
+    def _run(self, record: dict, spec: ScraperJobSpec, job: ScrapeJob) -> None:
+        record["status"] = "running"
+        record["started_at"] = datetime.now().isoformat()
+        metrics = JobMetrics()
+        try:
+            job_output = scrape(
+                job,
+                scraped_data_repository=self.repository(spec),
+                frame_executor=self._frame_executor,
+                metrics=metrics,
+                download_bucket=bandwidth_bucket(spec, "download"),
+            )
+            record["output"] = job_output.model_dump(mode="json")
+            record["status"] = "done"
+        except Exception as error:
+            logger.error(f"{spec.job_id}: Job {record['id']} failed: {error}")
+            record["error"] = str(error)
+            record["status"] = "error"
+        finally:
+            record["metrics"] = metrics.summary()
+            record["finished_at"] = datetime.now().isoformat()
+
+    def wait(self, service_job_id: str) -> None:
+        self._jobs[service_job_id]["future"].result()
+
+    def job(self, service_job_id: str) -> dict | None:
+        record = self._jobs.get(service_job_id)
+        if record is None:
+            return None
+        return {key: value for key, value in record.items() if key != "future"}
+
+    def jobs(self) -> List[dict]:
+        with self._jobs_lock:
+            service_job_ids = list(self._jobs)
+        return [self.job(service_job_id) for service_job_id in service_job_ids]
+
+    def health(self) -> dict:
+        counts = {status: 0 for status in JOB_STATUSES}
+        for record in self.jobs():
+            counts[record["status"]] += 1
+        return {"status": "ok", "jobs": counts, "bandwidth": buckets_usage()}
+
+    def close(self, cancel_queued: bool = False) -> None:
+        """Wait for the running jobs, and for the queued ones too unless `cancel_queued` is set."""
+        self._executor.shutdown(wait=True, cancel_futures=cancel_queued)
+        if self._frame_executor is not None:
+            self._frame_executor.shutdown(wait=True)
+
+
+def make_handler(service: WorkerService) -> type:
+
+    class WorkerServiceHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args) -> None:
+            logger.debug(format % args)
+
+        def _send_json(self, status: int, body) -> None:
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self) -> None:
+            path = urlparse(self.path).path.rstrip("/")
+            if path == "/health":
+                self._send_json(200, service.health())
+            elif path == "/jobs":
+                self._send_json(200, service.jobs())
+            elif path.startswith("/jobs/"):
+                record = service.job(path[len("/jobs/"):])
+                if record is None:
+                    self._send_json(404, {"error": "Unknown job"})
+                else:
+                    self._send_json(200, record)
+            else:
+                self._send_json(404, {"error": f"Unknown path '{path}'"})
+
+        def do_POST(self) -> None:
+            url = urlparse(self.path)
+            if url.path.rstrip("/") != "/jobs":
+                self._send_json(404, {"error": f"Unknown path '{url.path}'"})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                spec = ScraperJobSpec.model_validate_json(self.rfile.read(length))
+                service_job_id = service.submit(spec)
+            except ValidationError as error:
+                self._send_json(400, {"error": json.loads(error.json())})
+                return
+            except ValueError as error:
+                self._send_json(400, {"error": str(error)})
+                return
+
+            if parse_qs(url.query).get("wait", ["0"])[0] not in ("0", "false", ""):
+                service.wait(service_job_id)
+                self._send_json(200, service.job(service_job_id))
+            else:
+                self._send_json(202, service.job(service_job_id))
+
+    return WorkerServiceHandler
+
+
+def serve(host: str, port: int, max_jobs: int, workers: int) -> None:
+    service = WorkerService(max_jobs=max_jobs, workers=workers)
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    logger.warning(f"Worker service listening on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+
+    import argparse
+    import signal
+
+    parser = argparse.ArgumentParser(description="Run scraper jobs submitted over a local HTTP API, in one long-lived process.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to listen on. Keep it local: the API has no authentication.")
+    parser.add_argument("--port", type=int, default=8300, help="Port to listen on")
+    parser.add_argument("--max-jobs", type=int, default=4, help="Number of jobs run concurrently; further jobs are queued")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes for frame processing, shared by all jobs. 0 processes frames in the job's thread.")
+    parser.add_argument("--log-level", type=str, default="WARNING", help="The log level of the service")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format='%(asctime)s - %(levelname)s - %(message)s', force=True)
+
+    if args.max_jobs <= 0 or args.workers < 0:
+        parser.error("--max-jobs must be greater than 0 and --workers greater than or equal to 0")
+
+    # 'docker stop' sends SIGTERM: finish the running jobs and exit, as for Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    serve(args.host, args.port, args.max_jobs, args.workers)
@@ -0,0 +1,116 @@
+"""
+Roundshot requests of adaptive sampling (`--adaptive-interval`) versus a fixed interval, over a day of frames from the
+fake Roundshot origin with change events, e.g. storms, during which the scene changes at every capture.
+
+    python -m benchmarks.bench_adaptive
+    python -m benchmarks.bench_adaptive --coarse 60 120 240 --events 780-880 1040-1060
+
+Reports, for every run, the requests sent and the fraction of the capture times inside of the events that were
+scraped; events shorter than the coarse interval can fall between two coarse samples and be missed.
+"""
+
+from datetime import datetime, timedelta
+import logging
+import os
+import tempfile
+from typing import List, Tuple
+
+from benchmarks.fake_services import FakeKernelPlancksterConfig, FakeRoundshotConfig, FakeServices
+
+WEBCAM_ID = "5e568898681458.46669392"
+AUTH_TOKEN = "test123"
+
+
+def run(scraped_data_repository, interval: int, adaptive_interval: int | None, events: List[Tuple[int, int]], threshold: float) -> dict:
+    from app.metrics import JobMetrics
+    from app.sdk.models import BaseJobState
+    from app.url_image_scraper import ScrapeJob, scrape
+
+    start_date = datetime(2024, 9, 15, 0, 0)
+    end_date = start_date + timedelta(days=1) - timedelta(minutes=interval)
+
+    metrics = JobMetrics()
+    with tempfile.TemporaryDirectory() as tmp:
+        job = ScrapeJob(
+            case_study_name="benchmark",
+            job_id=1,
+            tracer_id="benchmark",
+            log_level="WARNING",
+            latitude="0",
+            longitude="0",
+            start_date=start_date,
+            end_date=end_date,
+            file_dir=tmp,
+            roundshot_webcam_id=WEBCAM_ID,
+            interval=timedelta(minutes=interval),
+            adaptive_interval=timedelta(minutes=adaptive_interval) if adaptive_interval else None,
+            change_threshold=threshold,
+        )
+        job_output = scrape(job, scraped_data_repository=scraped_data_repository, metrics=metrics)
+
+    if job_output.job_state != BaseJobState.FINISHED:
+        raise RuntimeError(f"Benchmark job did not finish: {job_output.job_state}")
+
+    # Frames are registered as '<case study>/<tracer>/<job>/<timestamp>/webcam/...'
+    scraped = {int(source_data.relative_path.split("/")[3]) for source_data in job_output.source_data_list if "/webcam/" in source_data.relative_path}
+    event_slots = [
+        int((start_date + timedelta(minutes=minute)).timestamp())
+        for event_start, event_end in events
+        for minute in range(event_start, event_end, interval)
+    ]
+    summary = metrics.summary()
+    return {
+        # One request per fetch: historical frames are not retried
+        "requests": summary["stages"]["fetch"]["count"],
+        "coarse": summary["counters"].get("samples_coarse", 0),
+        "refined": summary["counters"].get("samples_change", 0),
+        "event_coverage": sum(slot in scraped for slot in event_slots) / len(event_slots) if event_slots else 1.0,
+        "elapsed_s": summary["elapsed_s"],
+    }
+
+
+def parse_event(value: str) -> Tuple[int, int]:
+    start, end = value.split("-")
+    return int(start), int(end)
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Roundshot requests of adaptive sampling versus a fixed interval.")
+    parser.add_argument("--interval", type=int, default=20, help="Finest interval, in minutes: the camera interval of the benchmark webcam")
+    parser.add_argument("--coarse", type=int, nargs="+", default=[60, 120, 240], help="Coarse intervals of the adaptive runs, in minutes")
+    parser.add_argument("--events", type=parse_event, nargs="+", default=[(780, 880), (1040, 1060)], help="Change events, as START-END minutes since midnight")
+    parser.add_argument("--threshold", type=float, default=0.03, help="Change threshold of the adaptive runs")
+    parser.add_argument("--width", type=int, default=800, help="Width of the synthetic frames")
+    parser.add_argument("--height", type=int, default=200, help="Height of the synthetic frames")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    services = FakeServices(
+        roundshot_config=FakeRoundshotConfig(width=args.width, height=args.height, change_events=args.events),
+        kp_config=FakeKernelPlancksterConfig(auth_token=AUTH_TOKEN),
+    )
+
+    with services:
+        # The URL template is read when 'app.utils' is imported, so the app modules are imported only now
+        os.environ["ROUNDSHOT_URL_TEMPLATE"] = services.roundshot_url_template
+
+        from app.sdk.file_repository import FileRepository
+        from app.sdk.kernel_plackster_gateway import KernelPlancksterGateway
+        from app.sdk.models import ProtocolEnum
+        from app.sdk.scraped_data_repository import ScrapedDataRepository
+
+        scraped_data_repository = ScrapedDataRepository(
+            protocol=ProtocolEnum.S3,
+            kernel_planckster=KernelPlancksterGateway(host=services.host, port=str(services.kp_port), auth_token=AUTH_TOKEN, scheme="http"),
+            file_repository=FileRepository(protocol=ProtocolEnum.S3),
+        )
+
+        print(f"{'sampling':<22}{'requests':>10}{'coarse':>8}{'refined':>9}{'event coverage':>16}{'elapsed s':>11}")
+        for adaptive_interval in [None, *args.coarse]:
+            result = run(scraped_data_repository, args.interval, adaptive_interval, args.events, args.threshold)
+            name = f"adaptive {adaptive_interval} min" if adaptive_interval else f"fixed {args.interval} min"
+            print(f"{name:<22}{result['requests']:>10}{result['coarse']:>8}{result['refined']:>9}{result['event_coverage']:>16.0%}{result['elapsed_s']:>11.1f}")
@@ -0,0 +1,133 @@
+"""
+Encode time versus bytes saved for the output codecs, on a sample of our real cameras.
+
+Frames are taken from `--frames-dir` if given, otherwise downloaded from the `image_url` of a sample of the
+cameras in ROUNDSHOT_WEBCAM_MATRIX. When neither is available (e.g. offline), synthetic frames are used and the
+results say so.
+
+    python -m benchmarks.bench_encoding --cameras 5
+    python -m benchmarks.bench_encoding --frames-dir ./sample_frames --settings jpeg:80:4 webp:75:4
+"""
+
+from io import BytesIO
+import logging
+import os
+import random
+import statistics
+import time
+from typing import List, Tuple
+
+from PIL import Image
+
+from app.config import ROUNDSHOT_WEBCAM_MATRIX
+from app.encoding import OutputEncoding, avif_available, encode_image
+from app.processing import ProcessingOptions, enhance_image
+from benchmarks.fake_services import synthetic_jpeg
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = [
+    "source:85:4",
+    "jpeg:85:0",
+    "jpeg:85:4",
+    "jpeg:75:4",
+    "webp:80:4",
+    "webp:70:6",
+    "avif:60:4",
+    "png:0:6",
+]
+
+
+def parse_setting(setting: str) -> OutputEncoding:
+    codec, quality, effort = setting.split(":")
+    return OutputEncoding(codec=codec, quality=int(quality), effort=int(effort))
+
+
+def load_frames(frames_dir: str | None, cameras: int, seed: int) -> Tuple[List[Tuple[str, bytes]], bool]:
+    """
+    Returns the sample frames as (label, encoded bytes) and whether they are real frames.
+    """
+    if frames_dir:
+        frames = []
+        for file_name in sorted(os.listdir(frames_dir)):
+            with open(os.path.join(frames_dir, file_name), "rb") as f:
+                frames.append((file_name, f.read()))
+        return frames, True
+
+    import requests
+
+    sample = random.Random(seed).sample(ROUNDSHOT_WEBCAM_MATRIX, min(cameras, len(ROUNDSHOT_WEBCAM_MATRIX)))
+    frames = []
+    for webcam in sample:
+        try:
+            response = requests.get(webcam["image_url"], timeout=10)
+            response.raise_for_status()
+            frames.append((webcam["location"], response.content))
+        except Exception as error:
+            logger.warning(f"Could not download a sample frame for '{webcam['location']}': {error}")
+
+    if frames:
+        return frames, True
+
+    return [(f"synthetic-{i}", synthetic_jpeg(4000, 1000, 85, seed=seed + i)) for i in range(cameras)], False
+
+
+def bench(frames: List[Tuple[str, bytes]], settings: List[OutputEncoding], repeat: int) -> List[dict]:
+    options = ProcessingOptions()
+    rows = []
+    enhanced = []
+    for label, frame in frames:
+        image = Image.open(BytesIO(frame))
+        enhanced.append((label, len(frame), image.format, enhance_image(image, options.factor, options.clip_range)))
+
+    reference_bytes = None
+    for encoding in settings:
+        times, sizes = [], []
+        for label, source_bytes, source_format, image in enhanced:
+            durations = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                data, _ = encode_image(image, encoding, source_format=source_format)
+                durations.append(time.perf_counter() - start)
+            times.append(statistics.median(durations))
+            sizes.append(len(data))
+
+        total_bytes = sum(sizes)
+        if reference_bytes is None:
+            reference_bytes = total_bytes
+        rows.append({
+            "setting": f"{encoding.codec}:{encoding.quality}:{encoding.effort}",
+            "encode_ms_per_frame": statistics.mean(times) * 1000,
+            "kb_per_frame": total_bytes / len(sizes) / 1024,
+            "bytes_saved": 1 - total_bytes / reference_bytes,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Encode time versus bytes saved for the output codecs.")
+    parser.add_argument("--frames-dir", type=str, default=None, help="Directory with sample frames, instead of downloading them")
+    parser.add_argument("--cameras", type=int, default=5, help="Number of cameras to sample from ROUNDSHOT_WEBCAM_MATRIX")
+    parser.add_argument("--settings", nargs="+", default=DEFAULT_SETTINGS, help="Settings as codec:quality:effort; the first one is the reference for bytes saved")
+    parser.add_argument("--repeat", type=int, default=3, help="Encodes per frame and setting; the median is reported")
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    settings = [parse_setting(s) for s in args.settings]
+    if not avif_available():
+        skipped = [s for s in settings if s.codec == "avif"]
+        settings = [s for s in settings if s.codec != "avif"]
+        if skipped:
+            print("AVIF is not available in this environment, skipping the avif settings.")
+
+    frames, real = load_frames(args.frames_dir, args.cameras, args.seed)
+    print(f"== encoding: {len(frames)} {'real' if real else 'SYNTHETIC'} frames, reference '{args.settings[0]}' ==")
+    print(f"  {'setting':<14} {'encode ms/frame':>16} {'KiB/frame':>10} {'bytes saved':>12}")
+    for row in bench(frames, settings, args.repeat):
+        print(f"  {row['setting']:<14} {row['encode_ms_per_frame']:>16.1f} {row['kb_per_frame']:>10.1f} {row['bytes_saved']:>12.1%}")
@@ -0,0 +1,76 @@
+"""
+Throughput of registering files through the sync `ScrapedDataRepository` versus the async one, against the fake
+Kernel Planckster. Every registration is a signed-URL call, an upload and a source registration (plus the pings).
+
+    python -m benchmarks.bench_gateway --files 200 --concurrency 50 --kp-latency-ms 20
+"""
+
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from app.sdk.file_repository import FileRepository
+from app.sdk.kernel_plackster_gateway import AsyncKernelPlancksterGateway, KernelPlancksterGateway, make_async_client
+from app.sdk.models import KernelPlancksterSourceData, ProtocolEnum
+from app.sdk.scraped_data_repository import AsyncScrapedDataRepository, ScrapedDataRepository
+from benchmarks.fake_services import FakeKernelPlancksterConfig, FakeServices
+
+AUTH_TOKEN = "test123"
+
+
+def source_data(i: int) -> KernelPlancksterSourceData:
+    return KernelPlancksterSourceData(name="bench", protocol=ProtocolEnum.S3, relative_path=f"bench/1/1/{i}/webcam/frame_webcam_nohash.jpeg")
+
+
+def bench_sync(host: str, port: int, files: int, local_file_name: str) -> float:
+    repository = ScrapedDataRepository(
+        protocol=ProtocolEnum.S3,
+        kernel_planckster=KernelPlancksterGateway(host, str(port), AUTH_TOKEN, "http"),
+        file_repository=FileRepository(ProtocolEnum.S3),
+    )
+    start = time.perf_counter()
+    for i in range(files):
+        repository.register_scraped_photo(source_data=source_data(i), job_id=1, local_file_name=local_file_name)
+    return time.perf_counter() - start
+
+
+async def bench_async(host: str, port: int, files: int, concurrency: int, local_file_name: str) -> float:
+    client = make_async_client(max_connections=concurrency)
+    gateway = AsyncKernelPlancksterGateway(host, str(port), AUTH_TOKEN, "http", client=client)
+    async with client, AsyncScrapedDataRepository(ProtocolEnum.S3, gateway, FileRepository(ProtocolEnum.S3), upload_client=client) as repository:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            repository.register_scraped_photo(source_data=source_data(i), job_id=1, local_file_name=local_file_name)
+            for i in range(files)
+        ))
+        return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sync versus async registration throughput against the fake Kernel Planckster.")
+    parser.add_argument("--files", type=int, default=200, help="Number of files to register with each repository")
+    parser.add_argument("--concurrency", type=int, default=50, help="Connection limit of the async client")
+    parser.add_argument("--file-kb", type=int, default=64, help="Size of the uploaded file")
+    parser.add_argument("--kp-latency-ms", type=float, default=20.0, help="Latency of the fake Kernel Planckster")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    services = FakeServices(kp_config=FakeKernelPlancksterConfig(auth_token=AUTH_TOKEN, latency_ms=args.kp_latency_ms))
+    with services, tempfile.TemporaryDirectory() as tmp_dir:
+        local_file_name = os.path.join(tmp_dir, "frame.jpeg")
+        with open(local_file_name, "wb") as f:
+            f.write(os.urandom(args.file_kb * 1024))
+
+        sync_s = bench_sync(services.host, services.kp_port, args.files, local_file_name)
+        async_s = asyncio.run(bench_async(services.host, services.kp_port, args.files, args.concurrency, local_file_name))
+
+    print(f"== gateway: {args.files} registrations, {args.kp_latency_ms:g}ms Kernel Planckster latency ==")
+    print(f"  sync                      {args.files / sync_s:8.1f} files/s")
+    print(f"  async, {args.concurrency:>3} connections   {args.files / async_s:8.1f} files/s")
+    print(f"  server stats: {services.stats}")
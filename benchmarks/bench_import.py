@@ -0,0 +1,119 @@
+"""
+Import time of the CLI, from `python -X importtime`, for the paths a short-lived job container takes.
+
+Every scenario runs in a fresh interpreter. For each one the benchmark reports the total import time, the wall
+time of the process and the heaviest top-level imports, and checks that the heavy modules (NumPy, Pillow,
+pydantic, requests, httpx) are only loaded where they are needed:
+
+    python -m benchmarks.bench_import
+    python -m benchmarks.bench_import --update-baseline
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Set, Tuple
+
+from benchmarks.harness import compare_to_baseline, print_results, update_baseline
+
+BENCHMARK_NAME = "import"
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["numpy", "PIL", "pydantic", "requests", "httpx"]
+
+# name -> (interpreter arguments, heavy modules that must not be imported)
+SCENARIOS: Dict[str, Tuple[List[str], List[str]]] = {
+    "help": (["webcam_scraper.py", "--help"], HEAVY_MODULES),
+    "invalid_args": (
+        ["webcam_scraper.py", "--roundshot_webcam_id", "invalid", "--longitude", "0", "--interval", "0"],
+        ["numpy", "PIL", "requests", "httpx"],
+    ),
+    "scrape_modules": (["-c", "import app.jobs, app.url_image_scraper, app.profiling"], []),
+}
+
+
+def parse_importtime(stderr: str) -> Tuple[Dict[str, float], Set[str]]:
+    """
+    Returns the cumulative import time in ms of every top-level import in the output of `-X importtime`, and the
+    root packages of all imported modules, nested ones included.
+    """
+    top_level = {}
+    packages = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        packages.add(name.strip().split(".")[0])
+        if not name.startswith("  "):
+            top_level[name.strip()] = int(cumulative) / 1000
+    return top_level, packages
+
+
+def run_scenario(arguments: List[str]) -> Tuple[Dict[str, float], Set[str], float]:
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", *arguments],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    return *parse_importtime(completed.stderr), wall_ms
+
+
+def bench(repeat: int, top: int) -> Tuple[Dict[str, float], List[str]]:
+    results = {}
+    problems = []
+    for name, (arguments, forbidden) in SCENARIOS.items():
+        import_ms, wall_ms = [], []
+        for _ in range(repeat):
+            top_level, packages, wall = run_scenario(arguments)
+            import_ms.append(sum(top_level.values()))
+            wall_ms.append(wall)
+
+        results[f"{name}_import_ms"] = statistics.median(import_ms)
+        results[f"{name}_wall_ms"] = statistics.median(wall_ms)
+
+        loaded = [module for module in HEAVY_MODULES if module in packages]
+        problems.extend(f"'{name}' imports {module}" for module in forbidden if module in loaded)
+
+        heaviest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:top]
+        print(f"  {name}: heavy modules {loaded or 'none'}; heaviest imports " + ", ".join(f"{module} {ms:.0f}ms" for module, ms in heaviest))
+
+    return results, problems
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import time of the webcam scraper CLI.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per scenario; the median is reported")
+    parser.add_argument("--top", type=int, default=5, help="Number of heaviest top-level imports to show per scenario")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed regression against the baseline, as a fraction")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+
+    args = parser.parse_args()
+
+    print(f"== {BENCHMARK_NAME}: scenarios ==")
+    results, problems = bench(args.repeat, args.top)
+    print_results(BENCHMARK_NAME, results)
+
+    if problems:
+        print("Heavy modules imported where they are not needed:")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+
+    if args.update_baseline:
+        update_baseline(BENCHMARK_NAME, results)
+        print("Baseline updated.")
+        sys.exit(0)
+
+    regressions = compare_to_baseline(BENCHMARK_NAME, results, higher_is_better=[], tolerance=args.tolerance)
+    if regressions:
+        print("Regressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
@@ -0,0 +1,57 @@
+"""
+Per-instance cost of building the `KernelPlancksterSourceData` of a frame: the validating constructor versus the
+`TrustedSourceDataBuilder` fast path, with the relative path formatting included in both.
+
+    python -m benchmarks.bench_models --instances 50000
+"""
+
+import timeit
+
+from app.sdk.models import KernelPlancksterSourceData, ProtocolEnum, TrustedSourceDataBuilder
+from app.utils import generate_relative_path
+
+WEBCAM_NAME = "FincaLaAnitaMendoza..Argentina..-33.17268331..-68.91994679"
+
+
+def validated(i: int) -> KernelPlancksterSourceData:
+    return KernelPlancksterSourceData(
+        name=WEBCAM_NAME,
+        protocol=ProtocolEnum.S3,
+        relative_path=generate_relative_path("climate", "tracer", 1, 1700000000 + i, WEBCAM_NAME, "webcam", "nohash", "jpeg"),
+    )
+
+
+def make_builder() -> TrustedSourceDataBuilder:
+    return TrustedSourceDataBuilder(
+        name=WEBCAM_NAME,
+        protocol=ProtocolEnum.S3,
+        relative_path_template=generate_relative_path("climate", "tracer", 1, "{timestamp}", WEBCAM_NAME, "{evalscript_name}", "nohash", "{file_extension}"),
+        timestamp=0,
+        evalscript_name="webcam",
+        file_extension="jpeg",
+    )
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Per-instance cost of KernelPlancksterSourceData construction.")
+    parser.add_argument("--instances", type=int, default=50000, help="Instances built per measurement")
+    parser.add_argument("--repeat", type=int, default=5, help="Measurements per variant; the best one is reported")
+
+    args = parser.parse_args()
+
+    builder = make_builder()
+    assert builder.build(timestamp=1700000000, evalscript_name="webcam", file_extension="jpeg") == validated(0)
+
+    variants = {
+        "validated constructor": lambda: [validated(i) for i in range(args.instances)],
+        "trusted builder": lambda: [builder.build(timestamp=1700000000 + i, evalscript_name="webcam", file_extension="jpeg") for i in range(args.instances)],
+        "builder setup (once per job)": lambda: [make_builder() for _ in range(args.instances)],
+    }
+
+    print(f"== source data: best of {args.repeat} x {args.instances} instances ==")
+    for name, variant in variants.items():
+        best = min(timeit.repeat(variant, number=1, repeat=args.repeat))
+        print(f"  {name:<30} {best / args.instances * 1e6:8.2f} us/instance")
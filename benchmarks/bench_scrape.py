@@ -0,0 +1,132 @@
+"""
+End to end benchmark of `scrape()` against the local Roundshot and Kernel Planckster stand-ins.
+
+Reports frames/s, p50/p99 per stage and peak RSS, and compares them against `benchmarks/baseline.json`:
+
+    python -m benchmarks.bench_scrape                      # run and check against the baseline
+    python -m benchmarks.bench_scrape --update-baseline    # run and store the results as the new baseline
+"""
+
+from datetime import datetime, timedelta
+import logging
+import os
+import sys
+import tempfile
+from typing import Dict, Tuple
+
+from benchmarks.fake_services import FakeKernelPlancksterConfig, FakeRoundshotConfig, FakeServices
+from benchmarks.harness import compare_to_baseline, peak_rss_mb, print_results, update_baseline
+
+BENCHMARK_NAME = "scrape"
+WEBCAM_ID = "5e568898681458.46669392"
+AUTH_TOKEN = "test123"
+
+
+def run(args) -> Tuple[Dict[str, float], dict, dict]:
+    """The results checked against the baseline, the job metrics summary, and the request counters of the stand-ins."""
+    services = FakeServices(
+        roundshot_config=FakeRoundshotConfig(
+            width=args.width,
+            height=args.height,
+            latency_ms=args.latency_ms,
+            error_rate=args.error_rate,
+            missing_every=args.missing_every,
+        ),
+        kp_config=FakeKernelPlancksterConfig(auth_token=AUTH_TOKEN, latency_ms=args.kp_latency_ms),
+    )
+
+    with services:
+        # The URL template is read when 'app.utils' is imported, so the app modules are imported only now
+        os.environ["ROUNDSHOT_URL_TEMPLATE"] = services.roundshot_url_template
+
+        from app.metrics import JobMetrics
+        from app.sdk.file_repository import FileRepository
+        from app.sdk.kernel_plackster_gateway import KernelPlancksterGateway
+        from app.sdk.models import BaseJobState, ProtocolEnum
+        from app.sdk.scraped_data_repository import ScrapedDataRepository
+        from app.url_image_scraper import ScrapeJob, scrape
+
+        kernel_planckster = KernelPlancksterGateway(host=services.host, port=str(services.kp_port), auth_token=AUTH_TOKEN, scheme="http")
+        scraped_data_repository = ScrapedDataRepository(
+            protocol=ProtocolEnum.S3,
+            kernel_planckster=kernel_planckster,
+            file_repository=FileRepository(protocol=ProtocolEnum.S3),
+        )
+
+        interval = timedelta(minutes=args.interval)
+        start_date = datetime(2024, 9, 15, 0, 0)
+        end_date = start_date + interval * (args.frames - 1)
+
+        metrics = JobMetrics()
+        with tempfile.TemporaryDirectory() as tmp:
+            job = ScrapeJob(
+                case_study_name="benchmark",
+                job_id=1,
+                tracer_id="benchmark",
+                log_level=args.log_level,
+                latitude="0",
+                longitude="0",
+                start_date=start_date,
+                end_date=end_date,
+                file_dir=os.path.join(tmp, "job"),
+                roundshot_webcam_id=WEBCAM_ID,
+                interval=interval,
+                workers=args.workers,
+            )
+            job_output = scrape(job, scraped_data_repository=scraped_data_repository, metrics=metrics)
+
+    if job_output.job_state != BaseJobState.FINISHED:
+        raise RuntimeError(f"Benchmark job did not finish: {job_output.job_state}")
+
+    summary = metrics.summary()
+    results = {
+        "frames_per_s": args.frames / summary["elapsed_s"],
+        "kept_frames_per_s": summary["counters"].get("frames_kept", 0) / summary["elapsed_s"],
+        "peak_rss_mb": peak_rss_mb(),
+        "cpu_utilization": summary["gauges"].get("processing_cpu_utilization", 0.0),
+    }
+    for stage, stage_summary in summary["stages"].items():
+        results[f"{stage}_p50_ms"] = stage_summary["p50_s"] * 1000
+        results[f"{stage}_p99_ms"] = stage_summary["p99_s"] * 1000
+
+    return results, summary, services.stats
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="End to end benchmark of the webcam scraper against local stand-ins.")
+    parser.add_argument("--frames", type=int, default=50, help="Number of capture slots to scrape")
+    parser.add_argument("--interval", type=int, default=10, help="Interval between capture slots, in minutes")
+    parser.add_argument("--width", type=int, default=2000, help="Width of the synthetic frames")
+    parser.add_argument("--height", type=int, default=500, help="Height of the synthetic frames")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Latency of the fake Roundshot origin")
+    parser.add_argument("--kp-latency-ms", type=float, default=2.0, help="Latency of the fake Kernel Planckster")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of Roundshot requests answered with a 500")
+    parser.add_argument("--missing-every", type=int, default=0, help="Every n-th capture slot (in minutes since midnight) answers 404")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes for frame processing, 0 processes inline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression against the baseline, as a fraction")
+    parser.add_argument("--tail-tolerance", type=float, default=1.0, help="Allowed regression of the p99 latencies, as a fraction: with 50 frames a p99 is about the slowest frame, and noisy")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--log-level", type=str, default="WARNING")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level)
+
+    results, summary, stats = run(args)
+    print_results(BENCHMARK_NAME, results)
+    print(f"  server stats: {stats}")
+
+    if args.update_baseline:
+        update_baseline(BENCHMARK_NAME, results)
+        print("Baseline updated.")
+        sys.exit(0)
+
+    tail_tolerances = {metric: args.tail_tolerance for metric in results if metric.endswith("_p99_ms")}
+    regressions = compare_to_baseline(BENCHMARK_NAME, results, higher_is_better=["frames_per_s", "kept_frames_per_s", "cpu_utilization"], tolerance=args.tolerance, tolerances=tail_tolerances)
+    if regressions:
+        print("Regressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
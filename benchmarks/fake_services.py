@@ -0,0 +1,497 @@
+"""
+Local stand-ins for the Roundshot image origin and for Kernel Planckster.
+
+Both servers run in a child process (so that they do not compete with the scraper for the GIL) and are
+configured through `FakeRoundshotConfig` and `FakeKernelPlancksterConfig`. They can also be started from the
+command line for manual runs of `webcam_scraper.py`:
+
+    python -m benchmarks.fake_services --roundshot-port 8081 --kp-port 8000
+"""
+
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+import hmac
+import json
+import math
+import multiprocessing
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, unquote, urlencode, urlparse
+import zlib
+from email.utils import formatdate
+
+
+ROUNDSHOT_PATH_PATTERN = re.compile(
+    r"^/(?P<webcam_id>[^/]+)/(?P<date>\d{4}-\d{2}-\d{2})/(?P<hour>\d{2})-(?P<minute>\d{2})-00/[^/]+\.jpg$"
+)
+
+
+@dataclass
+class FakeRoundshotConfig:
+    """
+    @attr width, height: size of the synthetic frames, in pixels
+    @attr quality: JPEG quality of the synthetic frames
+    @attr variants: number of distinct synthetic frames to serve (picked deterministically from the URL)
+    @attr latency_ms: delay added before every response
+    @attr error_rate: fraction of requests answered with a 500, drawn from a seeded RNG
+    @attr missing_every: every n-th capture slot (counted in minutes since midnight) answers 404, 0 disables
+    @attr missing_hours: hours of the day for which every capture answers 404 (e.g. night time)
+    @attr dark_hours: hours of the day for which an all black frame is served
+    @attr foggy_every: every n-th capture slot (counted in minutes since midnight) serves a fogged-up frame, 0 disables
+    @attr seed: seed for the synthetic frames and for the error RNG
+    @attr last_modified: Unix time sent as the 'Last-Modified' of every frame
+    @attr change_events: (start, end) minutes since midnight of fast changes, e.g. storms. When given, the scene
+        changes with the time of day: slowly, one frame per hour, outside of the events, and at every capture
+        slot inside of them. Otherwise frames are picked at random between the `variants`.
+    """
+    width: int = 2000
+    height: int = 500
+    quality: int = 85
+    variants: int = 8
+    latency_ms: float = 0.0
+    error_rate: float = 0.0
+    missing_every: int = 0
+    missing_hours: List[int] = field(default_factory=list)
+    dark_hours: List[int] = field(default_factory=list)
+    foggy_every: int = 0
+    seed: int = 42
+    last_modified: float = 1700000000.0
+    change_events: List[Tuple[int, int]] = field(default_factory=list)
+
+
+@dataclass
+class FakeKernelPlancksterConfig:
+    """
+    @attr auth_token: the expected value of the 'x-auth-token' header
+    @attr client_id: the client id served under '/client/{client_id}/...'
+    @attr latency_ms: delay added before every response
+    @attr scoped_credentials: whether upload credentials scoped to a prefix are granted
+    @attr unsupported_status: the status answered for scoped upload credentials without `scoped_credentials`
+    @attr grant_ttl_s: how long scoped upload credentials are valid
+    @attr refused_scoped_uploads: the first uploads with scoped credentials refused with a 403, as if revoked
+    """
+    auth_token: str = "test123"
+    client_id: int = 1
+    latency_ms: float = 0.0
+    scoped_credentials: bool = True
+    unsupported_status: int = 404
+    grant_ttl_s: float = 3600.0
+    refused_scoped_uploads: int = 0
+
+
+def synthetic_jpeg(width: int, height: int, quality: int, seed: int, dark: bool = False, brightness: float = 1.0, inverted: bool = False, fog: float = 0.0) -> bytes:
+    """
+    Generate a panorama-like JPEG: a vertical sky-to-ground gradient with some noise, so that it compresses like
+    a real frame rather than like a flat color. `brightness` scales the gradient; `inverted` makes the sky dark;
+    `fog`, 0-1, fades the frame towards a flat light gray.
+    """
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    if dark:
+        array = np.zeros((height, width, 3), dtype=np.uint8)
+    else:
+        gradient = np.linspace(40, 220, height, dtype=np.float32) if inverted else np.linspace(220, 40, height, dtype=np.float32)
+        gradient = gradient[:, None, None] * brightness
+        tint = rng.uniform(0.7, 1.0, size=(1, 1, 3)).astype(np.float32)
+        noise = rng.normal(0, 18, size=(height, width, 3)).astype(np.float32)
+        array = np.clip((gradient * tint + noise) * (1 - fog) + 200 * fog, 0, 255).astype(np.uint8)
+
+    buffer = BytesIO()
+    Image.fromarray(array).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, Nagle and delayed ACKs add ~40ms per keep-alive response
+    disable_nagle_algorithm = True
+    server_version = "FakeServices/1.0"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        stats = self.server.stats
+        with self.server.stats_lock:
+            stats[key] = stats.get(key, 0) + amount
+
+    def _reply(self, status: int, body: bytes, content_type: str = "application/json", headers: Dict[str, str] | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reply_json(self, status: int, payload: dict) -> None:
+        self._reply(status, json.dumps(payload).encode())
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b"".join(chunks)
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length)
+
+    def _sleep(self) -> None:
+        latency_ms = self.server.config.latency_ms
+        if latency_ms > 0:
+            time.sleep(latency_ms / 1000)
+
+    def do_GET(self) -> None:
+        if self.path == "/_stats":
+            with self.server.stats_lock:
+                self._reply_json(200, dict(self.server.stats))
+            return
+        self._sleep()
+        self.handle_get()
+
+    def do_POST(self) -> None:
+        self._sleep()
+        self.handle_post()
+
+    def do_PUT(self) -> None:
+        self._sleep()
+        self.handle_put()
+
+    def handle_get(self) -> None:
+        self._reply_json(404, {"detail": "Not found"})
+
+    def handle_post(self) -> None:
+        self._reply_json(404, {"detail": "Not found"})
+
+    def handle_put(self) -> None:
+        self._reply_json(404, {"detail": "Not found"})
+
+
+class _RoundshotHandler(_Handler):
+
+    def handle_get(self) -> None:
+        server = self.server
+        config: FakeRoundshotConfig = server.config
+        self._count("requests")
+
+        match = ROUNDSHOT_PATH_PATTERN.match(urlparse(self.path).path)
+        if not match:
+            self._count("not_found")
+            self._reply(404, b"Not found", "text/plain")
+            return
+
+        hour, minute = int(match["hour"]), int(match["minute"])
+        slot = hour * 60 + minute
+
+        with server.rng_lock:
+            failed = server.rng.random() < config.error_rate
+        if failed:
+            self._count("errors")
+            self._reply(500, b"Internal error", "text/plain")
+            return
+
+        if hour in config.missing_hours or (config.missing_every and slot % config.missing_every == 0):
+            self._count("not_found")
+            self._reply(404, b"Not found", "text/plain")
+            return
+
+        if hour in config.dark_hours:
+            body = server.dark_frame
+        elif config.foggy_every and slot % config.foggy_every == 0:
+            body = server.foggy_frame
+        elif config.change_events:
+            if any(start <= slot < end for start, end in config.change_events):
+                body = server.event_frames[zlib.crc32(self.path.encode()) % len(server.event_frames)]
+            else:
+                body = server.scene_frames[hour]
+        else:
+            body = server.frames[zlib.crc32(self.path.encode()) % len(server.frames)]
+
+        # Like the real origin, frames carry validators and conditional requests are answered with a 304
+        validators = {
+            "ETag": f'"{zlib.crc32(body):08x}"',
+            "Last-Modified": formatdate(config.last_modified, usegmt=True),
+        }
+        if self.headers.get("If-None-Match") == validators["ETag"]:
+            self._count("not_modified")
+            self._reply(304, b"", "image/jpeg", validators)
+            return
+
+        self._count("frames")
+        self._count("bytes_served", len(body))
+        self._reply(200, body, "image/jpeg", validators)
+
+
+class _KernelPlancksterHandler(_Handler):
+    CLIENT_PATTERN = re.compile(r"^/client/(?P<client_id>\d+)/(?P<endpoint>upload-credentials|scoped-upload-credentials|source)$")
+    GRANT_SECRET = b"fake-kernel-planckster"
+
+    def _grant_signature(self, prefix: str, expires: str) -> str:
+        return hmac.new(self.GRANT_SECRET, f"{prefix}|{expires}".encode(), "sha256").hexdigest()
+
+    def _authorized(self, client_id: str) -> bool:
+        config: FakeKernelPlancksterConfig = self.server.config
+        if int(client_id) != config.client_id:
+            self._reply_json(404, {"detail": f"Client {client_id} not found"})
+            return False
+        if self.headers.get("x-auth-token") != config.auth_token:
+            self._count("unauthorized")
+            self._reply_json(403, {"detail": "Invalid auth token"})
+            return False
+        return True
+
+    def handle_get(self) -> None:
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        if url.path == "/ping":
+            self._count("ping")
+            self._reply_json(200, {"ping": "pong"})
+            return
+
+        match = self.CLIENT_PATTERN.match(url.path)
+        if match and match["endpoint"] == "upload-credentials":
+            if not self._authorized(match["client_id"]):
+                return
+            self._count("upload_credentials")
+            relative_path = params.get("relative_path", "")
+            host, port = self.server.server_address[:2]
+            self._reply_json(200, {"signed_url": f"http://{host}:{port}/upload/{relative_path}"})
+            return
+
+        if match and match["endpoint"] == "scoped-upload-credentials":
+            if not self.server.config.scoped_credentials:
+                self._count("unsupported")
+                self._reply(self.server.config.unsupported_status, b"Not supported", "text/plain")
+                return
+            if not self._authorized(match["client_id"]):
+                return
+            self._count("scoped_credentials")
+            prefix = params.get("prefix", "")
+            expires = f"{time.time() + self.server.config.grant_ttl_s:.0f}"
+            query = urlencode({"prefix": prefix, "expires": expires, "signature": self._grant_signature(prefix, expires)})
+            host, port = self.server.server_address[:2]
+            self._reply_json(200, {"prefix": prefix, "url_template": f"http://{host}:{port}/upload/{{relative_path}}?{query}", "expires_at": float(expires)})
+            return
+
+        super().handle_get()
+
+    def handle_post(self) -> None:
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        match = self.CLIENT_PATTERN.match(url.path)
+        if match and match["endpoint"] == "source":
+            if not self._authorized(match["client_id"]):
+                return
+            self._count("source_registrations")
+            source_data = {
+                "name": params.get("source_data_name"),
+                "protocol": params.get("source_data_protocol"),
+                "relative_path": params.get("source_data_relative_path"),
+            }
+            with self.server.stats_lock:
+                self.server.registered.append(source_data)
+            self._reply_json(200, {"source_data": source_data})
+            return
+
+        super().handle_post()
+
+    def handle_put(self) -> None:
+        url = urlparse(self.path)
+        if not url.path.startswith("/upload/"):
+            super().handle_put()
+            return
+
+        body = self._read_body()
+        # Uploads with a scoped grant are signed for a prefix, and refused outside of it or once expired
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if "signature" in params:
+            relative_path = unquote(url.path[len("/upload/"):])
+            valid = (
+                hmac.compare_digest(params["signature"], self._grant_signature(params.get("prefix", ""), params.get("expires", "")))
+                and relative_path.startswith(params.get("prefix", ""))
+                and time.time() < float(params.get("expires", 0))
+            )
+            with self.server.stats_lock:
+                revoked = self.server.stats.get("refused_uploads", 0) < self.server.config.refused_scoped_uploads
+            if not valid or revoked:
+                self._count("refused_uploads")
+                self._reply(403, b"Invalid signature", "text/plain")
+                return
+            self._count("scoped_uploads")
+        self._count("uploads")
+        self._count("bytes_uploaded", len(body))
+        self._reply(200, b"", "text/plain")
+
+
+class _FakeServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections when a benchmark opens tens of them at once
+    request_queue_size = 128
+
+
+def _make_server(handler: type, config, host: str, port: int) -> ThreadingHTTPServer:
+    server = _FakeServer((host, port), handler)
+    server.daemon_threads = True
+    server.config = config
+    server.stats = {}
+    server.stats_lock = threading.Lock()
+    return server
+
+
+def make_roundshot_server(config: FakeRoundshotConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    server = _make_server(_RoundshotHandler, config, host, port)
+    server.rng = random.Random(config.seed)
+    server.rng_lock = threading.Lock()
+    server.frames = [
+        synthetic_jpeg(config.width, config.height, config.quality, seed=config.seed + i)
+        for i in range(max(1, config.variants))
+    ]
+    server.dark_frame = synthetic_jpeg(config.width, config.height, config.quality, seed=config.seed, dark=True)
+    server.foggy_frame = synthetic_jpeg(config.width, config.height, config.quality, seed=config.seed, fog=0.9)
+    if config.change_events:
+        # The same scene all day, a little brighter towards noon; events flicker between 8 darker frames
+        server.scene_frames = [
+            synthetic_jpeg(config.width, config.height, config.quality, seed=config.seed, brightness=0.85 + 0.15 * math.sin(math.pi * hour / 24))
+            for hour in range(24)
+        ]
+        server.event_frames = [
+            synthetic_jpeg(config.width, config.height, config.quality, seed=config.seed + i, brightness=0.2 + 0.5 * (i // 2) / 3, inverted=i % 2 == 1)
+            for i in range(8)
+        ]
+    return server
+
+
+def make_kernel_planckster_server(config: FakeKernelPlancksterConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    server = _make_server(_KernelPlancksterHandler, config, host, port)
+    server.registered = []
+    return server
+
+
+def _serve(roundshot_config: dict, kp_config: dict, host: str, roundshot_port: int, kp_port: int, conn) -> None:
+    roundshot = make_roundshot_server(FakeRoundshotConfig(**roundshot_config), host, roundshot_port)
+    kernel_planckster = make_kernel_planckster_server(FakeKernelPlancksterConfig(**kp_config), host, kp_port)
+
+    threading.Thread(target=roundshot.serve_forever, daemon=True).start()
+    threading.Thread(target=kernel_planckster.serve_forever, daemon=True).start()
+
+    conn.send((roundshot.server_address[1], kernel_planckster.server_address[1]))
+    # Block until the parent asks us to stop, then answer with the collected statistics
+    conn.recv()
+    with roundshot.stats_lock, kernel_planckster.stats_lock:
+        conn.send({"roundshot": dict(roundshot.stats), "kernel_planckster": dict(kernel_planckster.stats)})
+    roundshot.shutdown()
+    kernel_planckster.shutdown()
+
+
+class FakeServices:
+    """
+    Runs the fake Roundshot origin and the fake Kernel Planckster in a child process.
+
+    Use as a context manager; `stats` holds the request counters of both servers after exit.
+    """
+
+    def __init__(
+            self,
+            roundshot_config: FakeRoundshotConfig | None = None,
+            kp_config: FakeKernelPlancksterConfig | None = None,
+            host: str = "127.0.0.1",
+            roundshot_port: int = 0,
+            kp_port: int = 0,
+    ) -> None:
+        self.roundshot_config = roundshot_config or FakeRoundshotConfig()
+        self.kp_config = kp_config or FakeKernelPlancksterConfig()
+        self.host = host
+        self.roundshot_port = roundshot_port
+        self.kp_port = kp_port
+        self.stats: Dict[str, dict] = {}
+        self._conn = None
+        self._process = None
+
+    @property
+    def roundshot_url_template(self) -> str:
+        return (
+            f"http://{self.host}:{self.roundshot_port}"
+            "/{webcam_id}/{year}-{month}-{day}/{hour}-{minute}-00/{year}-{month}-{day}-{hour}-{minute}-00_half.jpg"
+        )
+
+    def start(self) -> Tuple[int, int]:
+        parent_conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_serve,
+            args=(asdict(self.roundshot_config), asdict(self.kp_config), self.host, self.roundshot_port, self.kp_port, child_conn),
+            daemon=True,
+        )
+        self._process.start()
+        self._conn = parent_conn
+        self.roundshot_port, self.kp_port = parent_conn.recv()
+        return self.roundshot_port, self.kp_port
+
+    def stop(self) -> None:
+        if self._process is None:
+            return
+        self._conn.send("stop")
+        self.stats = self._conn.recv()
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process = None
+
+    def __enter__(self) -> "FakeServices":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the fake Roundshot origin and the fake Kernel Planckster.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--roundshot-port", type=int, default=8081)
+    parser.add_argument("--kp-port", type=int, default=8000)
+    parser.add_argument("--kp-auth-token", type=str, default="test123")
+    parser.add_argument("--width", type=int, default=2000)
+    parser.add_argument("--height", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--missing-every", type=int, default=0)
+
+    args = parser.parse_args()
+
+    services = FakeServices(
+        roundshot_config=FakeRoundshotConfig(
+            width=args.width,
+            height=args.height,
+            latency_ms=args.latency_ms,
+            error_rate=args.error_rate,
+            missing_every=args.missing_every,
+        ),
+        kp_config=FakeKernelPlancksterConfig(auth_token=args.kp_auth_token),
+        host=args.host,
+        roundshot_port=args.roundshot_port,
+        kp_port=args.kp_port,
+    )
+
+    with services:
+        print(f"Fake Roundshot:  ROUNDSHOT_URL_TEMPLATE='{services.roundshot_url_template}'")
+        print(f"Fake Kernel Planckster: --kp_host {args.host} --kp_port {services.kp_port} --kp_scheme http --kp_auth_token {args.kp_auth_token}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,81 @@
+"""
+Helpers shared by the benchmarks: peak RSS, result printing and the regression check against the baseline file.
+
+The baseline file maps a benchmark name to a flat dict of metric values. Every metric is compared with a
+direction: metrics listed in `higher_is_better` regress when they drop, all others regress when they grow.
+"""
+
+import json
+import os
+import resource
+import sys
+from typing import Dict, Iterable, List
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process, in MiB. On Linux 'ru_maxrss' is reported in KiB.
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return max_rss / (1024 * 1024)
+    return max_rss / 1024
+
+
+def load_baseline(path: str = DEFAULT_BASELINE_PATH) -> Dict[str, Dict[str, float]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def update_baseline(name: str, results: Dict[str, float], path: str = DEFAULT_BASELINE_PATH) -> None:
+    baseline = load_baseline(path)
+    baseline[name] = results
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=4, sort_keys=True)
+        f.write("\n")
+
+
+def compare_to_baseline(
+        name: str,
+        results: Dict[str, float],
+        higher_is_better: Iterable[str],
+        tolerance: float,
+        path: str = DEFAULT_BASELINE_PATH,
+        tolerances: Dict[str, float] | None = None,
+) -> List[str]:
+    """
+    Compare results against the stored baseline and return a list of human readable regressions.
+
+    A metric regresses when it is worse than the baseline by more than `tolerance` (a fraction, e.g. 0.2 for 20%),
+    or by more than its own tolerance in `tolerances`, e.g. a looser one for tail percentiles. Metrics missing from
+    either side are ignored.
+    """
+    baseline = load_baseline(path).get(name)
+    if not baseline:
+        return []
+
+    higher_is_better = set(higher_is_better)
+    regressions = []
+    for metric, expected in baseline.items():
+        actual = results.get(metric)
+        if actual is None or not expected:
+            continue
+        metric_tolerance = (tolerances or {}).get(metric, tolerance)
+        if metric in higher_is_better:
+            worse = actual < expected * (1 - metric_tolerance)
+        else:
+            worse = actual > expected * (1 + metric_tolerance)
+        if worse:
+            regressions.append(f"{metric}: {actual:.4g} vs baseline {expected:.4g} (tolerance {metric_tolerance:.0%})")
+    return regressions
+
+
+def print_results(name: str, results: Dict[str, float]) -> None:
+    print(f"== {name} ==")
+    width = max(len(k) for k in results) if results else 0
+    for metric, value in results.items():
+        print(f"  {metric:<{width}}  {value:.4g}")
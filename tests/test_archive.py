@@ -0,0 +1,46 @@
+import tarfile
+
+from app.archive import ShardedArchive
+
+FRAME = b"x" * 1000
+
+
+def test_frames_of_a_shard_that_failed_to_register_are_reported(tmp_path):
+    registered = []
+
+    def register_shard(local_path: str, shard_number: int) -> str:
+        if shard_number == 1:
+            raise ValueError("upload refused")
+        registered.append(shard_number)
+        return f"shards/{shard_number}.tar"
+
+    # Room for 2 frames per shard
+    archive = ShardedArchive(str(tmp_path), max_shard_bytes=2 * (len(FRAME) + 3 * tarfile.BLOCKSIZE), register_shard=register_shard)
+    failed = []
+    for timestamp in range(6):
+        archive.add(timestamp, f"{timestamp}/frame.jpg", FRAME)
+        failed.extend(archive.take_failed())
+    index = archive.close()
+    failed.extend(archive.take_failed())
+
+    assert registered == [0, 2]
+    assert failed == [2, 3]
+    assert sorted(index) == [0, 1, 4, 5]
+    assert archive.take_failed() == []
+
+
+def test_a_frame_split_across_a_failed_shard_is_dropped_whole(tmp_path):
+    def register_shard(local_path: str, shard_number: int) -> str:
+        if shard_number == 0:
+            raise ValueError("upload refused")
+        return f"shards/{shard_number}.tar"
+
+    archive = ShardedArchive(str(tmp_path), max_shard_bytes=2 * (len(FRAME) + 3 * tarfile.BLOCKSIZE), register_shard=register_shard)
+    # Three crops of one frame: the third goes in the second shard
+    for crop in range(3):
+        archive.add(0, f"0/crop-{crop}.jpg", FRAME)
+    archive.add(1, "1/crop-0.jpg", FRAME)
+    index = archive.close()
+
+    assert archive.take_failed() == [0]
+    assert sorted(index) == [1]
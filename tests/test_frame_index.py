@@ -0,0 +1,19 @@
+import pytest
+
+from app.frame_index import FrameIndex
+
+WEBCAM_ID = "webcam"
+
+
+def test_dropped_frames_are_indexed_with_why_they_were_dropped(tmp_path):
+    frame_index = FrameIndex(str(tmp_path / "index.db"))
+    frame_index.record(WEBCAM_ID, 1, "half", "profile", "climate/tracer/1/1/webcam/frame.jpeg", "sha")
+    frame_index.record(WEBCAM_ID, 2, "half", "profile", None, "sha")
+    frame_index.record(WEBCAM_ID, 3, "half", "profile", None, "sha", status="low_quality")
+    with pytest.raises(ValueError, match="frame status"):
+        frame_index.record(WEBCAM_ID, 4, "half", "profile", None, "sha", status="foggy")
+    frame_index.close()
+
+    indexed = FrameIndex(str(tmp_path / "index.db")).lookup(WEBCAM_ID, "half", "profile", 0)
+    assert {timestamp: entry["status"] for timestamp, entry in indexed.items()} == {1: "registered", 2: "dark", 3: "low_quality"}
+    assert indexed[3]["outputs"] is None
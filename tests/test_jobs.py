@@ -0,0 +1,60 @@
+import logging
+
+import pytest
+
+from app.bulk import validate_manifest
+from app.jobs import ScraperJobSpec, bandwidth_bucket, validate_job, validate_job_ids
+from app.worker_service import WorkerService
+
+logger = logging.getLogger(__name__)
+
+JOB = {
+    "case_study_name": "climate",
+    "job_id": 1,
+    "tracer_id": "tracer",
+    "latitude": "-33.17",
+    "longitude": "-68.9",
+    "roundshot_webcam_id": "5e568898681458.46669392",
+    "start_date": "2024-09-10T09:00",
+    "end_date": "2024-09-10T11:00",
+    "interval": 20,
+    "download_limit_mbps": 8,
+    "upload_limit_mbps": 4,
+    "kp_host": "localhost",
+    "kp_port": 8000,
+    "kp_auth_token": "test123",
+}
+
+
+def test_validation_does_not_open_the_bandwidth_buckets(tmp_path):
+    bandwidth_dir = tmp_path / "bandwidth"
+    spec = ScraperJobSpec(**JOB, bandwidth_dir=str(bandwidth_dir), file_dir=str(tmp_path / "staging"))
+
+    validate_job(spec, logger)
+    service = WorkerService(max_jobs=1)
+    try:
+        jobs, errors = validate_manifest([{**JOB, "bandwidth_dir": str(bandwidth_dir)}], service)
+    finally:
+        service.close()
+    assert errors == [] and len(jobs) == 1
+    assert not bandwidth_dir.exists()
+
+    assert bandwidth_bucket(spec, "download") is not None
+    assert (bandwidth_dir / "download.bucket").exists()
+    assert not (bandwidth_dir / "upload.bucket").exists()
+
+
+@pytest.mark.parametrize("field, value", [("case_study_name", "climate study"), ("tracer_id", "tracer?x=1"), ("case_study_name", "")])
+def test_job_ids_are_validated(field, value):
+    with pytest.raises(ValueError):
+        validate_job_ids(ScraperJobSpec(**{**JOB, field: value}))
+
+
+def test_unknown_webcams_are_reported_per_job():
+    service = WorkerService(max_jobs=1)
+    try:
+        jobs, errors = validate_manifest([JOB, {**JOB, "job_id": 2, "roundshot_webcam_id": "unknown"}], service)
+    finally:
+        service.close()
+    assert len(jobs) == 1
+    assert errors == ["Job 2: Webcam ID 'unknown' not found in ROUNDSHOT_WEBCAM_MATRIX"]
@@ -0,0 +1,24 @@
+import pytest
+
+from app.sdk.models import KernelPlancksterSourceData, ProtocolEnum, TrustedSourceDataBuilder
+
+TEMPLATE = "climate/tracer/1/{timestamp}/webcam/{evalscript_name}.{file_extension}"
+
+
+def test_built_source_data_equals_the_validated_one():
+    builder = TrustedSourceDataBuilder("webcam", ProtocolEnum.S3, TEMPLATE, timestamp=0, evalscript_name="webcam", file_extension="jpeg")
+    built = builder.build(timestamp=1700000000, evalscript_name="webcam-roi", file_extension="png")
+    validated = KernelPlancksterSourceData(name="webcam", protocol=ProtocolEnum.S3, relative_path="climate/tracer/1/1700000000/webcam/webcam-roi.png")
+
+    assert built == validated
+    assert built.model_fields_set == validated.model_fields_set
+    assert built.to_json() == validated.to_json()
+    assert KernelPlancksterSourceData.from_json(built.to_json()) == validated
+    assert built.model_copy(update={"name": "other"}).name == "other"
+
+
+def test_template_is_validated_once_with_the_samples():
+    with pytest.raises(ValueError, match="placeholders"):
+        TrustedSourceDataBuilder("webcam", ProtocolEnum.S3, TEMPLATE, timestamp=0)
+    with pytest.raises(ValueError, match="extension"):
+        TrustedSourceDataBuilder("webcam", ProtocolEnum.S3, "climate/{timestamp}", timestamp=0)
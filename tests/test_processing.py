@@ -0,0 +1,31 @@
+import time
+
+from app.processing import FrameProcessor, ProcessingOptions, make_frame_executor
+from benchmarks.fake_services import synthetic_jpeg
+
+FRAMES = [synthetic_jpeg(400, 100, 85, seed) for seed in range(4)]
+
+
+def test_inline_processing_counts_the_cpu_time_of_each_frame():
+    processor = FrameProcessor(ProcessingOptions())
+    processed = [processor.submit(frame).result() for frame in FRAMES]
+    usage = processor.close()
+
+    assert all(frame.cpu_s > 0 for frame in processed)
+    assert usage["cpu_s"] == sum(frame.cpu_s for frame in processed)
+
+
+def test_processors_sharing_a_pool_only_count_their_own_frames():
+    executor = make_frame_executor(2)
+    try:
+        busy = FrameProcessor(ProcessingOptions(), executor=executor)
+        idle = FrameProcessor(ProcessingOptions(), executor=executor)
+        processed = [future.result() for future in [busy.submit(frame) for frame in FRAMES]]
+        time.sleep(0.1)
+        busy_usage, idle_usage = busy.close(), idle.close()
+    finally:
+        executor.shutdown()
+
+    assert all(frame.cpu_s > 0 for frame in processed)
+    assert busy_usage["cpu_s"] == sum(frame.cpu_s for frame in processed)
+    assert idle_usage["cpu_s"] == 0.0
@@ -0,0 +1,150 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import pytest
+
+from app.sdk.file_repository import FileRepository
+from app.sdk.kernel_plackster_gateway import SCOPED_GRANT_MARGIN_S, AsyncKernelPlancksterGateway, KernelPlancksterGateway, ScopedUploadGrant
+from app.sdk.models import KernelPlancksterSourceData, ProtocolEnum
+from app.sdk.scraped_data_repository import AsyncScrapedDataRepository, ScrapedDataRepository
+from benchmarks.fake_services import FakeKernelPlancksterConfig, FakeServices
+
+AUTH_TOKEN = "test123"
+
+
+def source_data(index: int, job_id: int = 1) -> KernelPlancksterSourceData:
+    return KernelPlancksterSourceData(name=f"object-{index}", protocol=ProtocolEnum.S3, relative_path=f"climate/tracer/{job_id}/objects/{index}.json")
+
+
+@pytest.fixture
+def local_file(tmp_path) -> str:
+    path = tmp_path / "object.json"
+    path.write_text("{}")
+    return str(path)
+
+
+def repository(services: FakeServices) -> ScrapedDataRepository:
+    return ScrapedDataRepository(
+        protocol=ProtocolEnum.S3,
+        kernel_planckster=KernelPlancksterGateway(services.host, str(services.kp_port), AUTH_TOKEN, "http"),
+        file_repository=FileRepository(protocol=ProtocolEnum.S3),
+    )
+
+
+def register(services: FakeServices, local_file: str, count: int) -> None:
+    scraped_data_repository = repository(services)
+    for index in range(count):
+        scraped_data_repository.register_scraped_json(source_data(index), job_id=1, local_file_name=local_file)
+
+
+def test_one_grant_is_reused_for_every_object(local_file):
+    with FakeServices(kp_config=FakeKernelPlancksterConfig(auth_token=AUTH_TOKEN)) as services:
+        register(services, local_file, 10)
+
+    stats = services.stats["kernel_planckster"]
+    assert stats["scoped_credentials"] == 1
+    assert stats["scoped_uploads"] == 10
+    assert "upload_credentials" not in stats
+    assert stats["source_registrations"] == 10
+
+
+def test_concurrent_sync_callers_share_one_grant(local_file):
+    with FakeServices(kp_config=FakeKernelPlancksterConfig(auth_token=AUTH_TOKEN, latency_ms=20)) as services:
+        scraped_data_repository = repository(services)
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(lambda index: scraped_data_repository.register_scraped_json(source_data(index), job_id=1, local_file_name=local_file), range(32)))
+
+    stats = services.stats["kernel_planckster"]
+    assert stats["scoped_credentials"] == 1
+    assert stats["scoped_uploads"] == 32
+
+
+def test_concurrent_async_callers_share_one_grant(local_file):
+    async def register_all(services: FakeServices) -> None:
+        async with AsyncScrapedDataRepository(
+            protocol=ProtocolEnum.S3,
+            kernel_planckster=AsyncKernelPlancksterGateway(services.host, str(services.kp_port), AUTH_TOKEN, "http"),
+            file_repository=FileRepository(protocol=ProtocolEnum.S3),
+        ) as scraped_data_repository:
+            await asyncio.gather(*(scraped_data_repository.register_scraped_json(source_data(index), job_id=1, local_file_name=local_file) for index in range(50)))
+
+    with FakeServices(kp_config=FakeKernelPlancksterConfig(auth_token=AUTH_TOKEN, latency_ms=20)) as services:
+        asyncio.run(register_all(services))
+
+    stats = services.stats["kernel_planckster"]
+    assert stats["scoped_credentials"] == 1
+    assert stats["scoped_uploads"] == 50
+
+
+def test_grants_are_per_job(local_file):
+    with FakeServices(kp_config=FakeKernelPlancksterConfig(auth_token=AUTH_TOKEN)) as services:
+        scraped_data_repository = repository(services)
+        for job_id in (1, 2):
+            for index in range(3):
+                scraped_data_repository.register_scraped_json(source_data(index, job_id), job_id=job_id, local_file_name=local_file)
+
+    assert services.stats["kernel_planckster"]["scoped_credentials"] == 2
+
+
+def test_grant_covers_until_the_margin_before_expiry():
+    now = time.time()
+    grant = ScopedUploadGrant(prefix="climate/tracer/1/", url_template="http://host/upload/{relative_path}", expires_at=now + SCOPED_GRANT_MARGIN_S + 5)
+    assert grant.covers("climate/tracer/1/a.json")
+    assert not grant.covers("climate/tracer/2/a.json")
+
+    expiring = ScopedUploadGrant(prefix="climate/tracer/1/", url_template="http://host/upload/{relative_path}", expires_at=now + SCOPED_GRANT_MARGIN_S - 5)
+    assert not expiring.covers("climate/tracer/1/a.json")
+
+
+def test_grant_is_renewed_before_it_expires(local_file):
+    # Valid for 0.5 s beyond the renewal margin
+    with FakeServices(kp_config=FakeKernelPlancksterConfig(auth_token=AUTH_TOKEN, grant_ttl_s=SCOPED_GRANT_MARGIN_S + 0.5)) as services:
+        scraped_data_repository = repository(services)
+        scraped_data_repository.register_scraped_json(source_data(0), job_id=1, local_file_name=local_file)
+        time.sleep(1.0)
+        scraped_data_repository.register_scraped_json(source_data(1), job_id=1, local_file_name=local_file)
+
+    stats = services.stats["kernel_planckster"]
+    assert stats["scoped_credentials"] == 2
+    assert stats["scoped_uploads"] == 2
+    assert "refused_uploads" not in stats
+
+
+@pytest.mark.parametrize("status", [404, 405, 501])
+def test_unsupported_scoped_credentials_fall_back_to_per_object_urls(local_file, status):
+    config = FakeKernelPlancksterConfig(auth_token=AUTH_TOKEN, scoped_credentials=False, unsupported_status=status)
+    with FakeServices(kp_config=config) as services:
+        register(services, local_file, 5)
+
+    stats = services.stats["kernel_planckster"]
+    # Asked once, then scoped credentials are disabled for the gateway
+    assert stats["unsupported"] == 1
+    assert stats["upload_credentials"] == 5
+    assert stats["uploads"] == 5
+    assert "scoped_uploads" not in stats
+
+
+def test_refused_upload_is_retried_with_a_per_object_url(local_file):
+    with FakeServices(kp_config=FakeKernelPlancksterConfig(auth_token=AUTH_TOKEN, refused_scoped_uploads=1)) as services:
+        register(services, local_file, 3)
+
+    stats = services.stats["kernel_planckster"]
+    assert stats["refused_uploads"] == 1
+    # The retry uses a per-object url; the next object gets a new grant
+    assert stats["upload_credentials"] == 1
+    assert stats["scoped_credentials"] == 2
+    assert stats["uploads"] == 3
+    assert stats["source_registrations"] == 3
+
+
+def test_failed_grant_is_not_requested_again_for_every_object(local_file):
+    config = FakeKernelPlancksterConfig(auth_token=AUTH_TOKEN, scoped_credentials=False, unsupported_status=503)
+    with FakeServices(kp_config=config) as services:
+        register(services, local_file, 5)
+
+    stats = services.stats["kernel_planckster"]
+    # The job backs off for SCOPED_GRANT_RETRY_S after the 503, with per-object urls meanwhile
+    assert stats["unsupported"] == 1
+    assert stats["upload_credentials"] == 5
+    assert stats["uploads"] == 5
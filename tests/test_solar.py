@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from app.metrics import JobMetrics
+from app.url_image_scraper import daylight_capture_times
+
+FREMANTLE = "5b3c79de7145a4.91097248"
+
+
+def test_capture_times_are_read_in_the_camera_time_zone():
+    noon, midnight = datetime(2024, 6, 1, 12, 0), datetime(2024, 6, 1, 0, 0)
+    metrics = JobMetrics()
+
+    kept = list(daylight_capture_times([noon, midnight], FREMANTLE, 0.0, metrics))
+
+    assert kept == [noon]
+    assert metrics.summary()["counters"]["frames_skipped_night"] == 1
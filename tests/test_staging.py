@@ -0,0 +1,29 @@
+import threading
+
+import pytest
+
+from app.staging import StagingArea, StagingRoot, StagingTimeout
+
+
+def test_reserve_waits_for_released_space(tmp_path):
+    root = StagingRoot(str(tmp_path), quota_bytes=100, wait_timeout_s=5)
+    root.reserve(80)
+    threading.Timer(0.1, root.release, args=(50,)).start()
+    assert root.reserve(40) > 0
+    assert root.used_bytes == 70
+
+
+def test_jobs_holding_the_quota_fail_instead_of_waiting_forever(tmp_path):
+    root = StagingRoot(str(tmp_path), quota_bytes=100, wait_timeout_s=0.2)
+    # Two jobs whose frame cubes leave no room for the uploads of either
+    first, second = StagingArea(root, "job-1"), StagingArea(root, "job-2")
+    first.reserve(45)
+    second.reserve(45)
+
+    with pytest.raises(StagingTimeout, match="90 of 100 bytes"):
+        with first.staged_file(b"x" * 20):
+            pass
+
+    first.close()
+    with second.staged_file(b"x" * 20):
+        assert root.used_bytes == 65
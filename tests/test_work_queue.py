@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from app.metrics import JobMetrics
+from app.sharding import merge_reports
+from app.url_image_scraper import unindexed_capture_times
+from app.work_queue import QueueJob, WorkQueue, claimed_capture_times
+
+WEBCAM_ID = "webcam"
+START = datetime(2024, 6, 1, 9)
+TIMESTAMPS = [int((START + timedelta(minutes=10 * step)).timestamp()) for step in range(10)]
+JOB = QueueJob("case-study", "tracer", 1, WEBCAM_ID, TIMESTAMPS[0], TIMESTAMPS[-1])
+
+
+def test_index_hits_are_reported_by_the_worker_claiming_them(tmp_path):
+    timestamps = TIMESTAMPS
+    indexed = {timestamp: {"outputs": f"registered-{timestamp}"} for timestamp in timestamps[::3]}
+    work_queue = WorkQueue(str(tmp_path / "queue.db"))
+    work_queue.enqueue(JOB, timestamps)
+
+    runs = {}
+    for worker in ("a", "b"):
+        report, metrics = {}, JobMetrics()
+        claimed = claimed_capture_times(work_queue, worker, JOB, batch=2)
+        runs[worker] = (unindexed_capture_times(claimed, indexed, report, metrics, on_hit=lambda timestamp, worker=worker: work_queue.complete(worker, JOB, timestamp)), report, metrics)
+
+    # The workers take turns claiming
+    active = list(runs)
+    while active:
+        for worker in list(active):
+            capture_times, report, _ = runs[worker]
+            date = next(capture_times, None)
+            if date is None:
+                active.remove(worker)
+                continue
+            report[int(date.timestamp())] = f"scraped-{worker}"
+            assert work_queue.complete(worker, JOB, int(date.timestamp()))
+
+    merged = merge_reports(report for _, report, _ in runs.values())
+    assert sorted(merged) == timestamps
+    assert sum(metrics.counter("index_hits") for _, _, metrics in runs.values()) == len(indexed)
+    assert all(merged[timestamp] == entry["outputs"] for timestamp, entry in indexed.items())
+    assert work_queue.status()["tasks"][f"case-study/tracer/1/{WEBCAM_ID}"]["done"] == len(timestamps)
+
+
+def test_jobs_on_the_same_webcam_do_not_share_tasks(tmp_path):
+    work_queue = WorkQueue(str(tmp_path / "queue.db"))
+    first, overlapping = JOB, JOB._replace(job_id=2, start=TIMESTAMPS[5])
+    work_queue.enqueue(first, TIMESTAMPS)
+    for timestamp in work_queue.claim("a", first, limit=len(TIMESTAMPS)):
+        assert work_queue.complete("a", first, timestamp)
+
+    # Neither the tasks done by the first job nor those outside its own range are claimed for the second one
+    assert work_queue.enqueue(overlapping, TIMESTAMPS) == 5
+    assert work_queue.claim("b", first) == []
+    claimed = work_queue.claim("b", overlapping, limit=len(TIMESTAMPS))
+    assert claimed == TIMESTAMPS[5:]
+    assert not work_queue.complete("b", first, claimed[0])
+    assert work_queue.complete("b", overlapping, claimed[0])
@@ -0,0 +1,25 @@
+from http.server import ThreadingHTTPServer
+import json
+import threading
+
+import requests
+
+from app.worker_service import WorkerService, make_handler
+from tests.test_jobs import JOB
+
+
+def test_jobs_with_an_unknown_webcam_are_rejected():
+    service = WorkerService(max_jobs=1)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(service))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        response = requests.post(f"http://127.0.0.1:{server.server_port}/jobs", data=json.dumps({**JOB, "roundshot_webcam_id": "unknown"}), timeout=10)
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+
+    assert response.status_code == 400
+    assert response.json() == {"error": "Webcam ID 'unknown' not found in ROUNDSHOT_WEBCAM_MATRIX"}
+    assert service.jobs() == []
@@ -1,9 +1,12 @@
-from datetime import timedelta
 import logging
+import os
+import signal
 import sys
-from app.sdk.scraped_data_repository import ScrapedDataRepository
-from app.setup import datetime_parser, setup, string_validator
-from app.url_image_scraper import scrape
+from typing import List
+from app.encoding import CODECS, SOURCE_CODEC
+
+# NOTE: NumPy, Pillow, pydantic and the HTTP clients are imported in main(), only once they are needed, so that
+# '--help' and invalid arguments return quickly. Keep the imports at the top of this file light.
 
 
 
@@ -15,67 +18,142 @@ def main(
     longitude: str,
     file_dir: str,
     roundshot_webcam_id: str,
-    start_date: str,
-    end_date: str,
+    start_date: str | None,
+    end_date: str | None,
     interval: int,
     kp_host: str,
     kp_port: str,
     kp_auth_token: str,
     kp_scheme: str,
-    log_level: str = "WARNING"
+    log_level: str = "WARNING",
+    profile_dir: str = "./.profile",
+    cprofile: bool = False,
+    tracemalloc_interval: float = 0.0,
+    stack_sample_interval: float = 0.0,
+    workers: int = 0,
+    output_codec: str = SOURCE_CODEC,
+    output_quality: int = 85,
+    output_effort: int = 4,
+    output_mode: str = "objects",
+    shard_size_mb: int = 256,
+    cube_size: str | None = None,
+    stats: bool = False,
+    min_sun_elevation: float | None = None,
+    frame_cache_dir: str | None = None,
+    frame_index: str | None = None,
+    follow: bool = False,
+    publish_delay: int = 60,
+    shard_index: int = 0,
+    shard_count: int = 1,
+    shards: int = 1,
+    report_path: str | None = None,
+    merge_reports: List[str] | None = None,
+    work_queue: str | None = None,
+    worker_id: str | None = None,
+    lease_seconds: int = 300,
+    plan: bool = False,
+    download_limit_mbps: float | None = None,
+    upload_limit_mbps: float | None = None,
+    bandwidth_dir: str | None = None,
+    staging_quota_mb: int | None = None,
+    adaptive_interval: int | None = None,
+    change_threshold: float = 0.03,
+    quality_mode: str | None = None,
+    min_sharpness: float = 5.0,
+    min_contrast: float = 0.05,
+    max_saturated_fraction: float = 0.5,
 ) -> None:
 
     try:
         logger = logging.getLogger(__name__)
         logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
 
-    
-        if not all([case_study_name, job_id, tracer_id, latitude, longitude]):
-            raise ValueError(f"case_study_name, job_id, tracer_id, latitude, and longiture must all be set.")
+        from app.jobs import ScraperJobSpec, bandwidth_bucket, setup_repository, validate_job, validate_job_ids
 
-        string_variables = {
-            "case_study_name": case_study_name,
-            "job_id": job_id,
-            "tracer_id": tracer_id,
-            "latitude": latitude,
-            "longitude": longitude
-        }
+        spec = ScraperJobSpec(
+            case_study_name=case_study_name,
+            job_id=job_id,
+            tracer_id=tracer_id,
+            latitude=latitude,
+            longitude=longitude,
+            file_dir=file_dir,
+            roundshot_webcam_id=roundshot_webcam_id,
+            start_date=start_date,
+            end_date=end_date,
+            interval=interval,
+            kp_host=kp_host,
+            kp_port=kp_port,
+            kp_auth_token=kp_auth_token,
+            kp_scheme=kp_scheme,
+            log_level=log_level,
+            profile_dir=profile_dir,
+            cprofile=cprofile,
+            tracemalloc_interval=tracemalloc_interval,
+            stack_sample_interval=stack_sample_interval,
+            workers=workers,
+            output_codec=output_codec,
+            output_quality=output_quality,
+            output_effort=output_effort,
+            output_mode=output_mode,
+            shard_size_mb=shard_size_mb,
+            cube_size=cube_size,
+            stats=stats,
+            min_sun_elevation=min_sun_elevation,
+            frame_cache_dir=frame_cache_dir,
+            frame_index=frame_index,
+            follow=follow,
+            publish_delay=publish_delay,
+            shard_index=shard_index,
+            shard_count=shard_count,
+            shards=shards,
+            report_path=report_path,
+            work_queue=work_queue,
+            worker_id=worker_id,
+            lease_seconds=lease_seconds,
+            download_limit_mbps=download_limit_mbps,
+            upload_limit_mbps=upload_limit_mbps,
+            bandwidth_dir=bandwidth_dir,
+            staging_quota_mb=staging_quota_mb,
+            adaptive_interval=adaptive_interval,
+            change_threshold=change_threshold,
+            quality_mode=quality_mode,
+            min_sharpness=min_sharpness,
+            min_contrast=min_contrast,
+            max_saturated_fraction=max_saturated_fraction,
+        )
 
-        logger.info(f"Validating string variables:  {string_variables}")
+        if merge_reports:
+            from app.sharding import register_merged_report
 
-        for name, value in string_variables.items():
-            string_validator(f"{value}", name)
+            # The merged report is registered under these, like the outputs of a job
+            validate_job_ids(spec)
+            scraped_data_repository = setup_repository(spec, logger)
+            register_merged_report(merge_reports, file_dir, scraped_data_repository, case_study_name, tracer_id, job_id)
+            logger.info(f"Merged {len(merge_reports)} shard reports for case study: {case_study_name}")
+            return
 
-        logger.info(f"String variables validated successfully!")
+        job = validate_job(spec, logger)
 
-        logger.info(f"Converting start_date, end_date, and interval to datetime objects")
-        start_date_dt = datetime_parser(start_date)
-        end_date_dt = datetime_parser(end_date)
-        if start_date_dt > end_date_dt:
-            raise ValueError(f"Start date must be before end date. Found: {start_date_dt} > {end_date_dt}.")
+        if plan:
+            if follow:
+                raise ValueError("--plan needs a bounded date range and cannot be combined with --follow.")
 
-        if interval <= 0 or not isinstance(interval, int):
-            raise ValueError(f"Interval must be an integer greater than 0, representing an interval in minutes. Found: {interval}")
-        interval_timedelta = timedelta(minutes=interval)
+            import json
+            from app.planner import plan_job, probe_gateway, probe_scoped_credentials
 
-        logger.info(f"start_date, end_date, and interval converted to datetime objects successfully")
+            kp_round_trip_s = probe_gateway(kp_host, kp_port, kp_auth_token, kp_scheme)
+            scoped_credentials = kp_round_trip_s is not None and probe_scoped_credentials(kp_host, kp_port, kp_auth_token, kp_scheme, case_study_name, tracer_id, job_id)
+            print(json.dumps(plan_job(job, shards=shards, kp_round_trip_s=kp_round_trip_s, scoped_credentials=scoped_credentials), indent=4))
+            return
 
-        logger.info(f"Setting up scraper for case study: {case_study_name}")
+        if follow:
+            # 'docker stop' sends SIGTERM: stop following and upload the report, as for Ctrl+C
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
 
-        kernel_planckster, protocol, file_repository = setup(
-            job_id=job_id,
-            logger=logger,
-            kp_auth_token=kp_auth_token,
-            kp_host=kp_host,
-            kp_port=kp_port,
-            kp_scheme=kp_scheme,
-        )
+        logger.info(f"Setting up scraper for case study: {case_study_name}")
 
-        scraped_data_repository = ScrapedDataRepository(
-            protocol=protocol,
-            kernel_planckster=kernel_planckster,
-            file_repository=file_repository,
-        )
+        scraped_data_repository = setup_repository(spec, logger)
+        download_bucket = bandwidth_bucket(spec, "download")
 
         logger.info(f"Scraper setup successfully for case study: {case_study_name}")
 
@@ -85,21 +163,34 @@ def main(
 
     logger.info(f"Scraping data for case study: {case_study_name}")
 
-    scrape(
-        case_study_name=case_study_name,
-        job_id=job_id,
-        tracer_id=tracer_id,
-        scraped_data_repository=scraped_data_repository,
-        log_level=log_level,
-        latitude=latitude,
-        longitude=longitude,  
-        start_date=start_date_dt,
-        end_date=end_date_dt,
-        file_dir=file_dir,
-        roundshot_webcam_id=roundshot_webcam_id,
-        interval=interval_timedelta,
+    from app.profiling import ScraperProfiler
+    from app.url_image_scraper import scrape
+
+    profiler = ScraperProfiler(
+        output_dir=os.path.join(profile_dir, f"{job_id}"),
+        cprofile=cprofile,
+        tracemalloc_interval=tracemalloc_interval,
+        stack_sample_interval=stack_sample_interval,
     )
 
+    with profiler:
+        if shards > 1:
+            from app.sharding import scrape_sharded
+
+            # Shards share one frame processing pool; the report of each shard is kept for the merge
+            scrape_sharded(job, shard_count=shards, scraped_data_repository=scraped_data_repository, download_bucket=download_bucket)
+        else:
+            scrape(job, scraped_data_repository=scraped_data_repository, download_bucket=download_bucket)
+
+    if profiler.enabled:
+        logger.info(f"Uploading profiling output for case study: {case_study_name}")
+        profiler.register(
+            scraped_data_repository=scraped_data_repository,
+            case_study_name=case_study_name,
+            tracer_id=tracer_id,
+            job_id=job_id,
+        )
+
     logger.info(f"Data scraped successfully for case study: {case_study_name}")
 
 
@@ -156,15 +247,15 @@ if __name__ == "__main__":
     parser.add_argument(
         "--start_date",
         type=str,
-        required=True,
-        help="Start datetime in the format 'YYYY-MM-DDTHH:MM",
+        default=None,
+        help="Start datetime in the format 'YYYY-MM-DDTHH:MM. Required unless --follow is set, where it defaults to now.",
     )
 
     parser.add_argument(
         "--end_date",
         type=str,
-        required=True,
-        help="End datetime in the format 'YYYY-MM-DDTHH:MM",
+        default=None,
+        help="End datetime in the format 'YYYY-MM-DDTHH:MM. Required unless --follow is set, where it defaults to no end.",
     )
     
     parser.add_argument(
@@ -206,7 +297,7 @@ if __name__ == "__main__":
         "--file_dir",
         type=str,
         default="./.tmp",
-        help="saved file directory",
+        help="Root of the staging area for temporary files, e.g. a directory in /dev/shm. The job works in a directory of its own under it, and only removes that one.",
     )
 
     parser.add_argument(
@@ -216,6 +307,258 @@ if __name__ == "__main__":
         help="Webcam ID for the roundshot webcam to scrape", 
     )
 
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Number of worker processes for decoding, enhancing and encoding frames. 0 processes frames in the main process.",
+    )
+
+    parser.add_argument(
+        "--output-codec",
+        type=str,
+        choices=[SOURCE_CODEC, *CODECS],
+        default=SOURCE_CODEC,
+        help="Codec for the uploaded frames. 'source' re-encodes in the format the frame was served in, with Pillow's defaults.",
+    )
+
+    parser.add_argument(
+        "--output-quality",
+        type=int,
+        default=85,
+        help="Quality of the lossy codecs (jpeg, webp, avif), between 1 and 100.",
+    )
+
+    parser.add_argument(
+        "--output-effort",
+        type=int,
+        default=4,
+        help="Encoder effort between 0 (fastest) and 9 (smallest output), mapped onto each codec's own scale.",
+    )
+
+    parser.add_argument(
+        "--output-mode",
+        type=str,
+        choices=["objects", "archive"],
+        default="objects",
+        help="'objects' uploads and registers every frame on its own. 'archive' packs frames into tar shards, indexed by timestamp in the webcam report.",
+    )
+
+    parser.add_argument(
+        "--shard-size-mb",
+        type=int,
+        default=256,
+        help="Maximum size of an archive shard, in MB. Only used with --output-mode archive.",
+    )
+
+    parser.add_argument(
+        "--cube-size",
+        type=str,
+        default=None,
+        help="Also write the kept frames, downsampled to WIDTHxHEIGHT (e.g. 512x128), into a memory-mapped .npy cube uploaded at the end of the job.",
+    )
+
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Compute brightness, per-channel histograms, sky saturation and sharpness of every frame, and upload them as one .npz time series at the end of the job.",
+    )
+
+    parser.add_argument(
+        "--min-sun-elevation",
+        type=float,
+        default=None,
+        help="Skip capture times at which the sun is lower than this many degrees above the horizon at the webcam, without requesting them. E.g. -6 keeps civil twilight. Disabled by default.",
+    )
+
+    parser.add_argument(
+        "--frame-cache-dir",
+        type=str,
+        default=None,
+        help="Cache fetched frames with their ETag/Last-Modified in this directory, kept between jobs. Cached frames are revalidated with conditional requests, and frames that were not modified are not decoded nor uploaded again.",
+    )
+
+    parser.add_argument(
+        "--frame-index",
+        type=str,
+        default=None,
+        help="Path of an SQLite index of the frames registered by earlier jobs. Timestamps already registered with the same resolution, processing options and output mode are not fetched again, so re-runs only scrape new timestamps.",
+    )
+
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="Follow the webcam live: scrape each new frame as the camera publishes it, until interrupted (or until --end_date).",
+    )
+
+    parser.add_argument(
+        "--publish-delay",
+        type=int,
+        default=60,
+        help="With --follow, seconds to wait after a capture time before polling for its frame.",
+    )
+
+    parser.add_argument(
+        "--shard-index",
+        type=int,
+        default=0,
+        help="With --shard-count, the date-range shard of the job to scrape, from 0 to --shard-count - 1. Shards are assigned by capture time, so that shards of one job can run on different nodes without overlap.",
+    )
+
+    parser.add_argument(
+        "--shard-count",
+        type=int,
+        default=1,
+        help="Number of date-range shards the job is split into, to scrape one of them with --shard-index. Merge their reports with --merge-reports.",
+    )
+
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Split the date range into this many shards scraped concurrently by this process, and register one merged webcam report for the job.",
+    )
+
+    parser.add_argument(
+        "--report-path",
+        type=str,
+        default=None,
+        help="Also save the webcam report to this path and keep it after the job, e.g. to merge the reports of shards.",
+    )
+
+    parser.add_argument(
+        "--merge-reports",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Do not scrape: merge these shard reports (saved with --report-path) and register the result as the webcam report of --job-id.",
+    )
+
+    parser.add_argument(
+        "--work-queue",
+        type=str,
+        default=None,
+        help="Path of an SQLite work queue shared by the containers running this job, e.g. on a shared volume. The capture times are enqueued once, and each container scrapes the ones it claims.",
+    )
+
+    parser.add_argument(
+        "--worker-id",
+        type=str,
+        default=None,
+        help="Name of this container in the work queue. Defaults to the hostname and process id.",
+    )
+
+    parser.add_argument(
+        "--lease-seconds",
+        type=int,
+        default=300,
+        help="How long capture times claimed from the work queue stay reserved for this container. Leases are renewed at every claim; expired ones are offered to other containers.",
+    )
+
+    parser.add_argument(
+        "--download-limit-mbps",
+        type=float,
+        default=None,
+        help="Limit the Roundshot downloads of all the jobs on this host to this many Mbit/s together. No limit by default.",
+    )
+
+    parser.add_argument(
+        "--upload-limit-mbps",
+        type=float,
+        default=None,
+        help="Limit the uploads to storage of all the jobs on this host to this many Mbit/s together. No limit by default.",
+    )
+
+    parser.add_argument(
+        "--bandwidth-dir",
+        type=str,
+        default=None,
+        help="Directory of the state of the bandwidth limits, shared by the jobs of the host. Defaults to a directory in /dev/shm.",
+    )
+
+    parser.add_argument(
+        "--adaptive-interval",
+        type=int,
+        default=None,
+        help="Sample every N minutes first, then recursively halfway between two samples that differ by more than --change-threshold, down to --interval. Samples every --interval by default.",
+    )
+
+    parser.add_argument(
+        "--change-threshold",
+        type=float,
+        default=0.03,
+        help="With --adaptive-interval, mean difference of two downsampled grayscale frames, between 0 and 1, above which the capture times between them are sampled too.",
+    )
+
+    parser.add_argument(
+        "--quality-mode",
+        type=str,
+        choices=["tag", "drop"],
+        default=None,
+        help="Score the sharpness, contrast and saturated pixels of every frame and upload the scores next to the report ('tag'), or also drop the frames below a threshold before they are encoded ('drop'). Off by default.",
+    )
+
+    parser.add_argument(
+        "--min-sharpness",
+        type=float,
+        default=5.0,
+        help="With --quality-mode, lowest variance of the Laplacian of a downsampled grayscale frame. Blur, fog and rotation bring it towards 0.",
+    )
+
+    parser.add_argument(
+        "--min-contrast",
+        type=float,
+        default=0.05,
+        help="With --quality-mode, lowest standard deviation of the grayscale frame, between 0 and 1.",
+    )
+
+    parser.add_argument(
+        "--max-saturated-fraction",
+        type=float,
+        default=0.5,
+        help="With --quality-mode, highest fraction of pixels crushed to black or blown out to white, e.g. by snow on the lens.",
+    )
+
+    parser.add_argument(
+        "--staging-quota-mb",
+        type=int,
+        default=None,
+        help="Most MB of temporary files under --file_dir. Uploads wait and archive shards are closed early when it is reached. No limit by default.",
+    )
+
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Do not scrape: print the plan of the job, i.e. its capture times after sharding, night skipping, the frame index and the frame cache, with the expected requests, bytes, gateway calls and wall time, extrapolated from a probe of 3 frames.",
+    )
+
+    parser.add_argument(
+        "--profile-dir",
+        type=str,
+        default="./.profile",
+        help="Directory for profiling output. It is uploaded next to the webcam report when any profiler is enabled.",
+    )
+
+    parser.add_argument(
+        "--cprofile",
+        action="store_true",
+        help="Profile the run with cProfile and dump the stats in pstats format.",
+    )
+
+    parser.add_argument(
+        "--tracemalloc-interval",
+        type=float,
+        default=0.0,
+        help="Write the top allocation sites (tracemalloc) every N seconds. 0 disables it.",
+    )
+
+    parser.add_argument(
+        "--stack-sample-interval",
+        type=float,
+        default=0.0,
+        help="Sample the wall-clock stack of every thread every N seconds and dump them as folded stacks. 0 disables it.",
+    )
+
 
     args = parser.parse_args()
 
@@ -235,6 +578,42 @@ if __name__ == "__main__":
         file_dir=args.file_dir,
         roundshot_webcam_id=args.roundshot_webcam_id,
         interval=args.interval,
+        profile_dir=args.profile_dir,
+        cprofile=args.cprofile,
+        tracemalloc_interval=args.tracemalloc_interval,
+        stack_sample_interval=args.stack_sample_interval,
+        workers=args.workers,
+        output_codec=args.output_codec,
+        output_quality=args.output_quality,
+        output_effort=args.output_effort,
+        output_mode=args.output_mode,
+        shard_size_mb=args.shard_size_mb,
+        cube_size=args.cube_size,
+        stats=args.stats,
+        min_sun_elevation=args.min_sun_elevation,
+        frame_cache_dir=args.frame_cache_dir,
+        frame_index=args.frame_index,
+        follow=args.follow,
+        publish_delay=args.publish_delay,
+        shard_index=args.shard_index,
+        shard_count=args.shard_count,
+        shards=args.shards,
+        report_path=args.report_path,
+        merge_reports=args.merge_reports,
+        work_queue=args.work_queue,
+        worker_id=args.worker_id,
+        lease_seconds=args.lease_seconds,
+        plan=args.plan,
+        download_limit_mbps=args.download_limit_mbps,
+        upload_limit_mbps=args.upload_limit_mbps,
+        bandwidth_dir=args.bandwidth_dir,
+        staging_quota_mb=args.staging_quota_mb,
+        adaptive_interval=args.adaptive_interval,
+        change_threshold=args.change_threshold,
+        quality_mode=args.quality_mode,
+        min_sharpness=args.min_sharpness,
+        min_contrast=args.min_contrast,
+        max_saturated_fraction=args.max_saturated_fraction,
     )
 
 